@@ -3,7 +3,8 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils import timezone
-from .models import Assistant, KnowledgeBaseEntry
+from .models import Assistant, KnowledgeBaseEntry, KnowledgeDocument, KnowledgeImportJob, ExactAnswer
+from .embeddings import get_embedding_worker
 
 
 class KnowledgeBaseEntryInline(admin.TabularInline):
@@ -36,6 +37,9 @@ class AssistantAdmin(admin.ModelAdmin):
         ('Platform Configuration', {
             'fields': ('platform', 'group_id')
         }),
+        ('Search', {
+            'fields': ('search_precision', 'retrieval_mode')
+        }),
         ('Media', {
             'fields': ('avatar', 'avatar_preview'),
             'classes': ('collapse',)
@@ -103,15 +107,16 @@ class KnowledgeBaseEntryAdmin(admin.ModelAdmin):
     
     def embedding_info(self, obj):
         # Show embedding details in the admin
-        if obj.embedding:
+        vector = obj.vector
+        if vector is not None and len(vector):
             return format_html(
                 '<div style="background: #f0f0f0; padding: 10px; border-radius: 5px;">'
                 '<strong>Embedding Vector:</strong><br>'
                 '<small>Length: {} dimensions</small><br>'
                 '<small>First 5 values: {}</small>'
                 '</div>',
-                len(obj.embedding),
-                obj.embedding[:5] if obj.embedding else 'None'
+                len(vector),
+                [round(float(value), 4) for value in vector[:5]]
             )
         return "No embedding generated yet"
     embedding_info.short_description = 'Embedding Information'
@@ -121,6 +126,45 @@ class KnowledgeBaseEntryAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('assistant', 'assistant__user')
 
 
+@admin.register(KnowledgeDocument)
+class KnowledgeDocumentAdmin(admin.ModelAdmin):
+    """
+    Admin interface for chunked long documents.
+    """
+    list_display = ('title', 'assistant', 'chunk_count', 'created_at')
+    list_filter = ('assistant', 'created_at')
+    search_fields = ('title', 'content', 'assistant__name')
+    readonly_fields = ('created_at', 'updated_at')
+
+    def chunk_count(self, obj):
+        return obj.chunks.count()
+    chunk_count.short_description = 'Chunks'
+
+
+@admin.register(KnowledgeImportJob)
+class KnowledgeImportJobAdmin(admin.ModelAdmin):
+    """
+    Read-only view of bulk knowledge base imports.
+    """
+    list_display = ('id', 'assistant', 'file_name', 'status', 'rows_processed', 'rows_imported', 'rows_failed', 'created_at')
+    list_filter = ('status', 'file_format', 'created_at')
+    search_fields = ('file_name', 'assistant__name')
+    readonly_fields = [field.name for field in KnowledgeImportJob._meta.fields]
+
+
+@admin.register(ExactAnswer)
+class ExactAnswerAdmin(admin.ModelAdmin):
+    """
+    Admin interface for curated question/answer pairs answered without retrieval.
+    """
+    list_display = ('question', 'assistant', 'source', 'updated_at')
+    list_filter = ('source', 'assistant')
+    search_fields = ('question', 'answer', 'assistant__name')
+    raw_id_fields = ('entry',)
+    readonly_fields = ('knowledge_version', 'created_at', 'updated_at')
+    fields = ('assistant', 'question', 'answer', 'entry', 'source', 'knowledge_version', 'created_at', 'updated_at')
+
+
 # Customize the admin site
 admin.site.site_header = "🤖 Neura AI Assistant Management"
 admin.site.site_title = "Neura AI Admin"
@@ -133,9 +177,13 @@ def make_active(modeladmin, request, queryset):
 
 @admin.action(description="Generate embeddings for selected knowledge entries")
 def generate_embeddings(modeladmin, request, queryset):
-    # This would integrate with your embedding generation logic
-    count = queryset.count()
-    modeladmin.message_user(request, f"Embedding generation initiated for {count} entries.")
+    # Hand the selection to the background worker instead of encoding inside the request
+    worker = get_embedding_worker()
+    count = 0
+    for entry_id in queryset.values_list('id', flat=True).iterator():
+        worker.enqueue(entry_id)
+        count += 1
+    modeladmin.message_user(request, f"Queued {count} entries for embedding; entries already up to date are skipped.")
 
 # Add the actions to the admin classes
 AssistantAdmin.actions = [make_active]
@@ -7,6 +7,4 @@ class AssistantsConfig(AppConfig):
 
     def ready(self):
         import assistants.signals  # connects the signal when app is ready
-
-
-
+        import assistants.checks  # registers the system checks
@@ -0,0 +1,109 @@
+"""
+Knowledge-base versioning and the per-assistant answer cache.
+
+Every assistant has a knowledge-base version stored in Django's cache. It is
+bumped whenever one of its entries changes, and cached answers are keyed by
+(assistant, normalized question, version), so an edit makes every older answer
+unreachable instead of having to find and delete it. The cache must be shared
+by all worker processes (Redis, Memcached, database...); with the local-memory
+default, an edit only invalidates the answers of the worker that saved it.
+"""
+
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .utils import question_digest
+
+VERSION_KEY = "neura:kb-version:{assistant_id}"
+ANSWER_KEY = "neura:answer:{assistant_id}:{version}:{digest}"
+CHANGES_KEY = "neura:kb-changes:{assistant_id}:{version}"
+
+
+def _initial_version():
+    # Time-based so a version evicted from the cache never comes back with an old value
+    return time.time_ns() // 1000
+
+
+def get_knowledge_version(assistant_id) -> int:
+    """
+    Current knowledge-base version of an assistant.
+    """
+    key = VERSION_KEY.format(assistant_id=assistant_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_knowledge_version(assistant_id, changed_ids=None) -> int:
+    """
+    Invalidate everything cached for an assistant's current knowledge base.
+
+    ``changed_ids`` are the entries created, edited or deleted by this change;
+    they are recorded for the new version so loaded search indexes can apply
+    the change instead of reloading. Leave it None when the change is unknown.
+    """
+    key = VERSION_KEY.format(assistant_id=assistant_id)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        # Key was missing or evicted; with no previous version there is nothing to diff against
+        version = _initial_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+    if changed_ids is not None:
+        cache.set(
+            CHANGES_KEY.format(assistant_id=assistant_id, version=version),
+            sorted(set(changed_ids)),
+            timeout=settings.KNOWLEDGE_CHANGES_TIMEOUT,
+        )
+    return version
+
+
+def get_knowledge_changes(assistant_id, since: int, until: int):
+    """
+    Ids of the entries changed between two versions, or None when that is not fully known.
+    """
+    if until - since > settings.KNOWLEDGE_CHANGES_MAX_VERSIONS:
+        return None
+    keys = [CHANGES_KEY.format(assistant_id=assistant_id, version=version) for version in range(since + 1, until + 1)]
+    recorded = cache.get_many(keys)
+    if len(recorded) != len(keys):
+        return None
+    return sorted({entry_id for changed_ids in recorded.values() for entry_id in changed_ids})
+
+
+def answer_cache_key(assistant_id, question, version=None):
+    """
+    Cache key for a question against the assistant's current knowledge base
+    (or against ``version``, when the caller already read it).
+
+    Take the key before retrieving, and store under that same key, so an answer
+    computed from data older than a concurrent edit is never filed under the
+    post-edit version.
+    """
+    return ANSWER_KEY.format(
+        assistant_id=assistant_id,
+        version=get_knowledge_version(assistant_id) if version is None else version,
+        digest=question_digest(question),
+    )
+
+
+def get_cached_answer(key):
+    """
+    Return the cached answer dict stored under ``key``, or None.
+    """
+    if not settings.ANSWER_CACHE_TIMEOUT:
+        return None
+    return cache.get(key)
+
+
+def cache_answer(key, result):
+    """
+    Store an answer dict (answer, confidence, source) under ``key``.
+    """
+    if not settings.ANSWER_CACHE_TIMEOUT:
+        return
+    cache.set(key, result, timeout=settings.ANSWER_CACHE_TIMEOUT)
@@ -0,0 +1,32 @@
+"""
+System checks for deployment settings the assistants app relies on.
+"""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warn when the default cache is not shared between worker processes.
+
+    Knowledge-base versions, cached answers and WhatsApp message ids live in
+    the cache. With a per-process cache an edit only invalidates answers in
+    the worker that handled it, and the others keep serving stale ones.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            f"The default cache ({backend}) is not shared between worker processes.",
+            hint="Set CACHE_URL to a shared cache such as redis:// or memcache:// when running more than one worker.",
+            id='assistants.W001',
+        )
+    ]
@@ -0,0 +1,163 @@
+"""
+Chunked ingestion of long documents.
+
+all-MiniLM-L6-v2 silently truncates its input, so a long document embedded as
+one entry is only represented by its first paragraph. Documents are instead
+split into overlapping, token-bounded chunks; each chunk becomes its own
+KnowledgeBaseEntry linked to the parent KnowledgeDocument, and all chunks are
+embedded with one batched encode call. At query time, hits on neighbouring
+chunks of the same document are merged back into one passage.
+"""
+
+import re
+from django.conf import settings
+from django.db import transaction
+from .caching import bump_knowledge_version
+from .models import KnowledgeBaseEntry, KnowledgeDocument
+from .utils import get_embeddings, get_tokenizer, content_digest
+
+WORD_RE = re.compile(r'\S+')
+
+
+def token_spans(text: str, tokenizer=None):
+    """
+    Character ``(start, end)`` span of every token of ``text``.
+
+    Uses the embedding model's tokenizer when given, otherwise whitespace-separated words.
+    """
+    if tokenizer is None:
+        return [match.span() for match in WORD_RE.finditer(text)]
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, truncation=False)
+    return [tuple(span) for span in encoding['offset_mapping']]
+
+
+def chunk_spans(text: str, max_tokens: int, overlap: int, tokenizer=None):
+    """
+    Split ``text`` into character spans of at most ``max_tokens`` tokens,
+    consecutive spans sharing ``overlap`` tokens.
+    """
+    if overlap >= max_tokens:
+        raise ValueError("overlap must be smaller than max_tokens")
+
+    spans = token_spans(text, tokenizer)
+    if not spans:
+        return []
+
+    chunks = []
+    start = 0
+    while True:
+        end = min(start + max_tokens, len(spans))
+        # Do not cut a word in half: back off while the next token continues the last one
+        while end < len(spans) and end - start > overlap + 1 and spans[end][0] == spans[end - 1][1]:
+            end -= 1
+        chunks.append((spans[start][0], spans[end - 1][1]))
+        if end >= len(spans):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def ingest_document(assistant, content: str, title: str = '', tokenizer=None):
+    """
+    Store ``content`` as a KnowledgeDocument split into embedded chunk entries.
+    """
+    if tokenizer is None:
+        tokenizer = get_tokenizer()
+
+    spans = chunk_spans(content, settings.CHUNK_MAX_TOKENS, settings.CHUNK_OVERLAP_TOKENS, tokenizer)
+    texts = [content[start:end] for start, end in spans]
+    # Encode before opening the transaction so the model call holds no locks
+    embeddings = get_embeddings(texts)
+
+    with transaction.atomic():
+        document = KnowledgeDocument.objects.create(assistant=assistant, title=title, content=content)
+        chunks = []
+        for index, (text, embedding, (start, end)) in enumerate(zip(texts, embeddings, spans)):
+            chunk = KnowledgeBaseEntry(
+                assistant=assistant,
+                document=document,
+                content=text,
+                content_hash=content_digest(text),
+                chunk_index=index,
+                char_start=start,
+                char_end=end,
+            )
+            # bulk_create skips save(), which would otherwise store the vector
+            chunk.set_embedding(embedding)
+            chunks.append(chunk)
+        chunks = KnowledgeBaseEntry.objects.bulk_create(chunks)
+        # bulk_create sends no post_save
+        chunk_ids = [chunk.pk for chunk in chunks]
+        transaction.on_commit(lambda: bump_knowledge_version(assistant.pk, changed_ids=chunk_ids))
+    return document
+
+
+class MergedChunk:
+    """
+    Consecutive chunk hits of one document, merged back into a single passage.
+    """
+
+    def __init__(self, entry, content, chunk_ids):
+        # Identify as the best-scoring chunk so callers can still link back to an entry
+        self.id = self.pk = entry.pk
+        self.assistant_id = entry.assistant_id
+        self.document_id = entry.document_id
+        self.content = content
+        self.chunk_ids = chunk_ids
+
+    def __repr__(self):
+        return f"<MergedChunk document={self.document_id} chunks={self.chunk_ids}>"
+
+
+def merge_adjacent_chunks(matches):
+    """
+    Merge ``(entry, score)`` hits on neighbouring chunks of the same document.
+
+    The merged passage takes the rank and score of its best chunk, and its text
+    is cut from the parent document so chunk overlaps are not repeated.
+    """
+    by_document = {}
+    for entry, _ in matches:
+        if entry.document_id is not None and entry.chunk_index is not None and entry.char_start is not None:
+            by_document.setdefault(entry.document_id, []).append(entry)
+
+    # Group runs of consecutive chunk indexes
+    runs = {}
+    for document_id, entries in by_document.items():
+        entries.sort(key=lambda entry: entry.chunk_index)
+        run = [entries[0]]
+        for entry in entries[1:] + [None]:
+            if entry is not None and entry.chunk_index == run[-1].chunk_index + 1:
+                run.append(entry)
+                continue
+            if len(run) > 1:
+                runs.setdefault(document_id, []).append(run)
+            run = [entry]
+
+    if not runs:
+        return matches
+
+    documents = KnowledgeDocument.objects.only('content').in_bulk(list(runs))
+    run_of = {}
+    for document_id, document_runs in runs.items():
+        document = documents.get(document_id)
+        if document is None:
+            continue
+        for run in document_runs:
+            content = document.content[run[0].char_start:run[-1].char_end]
+            for entry in run:
+                run_of[entry.pk] = (content, [chunk.pk for chunk in run])
+
+    merged = []
+    seen_runs = set()
+    for entry, score in matches:
+        if entry.pk not in run_of:
+            merged.append((entry, score))
+            continue
+        content, chunk_ids = run_of[entry.pk]
+        if chunk_ids[0] in seen_runs:
+            continue
+        # Matches are sorted by score, so the first chunk seen is the best one
+        seen_runs.add(chunk_ids[0])
+        merged.append((MergedChunk(entry, content, chunk_ids), score))
+    return merged
@@ -0,0 +1,101 @@
+"""
+Token-budgeted context for Gemini prompts.
+
+Ranked candidates are consumed lazily and packed greedily until the token
+budget is spent, so the knowledge base is never loaded as a whole. Selection
+is MMR-style: every pick trades relevance against overlap with the passages
+already chosen, and near-duplicates are dropped outright.
+
+Token counts come from the embedding model's tokenizer when the model is
+already loaded and from a word-count estimate otherwise; counting never loads
+the model by itself.
+"""
+
+import math
+import re
+from itertools import islice
+from django.conf import settings
+from .utils import get_loaded_tokenizer
+
+WORD_RE = re.compile(r'\w+')
+SEPARATOR = "\n\n"
+# Roughly how many WordPiece tokens an English word turns into
+TOKENS_PER_WORD = 4 / 3
+
+
+def measure(text: str, tokenizer=None):
+    """
+    ``(token_count, terms)`` of ``text``; the terms are used to compare passages.
+    """
+    if tokenizer is not None:
+        ids = tokenizer(text, add_special_tokens=False, truncation=False)['input_ids']
+        return len(ids), frozenset(ids)
+    words = WORD_RE.findall(text.lower())
+    return math.ceil(len(words) * TOKENS_PER_WORD), frozenset(words)
+
+
+class _Passage:
+    """
+    A candidate with its token count and terms.
+    """
+
+    def __init__(self, entry, score, tokenizer):
+        self.entry = entry
+        self.score = score
+        self.tokens, self.terms = measure(entry.content, tokenizer)
+
+    def similarity(self, other):
+        if not self.terms or not other.terms:
+            return 0.0
+        return len(self.terms & other.terms) / len(self.terms | other.terms)
+
+
+def pack_context(candidates, max_tokens=None, diversity=None, duplicate_threshold=None, lookahead=None):
+    """
+    Select ``(entry, score)`` pairs from ranked ``candidates`` whose contents fit in ``max_tokens``.
+
+    Candidates are pulled ``lookahead`` at a time. From that window the passage
+    with the best ``(1 - diversity) * score - diversity * overlap`` is taken;
+    passages overlapping a chosen one by ``duplicate_threshold`` or more are
+    dropped, and ones too long for the remaining budget are skipped.
+    """
+    max_tokens = settings.CONTEXT_MAX_TOKENS if max_tokens is None else max_tokens
+    diversity = settings.CONTEXT_DIVERSITY if diversity is None else diversity
+    duplicate_threshold = settings.CONTEXT_DUPLICATE_THRESHOLD if duplicate_threshold is None else duplicate_threshold
+    lookahead = lookahead or settings.CONTEXT_LOOKAHEAD
+
+    tokenizer = get_loaded_tokenizer()
+    separator_tokens = 1
+    candidates = iter(candidates)
+    pool = []
+    selected = []
+    remaining = max_tokens
+
+    def overlap(passage):
+        return max((passage.similarity(chosen) for chosen in selected), default=0.0)
+
+    while remaining > 0:
+        pool.extend(_Passage(entry, score, tokenizer) for entry, score in islice(candidates, lookahead - len(pool)))
+        if not pool:
+            break
+
+        best = max(pool, key=lambda passage: (1 - diversity) * passage.score - diversity * overlap(passage))
+        pool.remove(best)
+
+        if overlap(best) >= duplicate_threshold:
+            continue
+        cost = best.tokens + (separator_tokens if selected else 0)
+        if cost > remaining:
+            # A shorter passage further down may still fit
+            continue
+        selected.append(best)
+        remaining -= cost
+
+    return [(passage.entry, passage.score) for passage in selected]
+
+
+def build_context(candidates, **kwargs):
+    """
+    Context text for Gemini from ranked ``(entry, score)`` candidates. Empty when none fit.
+    """
+    return SEPARATOR.join(entry.content for entry, _ in pack_context(candidates, **kwargs))
@@ -0,0 +1,192 @@
+"""
+Shared embedding inference over a Unix socket.
+
+One ``manage.py embedding_server`` process owns the SentenceTransformer model
+and answers encode requests from every web worker and the background
+embedding worker on the same host, so those processes never load torch.
+
+Every message is a frame: a 4-byte big-endian length followed by the payload.
+A request is one JSON frame, ``{"texts": [...], "batch_size": n}``. The reply
+is a JSON header frame, ``{"shape": [n, dim]}`` or ``{"error": "..."}``,
+followed by a frame holding the embeddings as little-endian float32.
+Connections are kept open and reused for further requests.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+FLOAT32_LE = np.dtype('<f4')
+
+
+class EmbeddingServerError(Exception):
+    """
+    The embedding server could not be reached or failed to encode.
+    """
+
+
+def send_frame(sock, payload: bytes):
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError("Connection closed by peer")
+        received += n
+    return bytes(buffer)
+
+
+def recv_frame(sock) -> bytes:
+    (size,) = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {size} bytes exceeds the limit")
+    return _recv_exact(sock, size)
+
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Serve encode requests on one client connection until it closes.
+    """
+
+    def handle(self):
+        while True:
+            try:
+                request = json.loads(recv_frame(self.request))
+            except (OSError, ValueError):
+                return
+
+            try:
+                vectors = np.asarray(
+                    self.server.encode(request['texts'], request.get('batch_size', 32)),
+                    dtype=FLOAT32_LE,
+                )
+                header, payload = {"shape": list(vectors.shape)}, vectors.tobytes()
+            except Exception as e:
+                logger.exception("Embedding request failed")
+                header, payload = {"error": str(e)}, b''
+
+            try:
+                send_frame(self.request, json.dumps(header).encode('utf-8'))
+                send_frame(self.request, payload)
+            except OSError:
+                return
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, encode):
+        self.encode = encode
+        super().__init__(path, EmbeddingRequestHandler)
+
+
+def model_encode(texts, batch_size):
+    from .utils import get_model, encode_query
+    if len(texts) == 1:
+        # Single questions from many workers are batched together
+        return [encode_query(texts[0])]
+    return get_model().encode(list(texts), batch_size=batch_size, show_progress_bar=False)
+
+
+def make_server(path, encode=model_encode):
+    """
+    Bind an EmbeddingServer to the Unix socket ``path``, replacing a stale socket file.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    server = EmbeddingServer(path, encode)
+    # Any process of the same user or group may connect
+    os.chmod(path, 0o660)
+    return server
+
+
+class EmbeddingClient:
+    """
+    Thin client for the embedding server, with one persistent connection per thread.
+    """
+
+    def __init__(self, path, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def close(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _exchange(self, sock, payload):
+        send_frame(sock, payload)
+        header = json.loads(recv_frame(sock))
+        return header, recv_frame(sock)
+
+    def encode(self, texts, batch_size: int = 32):
+        """
+        Embeddings of ``texts`` as lists of floats. Raises EmbeddingServerError on failure.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        payload = json.dumps({"texts": texts, "batch_size": batch_size}).encode('utf-8')
+
+        for attempt in range(2):
+            sock = getattr(self._local, 'sock', None)
+            reused = sock is not None
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                header, data = self._exchange(sock, payload)
+                break
+            except socket.timeout as e:
+                self.close()
+                raise EmbeddingServerError(f"Embedding server timed out after {self.timeout}s") from e
+            except (OSError, ValueError) as e:
+                self.close()
+                # A kept-alive connection may have been closed by a server restart; reconnect once
+                if reused and attempt == 0:
+                    continue
+                raise EmbeddingServerError(str(e)) from e
+
+        if 'error' in header:
+            raise EmbeddingServerError(header['error'])
+        return np.frombuffer(data, dtype=FLOAT32_LE).reshape(header['shape']).tolist()
+
+
+_client = None
+
+def get_embedding_client():
+    """
+    Process-wide client for EMBEDDING_SERVER_SOCKET, or None when no server is configured.
+    """
+    global _client
+    if not settings.EMBEDDING_SERVER_SOCKET:
+        return None
+    if _client is None or _client.path != settings.EMBEDDING_SERVER_SOCKET:
+        _client = EmbeddingClient(settings.EMBEDDING_SERVER_SOCKET, settings.EMBEDDING_SERVER_TIMEOUT)
+    return _client
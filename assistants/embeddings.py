@@ -0,0 +1,277 @@
+"""
+Batched embedding of knowledge base entries.
+
+Entries are streamed from the database with ``iterator()``, encoded one chunk
+at a time with a single batched ``model.encode`` call and written back with
+``bulk_update``. Used by the ``reembed`` management command, the admin
+"Generate embeddings" action and the background ``EmbeddingWorker``.
+"""
+
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import CharField, Func, Q
+from .caching import bump_knowledge_version
+from .models import KnowledgeBaseEntry
+from .utils import get_embeddings, content_digest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 256
+DEFAULT_BATCH_SIZE = 64
+# Postgres advisory lock key held by the process that is re-scanning the table
+RESCAN_LOCK_KEY = 7381001
+
+
+class ContentDigest(Func):
+    """
+    SQL counterpart of ``utils.content_digest``.
+
+    Uses the sha256() built into Postgres 11+, not pgcrypto's digest().
+    """
+    template = "encode(sha256(convert_to(%(expressions)s, 'UTF8')), 'hex')"
+    output_field = CharField()
+
+
+def stale_embeddings(queryset):
+    """
+    The entries of ``queryset`` without an embedding or whose content changed since they were embedded.
+
+    Both conditions are checked by Postgres, so up-to-date rows never leave
+    the database; the embedding itself is never fetched.
+    """
+    return queryset.filter(
+        Q(embedding_f32__isnull=True) | ~Q(content_hash=ContentDigest('content'))
+    ).only('id', 'assistant_id', 'content')
+
+
+def save_embeddings(entries, embeddings):
+    """
+    Write embeddings for ``entries`` in one bulk_update and invalidate their assistants.
+    """
+    for entry, embedding in zip(entries, embeddings):
+        entry.set_embedding(embedding)
+        entry.content_hash = content_digest(entry.content)
+
+    changed = {}
+    for entry in entries:
+        changed.setdefault(entry.assistant_id, []).append(entry.pk)
+    with transaction.atomic():
+        KnowledgeBaseEntry.objects.bulk_update(entries, ['embedding', 'embedding_f32', 'content_hash'])
+        # bulk_update sends no post_save, so bump versions explicitly
+        for assistant_id, entry_ids in changed.items():
+            transaction.on_commit(
+                lambda assistant_id=assistant_id, entry_ids=entry_ids: bump_knowledge_version(assistant_id, changed_ids=entry_ids)
+            )
+
+
+def embed_chunk(entries, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Encode and store embeddings for a list of entries with one model call.
+    """
+    if not entries:
+        return
+    embeddings = get_embeddings([entry.content for entry in entries], batch_size=batch_size)
+    save_embeddings(entries, embeddings)
+
+
+def embed_entries(queryset, chunk_size: int = DEFAULT_CHUNK_SIZE, batch_size: int = DEFAULT_BATCH_SIZE,
+                  progress=None, stale_only: bool = False):
+    """
+    Embed every entry of ``queryset`` in id order, ``chunk_size`` entries at a time.
+
+    With ``stale_only``, entries whose embedding is present and up to date
+    are skipped. ``progress(done, last_id)`` is called after every chunk;
+    since chunks are committed in id order, ``last_id`` is a safe point to
+    resume from. Returns the number of entries embedded.
+    """
+    queryset = queryset.select_related(None).order_by('id')
+    queryset = stale_embeddings(queryset) if stale_only else queryset.only('id', 'assistant_id', 'content')
+    entries = queryset.iterator(chunk_size=chunk_size)
+
+    done = 0
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            embed_chunk(chunk, batch_size=batch_size)
+            done += len(chunk)
+            if progress:
+                progress(done, chunk[-1].id)
+            chunk = []
+
+    if chunk:
+        embed_chunk(chunk, batch_size=batch_size)
+        done += len(chunk)
+        if progress:
+            progress(done, chunk[-1].id)
+
+    logger.info("embedded %d knowledge base entries", done)
+    return done
+
+
+@contextmanager
+def rescan_lock():
+    """
+    Try to take the re-scan advisory lock without waiting; yields whether it was taken.
+
+    The lock is held by this thread's database session, so it survives the
+    commits made between chunks and is released if the process dies.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [RESCAN_LOCK_KEY])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [RESCAN_LOCK_KEY])
+
+
+class EmbeddingWorker:
+    """
+    Long-lived background worker that embeds newly created entries in micro-batches.
+
+    Entry ids are put on a bounded queue; the worker thread coalesces them into
+    batches of up to ``batch_size`` ids or whatever arrived within ``max_wait``
+    seconds of the first one, encodes each batch with one model call and writes
+    it with one ``bulk_update``. Pending work is not persisted: entries simply
+    keep ``embedding_f32 IS NULL`` until processed, and the worker re-scans for them
+    on start-up and after the queue overflowed.
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = DEFAULT_BATCH_SIZE, max_wait: float = 0.5):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._needs_rescan = True
+        self.processed = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_batch_size = 0
+        self.last_lag = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='embedding-worker', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, entry_id):
+        """
+        Schedule an entry for embedding without blocking the caller.
+        """
+        self.start()
+        try:
+            self._queue.put_nowait((entry_id, time.monotonic()))
+        except queue.Full:
+            # The entry keeps embedding_f32 IS NULL and is picked up by the next re-scan
+            self.dropped += 1
+            self._needs_rescan = True
+            logger.warning("embedding queue full; entry %s deferred to re-scan", entry_id)
+
+    def metrics(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "processed": self.processed,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_batch_size": self.last_batch_size,
+            "last_lag_seconds": round(self.last_lag, 3),
+            "running": bool(self._thread and self._thread.is_alive()),
+        }
+
+    def next_batch(self, block: bool = True):
+        """
+        Wait for the first pending id, then collect more until the batch is full or the deadline passes.
+        """
+        try:
+            batch = [self._queue.get(block=block)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Past the deadline, still take whatever is already queued
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def process_batch(self, batch):
+        """
+        Embed the entries of a batch with one encode call and one bulk_update.
+        """
+        ids = list(dict.fromkeys(entry_id for entry_id, _ in batch))
+        # Entries embedded meanwhile (e.g. by a re-scan) are skipped
+        entries = list(stale_embeddings(KnowledgeBaseEntry.objects.filter(id__in=ids)))
+        embed_chunk(entries, batch_size=self.batch_size)
+
+        self.processed += len(entries)
+        self.batches += 1
+        self.last_batch_size = len(entries)
+        self.last_lag = time.monotonic() - min(enqueued_at for _, enqueued_at in batch)
+
+    def rescan(self):
+        """
+        Embed every entry that is still missing an embedding or has a stale one.
+
+        Only one process on the database re-scans at a time; the others skip
+        it, since that scan also picks up the entries they dropped.
+        """
+        self._needs_rescan = False
+        with rescan_lock() as acquired:
+            if not acquired:
+                logger.info("embedding re-scan already running in another process; skipped")
+                return
+            done = embed_entries(KnowledgeBaseEntry.objects.all(), chunk_size=self.batch_size, stale_only=True)
+        self.processed += done
+        if done:
+            logger.info("embedding worker recovered %d entries with missing or stale embeddings", done)
+
+    def _run(self):
+        while True:
+            try:
+                close_old_connections()
+                if self._needs_rescan and self._queue.empty():
+                    self.rescan()
+                batch = self.next_batch()
+                close_old_connections()
+                self.process_batch(batch)
+                logger.info("embedding worker %s", self.metrics())
+            except Exception:
+                self.errors += 1
+                self._needs_rescan = True
+                logger.exception("embedding worker batch failed")
+                time.sleep(1)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_embedding_worker():
+    """
+    Return this process's embedding worker, creating it on first use.
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = EmbeddingWorker(
+                max_queue=settings.EMBEDDING_WORKER_QUEUE_SIZE,
+                batch_size=settings.EMBEDDING_WORKER_BATCH_SIZE,
+                max_wait=settings.EMBEDDING_WORKER_MAX_WAIT,
+            )
+    return _worker
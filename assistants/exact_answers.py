@@ -0,0 +1,90 @@
+"""
+Exact-question fast path.
+
+Questions asked verbatim (up to case and spacing) are looked up by the hash
+of their normalized text in ExactAnswer, before any embedding or Gemini work.
+Each process mirrors an assistant's pairs in a dict tagged with the
+knowledge-base version it was loaded under; the dict is reloaded once the
+version moves on, so edits in any process reach every mirror.
+"""
+
+import logging
+import threading
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from .models import ExactAnswer
+from .utils import question_digest
+
+logger = logging.getLogger(__name__)
+
+EXACT_SOURCE = "exact_match"
+EXACT_CONFIDENCE = 1.0
+
+_mirror = {}
+_mirror_lock = threading.Lock()
+
+
+def load_exact_answers(assistant_id, version):
+    """
+    ``{question_hash: answer_text}`` of the curated pairs and the pairs learned under ``version``.
+    """
+    rows = (
+        ExactAnswer.objects
+        .filter(assistant_id=assistant_id)
+        .filter(Q(source='curated') | Q(source='learned', knowledge_version=version))
+        .values_list('question_hash', 'answer', 'entry__content')
+    )
+    return {digest: entry_content or answer for digest, answer, entry_content in rows if entry_content or answer}
+
+
+def get_exact_answers(assistant_id, version):
+    mirrored = _mirror.get(assistant_id)
+    if mirrored is None or mirrored[0] != version:
+        answers = load_exact_answers(assistant_id, version)
+        with _mirror_lock:
+            _mirror[assistant_id] = (version, answers)
+        return answers
+    return mirrored[1]
+
+
+def find_exact_answer(assistant_id, question: str, version):
+    """
+    Answer dict for a question with an exact-match pair, or None.
+    """
+    if not settings.EXACT_ANSWERS:
+        return None
+    text = get_exact_answers(assistant_id, version).get(question_digest(question))
+    if text is None:
+        return None
+    return {"answer": text, "confidence": EXACT_CONFIDENCE, "source": EXACT_SOURCE}
+
+
+def learn_exact_answer(assistant_id, question: str, answer, version):
+    """
+    Remember a knowledge base answer confident enough to be repeated without retrieval.
+
+    ``version`` is the knowledge-base version read before retrieving, so an
+    answer computed from pre-edit data is never learned under the new one.
+    """
+    if not settings.EXACT_ANSWERS or answer["confidence"] < settings.EXACT_ANSWER_LEARN_THRESHOLD:
+        return
+
+    digest = question_digest(question)
+    fields = {"question": question, "answer": answer["answer"], "knowledge_version": version}
+    try:
+        updated = ExactAnswer.objects.filter(assistant_id=assistant_id, question_hash=digest, source='learned').update(**fields)
+        if not updated:
+            with transaction.atomic():
+                ExactAnswer.objects.create(assistant_id=assistant_id, source='learned', **fields)
+    except IntegrityError:
+        # A curated pair for the question, or a concurrent request got there first
+        return
+    except Exception as e:
+        logger.warning(f"Could not learn exact answer for assistant {assistant_id}: {e}")
+        return
+
+    mirrored = _mirror.get(assistant_id)
+    if mirrored is not None and mirrored[0] == version:
+        with _mirror_lock:
+            mirrored[1][digest] = answer["answer"]
@@ -0,0 +1,79 @@
+"""
+A local stand-in for the Gemini REST API with injectable latency and errors.
+
+Point GEMINI_API_ENDPOINT at it (e.g. ``http://127.0.0.1:8765``) to exercise
+timeouts, retries, hedging and the circuit breaker without calling Google.
+Only ``generateContent`` and ``streamGenerateContent`` are implemented.
+"""
+
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = "This is a fake Gemini answer."
+
+
+def candidate(text):
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+    }
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Answers every model with ``server.answer`` after ``server.latency`` seconds,
+    failing a ``server.error_rate`` share of requests with ``server.error_status``.
+    """
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        server.requests += 1
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if random.random() < server.error_rate:
+            self._send_json(server.error_status, {"error": {"code": server.error_status, "message": "Injected error", "status": "UNAVAILABLE"}})
+            return
+
+        path = self.path.split('?', 1)[0]
+        if path.endswith(':streamGenerateContent'):
+            # The REST transport reads a JSON array of partial responses
+            words = server.answer.split(' ')
+            chunks = [candidate(word + (' ' if i < len(words) - 1 else '')) for i, word in enumerate(words)]
+            self._send_json(200, chunks)
+        elif path.endswith(':generateContent'):
+            self._send_json(200, candidate(server.answer))
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, error_status=503, answer=DEFAULT_ANSWER):
+    """
+    Build (but do not start) a fake Gemini server; port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), FakeGeminiHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.error_status = error_status
+    server.answer = answer
+    server.requests = 0
+    return server
@@ -1,39 +1,104 @@
+import logging
+import threading
+import time
 from django.conf import settings
-import google.generativeai as genai  
-from .models import KnowledgeBaseEntry   
+from .context import build_context
+from .models import KnowledgeBaseEntry
+from .resilience import CircuitBreaker, LatencyTracker, call_with_retries, acall_with_retries, hedged_call, ahedged_call
 
-genai.configure(api_key=settings.GEMINI_API_KEY)
+logger = logging.getLogger(__name__)
+
+
+def gemini_client_options():
+    """
+    Arguments for genai.configure; GEMINI_API_ENDPOINT points the client at another
+    endpoint, such as the local fake started with ``manage.py fake_gemini``.
+    """
+    options = {"api_key": settings.GEMINI_API_KEY}
+    if settings.GEMINI_API_ENDPOINT:
+        options.update(transport="rest", client_options={"api_endpoint": settings.GEMINI_API_ENDPOINT})
+    return options
 
 _model = None
+_model_lock = threading.Lock()
 
 def get_gemini_model():
     """
-    Lazily load and cache the Gemini model for efficiency.
+    Lazily configure the SDK, then load and cache the Gemini model.
     """
     global _model
     if _model is None:
-        _model = genai.GenerativeModel("gemini-2.0-flash")
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                genai.configure(**gemini_client_options())
+                _model = genai.GenerativeModel("gemini-2.0-flash")
     return _model
 
-MAX_CONTEXT_LENGTH = 3000
+_retryable_errors = None
 
-def get_knowledge_context(assistant):
+def retryable_errors():
     """
-    Build a context string from all knowledge base entries for Gemini.
+    Errors that say the upstream is unhealthy, as opposed to a rejected prompt.
     """
-    entries = KnowledgeBaseEntry.objects.filter(assistant=assistant, embedding__isnull=False)
-    context_blocks = []
-    for entry in entries:
-        block = f"- {entry.content}"
-        context_blocks.append(block)
-    full_context = "\n".join(context_blocks)
-    return full_context[:MAX_CONTEXT_LENGTH]
+    global _retryable_errors
+    if _retryable_errors is None:
+        import requests
+        from google.api_core import exceptions as api_exceptions
+        _retryable_errors = (
+            api_exceptions.DeadlineExceeded,
+            api_exceptions.ServiceUnavailable,
+            api_exceptions.InternalServerError,
+            api_exceptions.TooManyRequests,
+            # The REST transport raises these unwrapped on timeouts and refused connections
+            requests.exceptions.Timeout,
+            requests.exceptions.ConnectionError,
+            TimeoutError,
+            ConnectionError,
+        )
+    return _retryable_errors
 
-def ask_gemini(query: str, context: str) -> str:
+_breaker = None
+_latency = LatencyTracker()
+
+def get_gemini_breaker():
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(
+            'gemini',
+            failure_rate=settings.GEMINI_BREAKER_FAILURE_RATE,
+            window=settings.GEMINI_BREAKER_WINDOW,
+            min_calls=settings.GEMINI_BREAKER_MIN_CALLS,
+            reset_timeout=settings.GEMINI_BREAKER_RESET_TIMEOUT,
+        )
+    return _breaker
+
+def gemini_metrics():
     """
-    Query Gemini with a prompt and context, returning the answer as text.
+    Circuit state and transition counts, plus the observed p95 latency in seconds.
+    """
+    return {**get_gemini_breaker().metrics(), "p95_latency": _latency.percentile(95)}
+
+def get_knowledge_context(assistant, max_tokens=None):
+    """
+    Build a context string from an assistant's knowledge base entries for Gemini
+    when there is no query to rank by. Entries are streamed newest first and
+    packed until the token budget is spent.
+    """
+    entries = (
+        KnowledgeBaseEntry.objects
+        .filter(assistant=assistant, embedding_f32__isnull=False)
+        .only('id', 'content')
+        .order_by('-updated_at')
+        .iterator(chunk_size=100)
+    )
+    return build_context(((entry, 1.0) for entry in entries), max_tokens=max_tokens)
+
+def build_prompt(query: str, context: str) -> str:
     """
-    prompt = f"""
+    Prompt asking Gemini to answer only from the given context.
+    """
+    return f"""
     You are a smart assistant. Only answer based on the information in the context below.
     If the answer is not found in the context, reply: "I don't have that information."
 
@@ -44,10 +109,128 @@ def ask_gemini(query: str, context: str) -> str:
     {query}
     """.strip()
 
+def request_options():
+    # retry=None turns off the client library's own retries of 503s (up to 600s),
+    # which would hide failures from call_with_retries and the circuit breaker
+    return {"timeout": settings.GEMINI_TIMEOUT, "retry": None}
+
+def retry_options():
+    return {
+        "attempts": settings.GEMINI_MAX_ATTEMPTS,
+        "base_delay": settings.GEMINI_RETRY_BASE_DELAY,
+        "max_delay": settings.GEMINI_RETRY_MAX_DELAY,
+        "retry_on": retryable_errors(),
+    }
+
+def _generate(prompt: str) -> str:
+    started = time.perf_counter()
+    response = get_gemini_model().generate_content(prompt, request_options=request_options())
+    _latency.record(time.perf_counter() - started)
+    return response.text.strip()
+
+def _hedge_after():
+    # Hedge once a call is slower than 95% of recent ones
+    return _latency.percentile(95) or settings.GEMINI_HEDGE_DELAY
+
+def _generate_hedged(prompt: str) -> str:
+    if not settings.GEMINI_HEDGE:
+        return _generate(prompt)
+    return hedged_call(lambda: _generate(prompt), _hedge_after())
+
+async def _agenerate(prompt: str) -> str:
+    started = time.perf_counter()
+    response = await get_gemini_model().generate_content_async(prompt, request_options=request_options())
+    _latency.record(time.perf_counter() - started)
+    return response.text.strip()
+
+async def _agenerate_hedged(prompt: str) -> str:
+    if not settings.GEMINI_HEDGE:
+        return await _agenerate(prompt)
+    return await ahedged_call(lambda: _agenerate(prompt), _hedge_after())
+
+def ask_gemini(query: str, context: str) -> str:
+    """
+    Query Gemini with a prompt and context, returning the answer as text.
+
+    Each attempt is bounded by GEMINI_TIMEOUT and transient errors are retried
+    with jitter. While the circuit is open no call is made and None is returned
+    straight away.
+    """
+    breaker = get_gemini_breaker()
+    if not breaker.allow():
+        logger.warning("Gemini circuit open, skipping call")
+        return None
+
+    prompt = build_prompt(query, context)
+    try:
+        text = call_with_retries(lambda: _generate_hedged(prompt), **retry_options())
+    except retryable_errors() as e:
+        breaker.record_failure()
+        logger.error(f"Gemini API error: {e}")
+        return None
+    except Exception as e:
+        # Gemini answered, it just refused or sent nothing usable
+        breaker.record_success()
+        logger.error(f"Gemini API error: {e}")
+        return None
+
+    breaker.record_success()
+    return text
+
+class GeminiStreamError(Exception):
+    """
+    Gemini failed before a streamed answer was complete.
+    """
+
+
+def stream_gemini(query: str, context: str):
+    """
+    Yield Gemini's answer text chunk by chunk as it is generated.
+
+    Raises GeminiStreamError when the call fails, possibly after some chunks
+    were already yielded, so a truncated answer is never mistaken for a whole one.
+    """
+    breaker = get_gemini_breaker()
+    if not breaker.allow():
+        logger.warning("Gemini circuit open, skipping call")
+        return
+
+    prompt = build_prompt(query, context)
     try:
         model = get_gemini_model()
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        for chunk in model.generate_content(prompt, stream=True, request_options=request_options()):
+            if chunk.text:
+                yield chunk.text
+    except retryable_errors() as e:
+        breaker.record_failure()
+        logger.error(f"Gemini API error: {e}")
+        raise GeminiStreamError(str(e)) from e
+    except Exception as e:
+        breaker.record_success()
+        logger.error(f"Gemini API error: {e}")
+        raise GeminiStreamError(str(e)) from e
+    breaker.record_success()
+
+async def ask_gemini_async(query: str, context: str) -> str:
+    """
+    Async variant of ask_gemini that awaits the Gemini async client instead of blocking a worker.
+    """
+    breaker = get_gemini_breaker()
+    if not breaker.allow():
+        logger.warning("Gemini circuit open, skipping call")
+        return None
+
+    prompt = build_prompt(query, context)
+    try:
+        text = await acall_with_retries(lambda: _agenerate_hedged(prompt), **retry_options())
+    except retryable_errors() as e:
+        breaker.record_failure()
+        logger.error(f"Gemini API error: {e}")
+        return None
     except Exception as e:
-        print(f"Gemini API error: {e}")
+        breaker.record_success()
+        logger.error(f"Gemini API error: {e}")
         return None
+
+    breaker.record_success()
+    return text
@@ -0,0 +1,121 @@
+"""
+Hybrid retrieval: Postgres full-text search fused with vector search.
+
+Embeddings are good at paraphrases but blur exact tokens such as order
+numbers, phone numbers and SKUs, which full-text search matches verbatim.
+Both rankings are combined with reciprocal rank fusion, which only looks at
+positions, so the two kinds of score never have to be put on one scale.
+
+Fused hits keep their cosine similarity as the score, so the direct answer
+threshold means the same thing in both modes. The best hit containing every
+identifier-like token of the query as a whole token is moved to the top,
+so it leads the Gemini context; its score is left alone, so whether it is
+answered directly is still decided by the threshold.
+"""
+
+import re
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from .models import KnowledgeBaseEntry
+from .semantic_search import EmbeddingIndex, open_index, load_vectors, load_matched_entries
+from .utils import get_embedding
+
+SEARCH_CONFIG = 'english'
+TERM_RE = re.compile(r'\w+')
+# Tokens with a digit in them, e.g. "12345", "ORD-12345" or "AB12C"
+IDENTIFIER_RE = re.compile(r'[\w-]*\d[\w-]*')
+
+
+def identifier_tokens(text: str):
+    """
+    Lower-cased identifier-like tokens of ``text`` of at least three characters.
+    """
+    return {token.lower().strip('-') for token in IDENTIFIER_RE.findall(text) if len(token) >= 3}
+
+
+def lexical_search(assistant_id, query: str, top_k: int = 20):
+    """
+    Ids of the assistant's entries matching any term of ``query``, best full-text rank first.
+    """
+    terms = TERM_RE.findall(query)
+    if not terms or top_k <= 0:
+        return []
+
+    # OR the terms: a question rarely shares every word with the entry that answers it
+    search_query = SearchQuery(' | '.join(terms), search_type='raw', config=SEARCH_CONFIG)
+    return list(
+        KnowledgeBaseEntry.objects
+        .filter(assistant_id=assistant_id, search_vector=search_query)
+        .annotate(rank=SearchRank(F('search_vector'), search_query, cover_density=True))
+        .order_by('-rank', 'id')
+        .values_list('id', flat=True)[:top_k]
+    )
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """
+    Fuse ranked id lists into ``(id, score)`` pairs, best first.
+
+    Every list contributes ``1 / (k + position)`` for each id it ranks.
+    """
+    scores = {}
+    for ranking in rankings:
+        for position, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + position)
+    return sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+
+
+def hybrid_search(assistant, index, query: str, query_embedding, top_k: int = 5):
+    """
+    Up to ``top_k`` ``(entry_id, cosine_score)`` hits in fused order.
+    """
+    candidates = max(top_k, settings.HYBRID_CANDIDATES)
+    vector_hits = index.search(query_embedding, top_k=candidates) if index else []
+    lexical_ids = lexical_search(assistant.pk, query, candidates)
+
+    fused = reciprocal_rank_fusion(
+        [[entry_id for entry_id, _ in vector_hits], lexical_ids],
+        k=settings.HYBRID_RRF_K,
+    )[:top_k]
+
+    cosine = dict(vector_hits)
+    # Entries only full-text search found still need a cosine score
+    missing = [entry_id for entry_id, _ in fused if entry_id not in cosine]
+    if missing:
+        exact = EmbeddingIndex.from_rows(load_vectors(missing))
+        cosine.update(exact.search(query_embedding, top_k=len(exact)))
+
+    return [(entry_id, cosine.get(entry_id, 0.0)) for entry_id, _ in fused]
+
+
+def contains_identifiers(text: str, identifiers) -> bool:
+    """
+    True when every identifier occurs in ``text`` as a whole token, so "48213" does not match "ORD-482130".
+    """
+    text = text.lower()
+    return all(re.search(rf'\b{re.escape(identifier)}\b', text) for identifier in identifiers)
+
+
+def boost_identifier_matches(matches, query: str):
+    """
+    Move the best ``(entry, score)`` match containing all identifiers in ``query`` to the top.
+    """
+    identifiers = identifier_tokens(query)
+    if not identifiers:
+        return matches
+
+    for position, (entry, score) in enumerate(matches):
+        if contains_identifiers(entry.content, identifiers):
+            return [matches[position], *matches[:position], *matches[position + 1:]]
+    return matches
+
+
+def find_hybrid_matches(assistant, query: str, top_k: int = 5):
+    """
+    Hybrid counterpart of find_top_matches.
+    """
+    index = open_index(assistant)
+    query_embedding = get_embedding(query) if index else None
+    hits = hybrid_search(assistant, index, query, query_embedding, top_k=top_k)
+    return boost_identifier_matches(load_matched_entries(hits), query)
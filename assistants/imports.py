@@ -0,0 +1,161 @@
+"""
+Streaming bulk import of knowledge base entries from CSV or JSON Lines files.
+
+The uploaded file is read row by row (never fully loaded into memory), each
+row is validated, valid rows are inserted with ``bulk_create`` in chunks, and
+every inserted chunk is embedded right away with one batched encode call.
+Progress is recorded on a KnowledgeImportJob so clients can poll it.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from .embeddings import embed_chunk
+from .models import KnowledgeBaseEntry, KnowledgeImportJob
+
+logger = logging.getLogger(__name__)
+
+MAX_REPORTED_ERRORS = 50
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(file_name: str, requested: str = None):
+    """
+    Resolve the file format from an explicit value or the file extension.
+    """
+    file_format = (requested or os.path.splitext(file_name)[1].lstrip('.')).lower()
+    if file_format == 'json':
+        file_format = 'jsonl'
+    if file_format not in dict(KnowledgeImportJob.FORMAT_CHOICES):
+        raise ValueError("Unsupported file format. Upload a .csv or .jsonl file.")
+    return file_format
+
+
+def clean_content(value):
+    if not isinstance(value, str):
+        raise RowError("'content' must be a string")
+    value = value.strip()
+    if not value:
+        raise RowError("'content' is empty")
+    if len(value) > settings.KNOWLEDGE_IMPORT_MAX_CONTENT_LENGTH:
+        raise RowError(f"'content' is longer than {settings.KNOWLEDGE_IMPORT_MAX_CONTENT_LENGTH} characters")
+    return value
+
+
+def iter_rows(stream, file_format: str):
+    """
+    Yield ``(row_number, content_or_error)`` for every row of a text stream.
+
+    Invalid rows yield a RowError instead of raising, so one bad line does not
+    abort the import.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        if not reader.fieldnames or 'content' not in reader.fieldnames:
+            raise ValueError("CSV file must have a 'content' column")
+        # Row 1 is the header
+        for row_number, row in enumerate(reader, start=2):
+            try:
+                yield row_number, clean_content(row.get('content'))
+            except RowError as e:
+                yield row_number, e
+    else:
+        for row_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise RowError("each line must be a JSON object")
+                yield row_number, clean_content(row.get('content'))
+            except json.JSONDecodeError as e:
+                yield row_number, RowError(f"invalid JSON: {e.msg}")
+            except RowError as e:
+                yield row_number, e
+
+
+def run_import(job, stream, chunk_size: int = None):
+    """
+    Import every valid row of ``stream`` into ``job.assistant``'s knowledge base.
+    """
+    chunk_size = chunk_size or settings.KNOWLEDGE_IMPORT_CHUNK_SIZE
+    job.status = 'running'
+    job.save(update_fields=['status', 'updated_at'])
+
+    chunk = []
+
+    def flush():
+        created = KnowledgeBaseEntry.objects.bulk_create(chunk)
+        embed_chunk(created)
+        job.rows_imported += len(created)
+        chunk.clear()
+        KnowledgeImportJob.objects.filter(pk=job.pk).update(
+            rows_processed=job.rows_processed,
+            rows_imported=job.rows_imported,
+            rows_failed=job.rows_failed,
+            errors=job.errors,
+            updated_at=timezone.now(),
+        )
+
+    try:
+        for row_number, content in iter_rows(stream, job.file_format):
+            job.rows_processed += 1
+            if isinstance(content, RowError):
+                job.rows_failed += 1
+                if len(job.errors) < MAX_REPORTED_ERRORS:
+                    job.errors.append({"row": row_number, "error": str(content)})
+                continue
+
+            chunk.append(KnowledgeBaseEntry(assistant_id=job.assistant_id, content=content, import_job=job))
+            if len(chunk) >= chunk_size:
+                flush()
+
+        if chunk:
+            flush()
+        job.status = 'completed'
+    except Exception as e:
+        logger.exception("knowledge import %s failed", job.pk)
+        job.status = 'failed'
+        job.errors.append({"row": None, "error": str(e)})
+
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def _run_import_file(job_id, path):
+    try:
+        job = KnowledgeImportJob.objects.get(pk=job_id)
+        with open(path, 'rb') as raw:
+            # utf-8-sig strips the BOM spreadsheet tools like to add
+            stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+            run_import(job, stream)
+    finally:
+        os.unlink(path)
+        connection.close()
+
+
+def start_import(job, uploaded_file):
+    """
+    Spool an uploaded file to disk in chunks and import it in a background thread.
+    """
+    with tempfile.NamedTemporaryFile(prefix='neura-import-', delete=False) as spool:
+        for data in uploaded_file.chunks():
+            spool.write(data)
+
+    threading.Thread(
+        target=_run_import_file,
+        args=(job.pk, spool.name),
+        name=f'knowledge-import-{job.pk}',
+        daemon=True,
+    ).start()
@@ -0,0 +1,189 @@
+"""
+Process-wide registry of in-process search indexes.
+
+An assistant's index is loaded on its first query and kept for later ones.
+When the knowledge base changes, the entries changed since the index was
+loaded (recorded by ``bump_knowledge_version``) are re-read and patched in;
+the index is only reloaded in full when those changes are not known. With
+SEARCH_SNAPSHOT_DIR set, the patched index is written as the new version's
+snapshot and mapped from there, so it stays shared between processes. The
+registry tracks the bytes held by every index and evicts the least
+recently used ones once SEARCH_INDEX_CACHE_BYTES is exceeded, so only the
+assistants active recently stay in memory.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .caching import get_knowledge_version, get_knowledge_changes
+from .semantic_search import EmbeddingIndex, load_index, load_vectors
+from .snapshots import open_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def index_nbytes(index):
+    """
+    Bytes held by an index: its vectors plus the id array.
+    """
+    return index.nbytes + index.ids.nbytes
+
+
+class _Item:
+    def __init__(self, stamp, index, nbytes):
+        self.stamp = stamp
+        self.index = index
+        self.nbytes = nbytes
+
+
+class IndexRegistry:
+    """
+    LRU cache of search indexes keyed by assistant, bounded by ``max_bytes`` (None for no bound).
+    """
+
+    def __init__(self, max_bytes, loader=load_index, vector_loader=load_vectors):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.vector_loader = vector_loader
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.updates = 0
+        self.load_seconds = 0.0
+        self.update_seconds = 0.0
+
+    def _lookup(self, key, stamp):
+        # Caller holds self._lock
+        item = self._items.get(key)
+        if item is None or item.stamp != stamp:
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item.index
+
+    def get(self, assistant):
+        """
+        The assistant's index, loading it if it is not held or is out of date.
+        """
+        key = assistant.pk
+        # Read before loading, so an index built from pre-edit data is never filed under the new version
+        stamp = (get_knowledge_version(key), assistant.search_precision)
+        with self._lock:
+            index = self._lookup(key, stamp)
+            if index is not None:
+                return index
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Concurrent first queries for one assistant wait for a single load
+        with load_lock:
+            with self._lock:
+                index = self._lookup(key, stamp)
+                if index is not None:
+                    return index
+                previous = self._items.get(key)
+
+            started = time.perf_counter()
+            index = self._updated(key, previous, stamp) if previous is not None else None
+            if index is not None:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.updates += 1
+                    self.update_seconds += elapsed
+                    self._store(key, stamp, index)
+                return index
+
+            index = self.loader(assistant)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.misses += 1
+                self.load_seconds += elapsed
+                self._store(key, stamp, index)
+        return index
+
+    def _updated(self, key, previous, stamp):
+        """
+        ``previous`` index patched up to ``stamp``, or None when it has to be reloaded.
+        """
+        (old_version, old_precision), (version, precision) = previous.stamp, stamp
+        if old_precision != precision or version < old_version or not len(previous.index):
+            return None
+        changed_ids = get_knowledge_changes(key, old_version, version)
+        if changed_ids is None:
+            return None
+        try:
+            if settings.SEARCH_SNAPSHOT_DIR and isinstance(previous.index, EmbeddingIndex):
+                # A patched copy would be private to this process; save it as the shared snapshot.
+                # Another process may have written that version already, and is mapped instead
+                return open_snapshot(
+                    settings.SEARCH_SNAPSHOT_DIR, key, lambda: self._patched(previous.index, changed_ids),
+                    EmbeddingIndex, version=version,
+                )
+            return self._patched(previous.index, changed_ids)
+        except Exception:
+            # E.g. the embedding dimension changed; a full reload sorts it out
+            logger.exception("could not update search index of assistant %s", key)
+            return None
+
+    def _patched(self, index, changed_ids):
+        if not changed_ids:
+            return index
+        return index.with_changes(changed_ids, list(self.vector_loader(changed_ids)))
+
+    def _store(self, key, stamp, index):
+        # Caller holds self._lock
+        self._discard(key)
+        nbytes = index_nbytes(index)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            logger.warning("search index of assistant %s (%d bytes) exceeds the registry budget", key, nbytes)
+            return
+        self._items[key] = _Item(stamp, index, nbytes)
+        self.bytes += nbytes
+        while self.max_bytes is not None and self.bytes > self.max_bytes:
+            evicted_key, _ = next(iter(self._items.items()))
+            self._discard(evicted_key)
+            self.evictions += 1
+
+    def _discard(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.bytes -= item.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            loads = self.misses
+            return {
+                "indexes": len(self._items),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "updates": self.updates,
+                "load_ms_total": round(self.load_seconds * 1000, 2),
+                "load_ms_mean": round(self.load_seconds * 1000 / loads, 2) if loads else 0.0,
+                "update_ms_total": round(self.update_seconds * 1000, 2),
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_index_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                # Without a budget only quantized indexes are kept, and kept for good
+                _registry = IndexRegistry(settings.SEARCH_INDEX_CACHE_BYTES or None)
+    return _registry
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from assistants.models import KnowledgeBaseEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Clear the double precision[] embedding column of entries that already "
+        "have a float32 copy, in batches. Run VACUUM afterwards to give the "
+        "space back to Postgres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if settings.EMBEDDING_ARRAY_COLUMN:
+            raise CommandError("EMBEDDING_ARRAY_COLUMN is set: the pgvector trigger still reads the array column")
+
+        redundant = KnowledgeBaseEntry.objects.filter(embedding__isnull=False, embedding_f32__isnull=False)
+        done = 0
+        while True:
+            ids = list(redundant.order_by('id').values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            # The vectors themselves do not change, so no knowledge version is bumped
+            done += KnowledgeBaseEntry.objects.filter(id__in=ids).update(embedding=None)
+            self.stdout.write(f"  {done} cleared (last id {ids[-1]})")
+
+        self.stdout.write(self.style.SUCCESS(f"Cleared {done} embedding arrays."))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from assistants.models import KnowledgeBaseEntry
+from assistants.utils import EMBEDDING_BACKENDS, embedding_parity
+
+SAMPLE_TEXTS = [
+    "What are your business hours?",
+    "How do I contact customer support?",
+    "Our store is open Monday to Friday, 9 AM to 5 PM.",
+    "Refunds are processed within five business days of receiving the item.",
+    "Do you ship internationally?",
+    "You can reset your password from the login page by clicking 'Forgot password'.",
+    "Where is your office located?",
+    "We accept Visa, Mastercard and bank transfers.",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that two embedding backends produce the same vectors. Compares "
+        "the per-text cosine similarity against --threshold and reports encode times."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reference', default='torch', choices=EMBEDDING_BACKENDS)
+        parser.add_argument('--candidate', default='onnx', choices=EMBEDDING_BACKENDS)
+        parser.add_argument('--threshold', type=float, default=0.99,
+                            help="Lowest acceptable cosine similarity")
+        parser.add_argument('--sample', type=int, default=0,
+                            help="Also compare this many knowledge base entries")
+
+    def handle(self, *args, **options):
+        texts = list(SAMPLE_TEXTS)
+        if options['sample']:
+            texts += list(
+                KnowledgeBaseEntry.objects.order_by('?').values_list('content', flat=True)[:options['sample']]
+            )
+
+        cosines, timings = embedding_parity(texts, options['reference'], options['candidate'])
+
+        worst = min(cosines)
+        self.stdout.write(f"texts: {len(texts)}")
+        self.stdout.write(f"cosine min: {worst:.4f} mean: {sum(cosines) / len(cosines):.4f}")
+        for backend, ms in timings.items():
+            self.stdout.write(f"{backend} encode: {ms} ms")
+
+        if worst < options['threshold']:
+            text = texts[cosines.index(worst)]
+            raise CommandError(f"Parity below {options['threshold']}: {worst:.4f} for {text[:80]!r}")
+        self.stdout.write(self.style.SUCCESS("Backends agree"))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from assistants.embedding_server import make_server
+from assistants.utils import get_model
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the shared embedding server on a Unix socket. Set "
+        "EMBEDDING_SERVER_SOCKET to the same path in the web and worker "
+        "processes so they encode through it instead of loading the model."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.EMBEDDING_SERVER_SOCKET,
+                            help="Socket path (default: EMBEDDING_SERVER_SOCKET)")
+
+    def handle(self, *args, **options):
+        path = options['socket']
+        if not path:
+            raise CommandError("Pass --socket or set EMBEDDING_SERVER_SOCKET")
+
+        # Load before accepting connections so the first request does not wait for it
+        get_model().encode(["warm up"])
+        server = make_server(path)
+        self.stdout.write(f"Embedding server listening on {path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from assistants.fake_gemini import make_server, DEFAULT_ANSWER
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local fake Gemini endpoint with injected latency and errors. "
+        "Set GEMINI_API_ENDPOINT=http://<host>:<port> for the app to use it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help="Seconds to wait before answering")
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help="Share of requests (0-1) that fail")
+        parser.add_argument('--error-status', type=int, default=503,
+                            help="HTTP status of injected failures")
+        parser.add_argument('--answer', default=DEFAULT_ANSWER)
+
+    def handle(self, *args, **options):
+        server = make_server(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            error_status=options['error_status'],
+            answer=options['answer'],
+        )
+        host, port = server.server_address[:2]
+        self.stdout.write(f"Fake Gemini listening on http://{host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
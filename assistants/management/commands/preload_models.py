@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from assistants.preload import preload_models
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the embedding model and Gemini client and report how long it took. "
+        "Useful at deploy time to fill the model cache; set PRELOAD_MODELS=True "
+        "to warm every web process at startup instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-gemini', action='store_true',
+                            help="Only load the embedding model")
+
+    def handle(self, *args, **options):
+        timings = preload_models(gemini=not options['skip_gemini'])
+        for step, ms in timings.items():
+            self.stdout.write(f"{step}: {ms} ms")
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from assistants.embeddings import embed_entries, stale_embeddings, DEFAULT_CHUNK_SIZE, DEFAULT_BATCH_SIZE
+from assistants.models import Assistant, KnowledgeBaseEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate knowledge base embeddings in batches. By default only entries "
+        "without an embedding, or whose content changed since it was computed, "
+        "are processed, so an interrupted run can simply be started again; use "
+        "--after-id to resume an --all run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assistant', type=int, action='append', dest='assistants',
+                            help="Only entries of this assistant id (repeatable)")
+        scope = parser.add_mutually_exclusive_group()
+        scope.add_argument('--missing', action='store_true',
+                           help="Only entries with a missing or stale embedding (default)")
+        scope.add_argument('--all', action='store_true',
+                           help="Re-embed every matching entry")
+        parser.add_argument('--after-id', type=int, default=None,
+                            help="Skip entries with an id up to and including this one")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Entries read and written per chunk")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Batch size passed to model.encode")
+
+    def handle(self, *args, **options):
+        queryset = KnowledgeBaseEntry.objects.all()
+
+        if options['assistants']:
+            found = set(Assistant.objects.filter(id__in=options['assistants']).values_list('id', flat=True))
+            missing = set(options['assistants']) - found
+            if missing:
+                raise CommandError(f"Unknown assistant id(s): {', '.join(map(str, sorted(missing)))}")
+            queryset = queryset.filter(assistant_id__in=found)
+
+        if not options['all']:
+            queryset = stale_embeddings(queryset)
+
+        if options['after_id'] is not None:
+            queryset = queryset.filter(id__gt=options['after_id'])
+
+        total = queryset.count()
+        if not total:
+            self.stdout.write("Nothing to embed.")
+            return
+
+        self.stdout.write(f"Embedding {total} entries...")
+
+        def progress(done, last_id):
+            self.stdout.write(f"  {done}/{total} embedded (last id {last_id})")
+
+        done = embed_entries(
+            queryset,
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Embedded {done} entries."))
@@ -0,0 +1,88 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from assistants.models import Assistant
+from assistants.retrieval import DIRECT_ANSWER_THRESHOLD
+from assistants.semantic_search import QuantizedIndex, load_index
+from assistants.utils import get_embeddings
+
+
+def recall_report(exact, quantized, queries, top_k, threshold=DIRECT_ANSWER_THRESHOLD):
+    """
+    Compare a quantized index against the exact one over ``queries``.
+    """
+    def direct(hits):
+        # The entry that would be returned as a direct knowledge-base answer, if any
+        return hits[0][0] if hits and hits[0][1] >= threshold else None
+
+    recalls = []
+    same_top = 0
+    same_decision = 0
+    for query in queries:
+        expected = exact.search(query, top_k=top_k)
+        found = quantized.search(query, top_k=top_k)
+        expected_ids = {entry_id for entry_id, _ in expected}
+        recalls.append(len(expected_ids & {entry_id for entry_id, _ in found}) / max(len(expected_ids), 1))
+        same_top += bool(expected and found and expected[0][0] == found[0][0])
+        same_decision += direct(expected) == direct(found)
+
+    count = max(len(queries), 1)
+    return {
+        "queries": len(queries),
+        "recall_at_k": sum(recalls) / count,
+        "top1_agreement": same_top / count,
+        "direct_answer_agreement": same_decision / count,
+        "float32_bytes": exact.nbytes,
+        "quantized_bytes": quantized.nbytes,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how a quantized search precision changes results for an assistant: "
+        "recall@k, top-1 agreement and agreement on direct answers at the 0.7 "
+        "threshold, plus the in-memory size of both indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('assistant', type=int)
+        parser.add_argument('--precision', default='int8', choices=['int8', 'float16'])
+        parser.add_argument('--top-k', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=200,
+                            help="Number of stored entries to use as queries")
+        parser.add_argument('--questions', default=None,
+                            help="File with one question per line to use as queries instead")
+        parser.add_argument('--rescore-factor', type=int, default=4)
+
+    def handle(self, *args, **options):
+        try:
+            assistant = Assistant.objects.get(pk=options['assistant'])
+        except Assistant.DoesNotExist:
+            raise CommandError(f"Unknown assistant id: {options['assistant']}")
+
+        # Always compare against the exact index, whatever the assistant uses today
+        assistant.search_precision = 'float32'
+        exact = load_index(assistant)
+        if not len(exact):
+            raise CommandError("This assistant has no embedded entries")
+
+        vectors = dict(zip(exact.ids.tolist(), exact.matrix))
+        quantized = QuantizedIndex.from_index(
+            exact,
+            options['precision'],
+            lambda ids: ((entry_id, vectors[entry_id]) for entry_id in ids),
+            options['rescore_factor'],
+        )
+
+        if options['questions']:
+            with open(options['questions'], encoding='utf-8') as handle:
+                questions = [line.strip() for line in handle if line.strip()]
+            queries = np.asarray(get_embeddings(questions), dtype=np.float32)
+        else:
+            rng = np.random.default_rng(0)
+            picks = rng.choice(len(exact), size=min(options['queries'], len(exact)), replace=False)
+            queries = exact.matrix[picks]
+
+        report = recall_report(exact, quantized, list(queries), options['top_k'])
+        for key, value in report.items():
+            self.stdout.write(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
+        self.stdout.write(f"memory_reduction: {report['float32_bytes'] / max(report['quantized_bytes'], 1):.2f}x")
@@ -0,0 +1,93 @@
+"""
+Optional pgvector column for KnowledgeBaseEntry embeddings.
+
+When the ``vector`` extension can be installed, this adds an
+``embedding_vector vector(384)`` column kept in sync with the existing
+``embedding`` array by a trigger, backfills it, and builds an HNSW cosine
+index. On databases without pgvector the migration is a no-op and semantic
+search keeps using the in-process backend.
+"""
+
+import logging
+from django.db import migrations, transaction, DatabaseError
+
+logger = logging.getLogger(__name__)
+
+# all-MiniLM-L6-v2 produces 384-dimensional embeddings
+DIMENSIONS = 384
+
+FORWARD_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS vector",
+    f"ALTER TABLE assistants_knowledgebaseentry ADD COLUMN IF NOT EXISTS embedding_vector vector({DIMENSIONS})",
+    f"""
+    CREATE OR REPLACE FUNCTION assistants_sync_embedding_vector() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.embedding IS NOT NULL AND array_length(NEW.embedding, 1) = {DIMENSIONS} THEN
+            NEW.embedding_vector := NEW.embedding::vector({DIMENSIONS});
+        ELSE
+            NEW.embedding_vector := NULL;
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS assistants_sync_embedding_vector ON assistants_knowledgebaseentry",
+    """
+    CREATE TRIGGER assistants_sync_embedding_vector
+    BEFORE INSERT OR UPDATE OF embedding ON assistants_knowledgebaseentry
+    FOR EACH ROW EXECUTE FUNCTION assistants_sync_embedding_vector()
+    """,
+    f"""
+    UPDATE assistants_knowledgebaseentry
+    SET embedding_vector = embedding::vector({DIMENSIONS})
+    WHERE array_length(embedding, 1) = {DIMENSIONS}
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS assistants_kb_embedding_vector_hnsw
+    ON assistants_knowledgebaseentry USING hnsw (embedding_vector vector_cosine_ops)
+    """,
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS assistants_sync_embedding_vector ON assistants_knowledgebaseentry",
+    "DROP FUNCTION IF EXISTS assistants_sync_embedding_vector()",
+    "ALTER TABLE assistants_knowledgebaseentry DROP COLUMN IF EXISTS embedding_vector",
+]
+
+
+def add_embedding_vector(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'vector'")
+        if cursor.fetchone() is None:
+            logger.info("pgvector is not available; skipping embedding_vector column")
+            return
+
+    try:
+        with transaction.atomic(using=connection.alias):
+            for statement in FORWARD_SQL:
+                schema_editor.execute(statement)
+    except DatabaseError as e:
+        # Usually missing privileges for CREATE EXTENSION
+        logger.warning(f"Could not enable pgvector: {e}")
+
+
+def remove_embedding_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in REVERSE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistants', '0006_alter_assistant_platform'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_embedding_vector, remove_embedding_vector),
+    ]
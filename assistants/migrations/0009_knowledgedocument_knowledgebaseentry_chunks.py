@@ -0,0 +1,45 @@
+# Generated by Django 5.2.2 on 2026-10-17 11:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistants', '0008_knowledgeimportjob_knowledgebaseentry_import_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KnowledgeDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assistant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='assistants.assistant')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='assistants.knowledgedocument'),
+        ),
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='chunk_index',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='char_start',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='char_end',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
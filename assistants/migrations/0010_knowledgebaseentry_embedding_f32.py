@@ -0,0 +1,45 @@
+# Generated by Django 5.2.2 on 2026-10-17 14:20
+
+from django.db import migrations
+
+import assistants.fields
+
+BATCH_SIZE = 1000
+
+
+def copy_embeddings(apps, schema_editor):
+    # Historical models have no custom save(), so pack the vectors here
+    KnowledgeBaseEntry = apps.get_model('assistants', 'KnowledgeBaseEntry')
+    pending = (
+        KnowledgeBaseEntry.objects
+        .filter(embedding__isnull=False, embedding_f32__isnull=True)
+        .order_by('id')
+        .only('id', 'embedding')
+    )
+    batch = []
+    for entry in pending.iterator(chunk_size=BATCH_SIZE):
+        if not entry.embedding:
+            continue
+        entry.embedding_f32 = assistants.fields.pack_vector(entry.embedding)
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            KnowledgeBaseEntry.objects.bulk_update(batch, ['embedding_f32'])
+            batch = []
+    if batch:
+        KnowledgeBaseEntry.objects.bulk_update(batch, ['embedding_f32'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistants', '0009_knowledgedocument_knowledgebaseentry_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='embedding_f32',
+            field=assistants.fields.Float32VectorField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_embeddings, migrations.RunPython.noop),
+    ]
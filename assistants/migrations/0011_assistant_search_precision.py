@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-17 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistants', '0010_knowledgebaseentry_embedding_f32'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assistant',
+            name='search_precision',
+            field=models.CharField(choices=[('float32', 'Float32 (exact)'), ('float16', 'Float16'), ('int8', 'Int8')], default='float32', max_length=10),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-17 16:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistants', '0011_assistant_search_precision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assistant',
+            name='retrieval_mode',
+            field=models.CharField(choices=[('vector', 'Vector'), ('hybrid', 'Hybrid (vector + full-text)')], default='vector', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('content', config='english'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='knowledgebaseentry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='kb_entry_search_vector_gin'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.2 on 2026-10-17 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistants', '0012_hybrid_retrieval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExactAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('question_hash', models.CharField(editable=False, max_length=64)),
+                ('answer', models.TextField(blank=True)),
+                ('source', models.CharField(choices=[('curated', 'Curated'), ('learned', 'Learned')], default='curated', max_length=10)),
+                ('knowledge_version', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assistant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exact_answers', to='assistants.assistant')),
+                ('entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='exact_answers', to='assistants.knowledgebaseentry')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('assistant', 'question_hash'), name='unique_exact_answer_question')],
+            },
+        ),
+    ]
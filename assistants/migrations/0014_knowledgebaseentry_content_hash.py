@@ -0,0 +1,38 @@
+# Generated by Django 5.2.2 on 2026-10-17 18:10
+
+import hashlib
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def hash_embedded_content(apps, schema_editor):
+    # Existing embeddings were computed from the content they are stored with.
+    # Hashed in Python (as utils.content_digest does) so no pgcrypto is needed
+    KnowledgeBaseEntry = apps.get_model('assistants', 'KnowledgeBaseEntry')
+    embedded = Q(embedding_f32__isnull=False) | Q(embedding__isnull=False)
+    entries = KnowledgeBaseEntry.objects.filter(embedded).only('id', 'content').order_by('id')
+    batch = []
+    for entry in entries.iterator(chunk_size=1000):
+        entry.content_hash = hashlib.sha256(entry.content.encode('utf-8')).hexdigest()
+        batch.append(entry)
+        if len(batch) >= 1000:
+            KnowledgeBaseEntry.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    if batch:
+        KnowledgeBaseEntry.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistants', '0013_exactanswer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(hash_embedded_content, migrations.RunPython.noop),
+    ]
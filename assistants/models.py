@@ -1,6 +1,12 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from .fields import Float32VectorField
+from .utils import question_digest, content_digest
 
 User = get_user_model()
 
@@ -8,6 +14,15 @@ class Assistant(models.Model):
     PLATFORM_CHOICE = [
         ('whatsapp', 'WhatsApp')
     ]
+    SEARCH_PRECISION_CHOICES = [
+        ('float32', 'Float32 (exact)'),
+        ('float16', 'Float16'),
+        ('int8', 'Int8'),
+    ]
+    RETRIEVAL_MODE_CHOICES = [
+        ('vector', 'Vector'),
+        ('hybrid', 'Hybrid (vector + full-text)'),
+    ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assistants')
     name = models.CharField(max_length=100)
@@ -15,6 +30,10 @@ class Assistant(models.Model):
     description = models.TextField(blank=True)
     platform = models.CharField(max_length=20, choices=PLATFORM_CHOICE, default='whatsapp')
     group_id = models.CharField(max_length=100, blank=True, null=True)
+    # How vectors are held in memory for in-process search; lower precision saves RAM
+    search_precision = models.CharField(max_length=10, choices=SEARCH_PRECISION_CHOICES, default='float32')
+    # Hybrid also ranks entries by full-text search, which catches exact tokens such as order numbers
+    retrieval_mode = models.CharField(max_length=10, choices=RETRIEVAL_MODE_CHOICES, default='vector')
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -23,14 +42,162 @@ class Assistant(models.Model):
         return self.name
     
 
+class KnowledgeDocument(models.Model):
+    """
+    A long source document whose chunks are stored as KnowledgeBaseEntry rows.
+    """
+    assistant = models.ForeignKey('Assistant', on_delete=models.CASCADE, related_name='documents')
+    title = models.CharField(max_length=255, blank=True)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.assistant.name} - {self.title or self.content[:50]}"
+
+
+class KnowledgeImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+
+    assistant = models.ForeignKey('Assistant', on_delete=models.CASCADE, related_name='import_jobs')
+    file_name = models.CharField(max_length=255, blank=True)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.assistant.name} - import #{self.pk} ({self.status})"
+
+
 class KnowledgeBaseEntry(models.Model):
     assistant = models.ForeignKey('Assistant', on_delete=models.CASCADE, related_name='knowledge_entries')
     content = models.TextField()
     embedding = ArrayField(models.FloatField(), blank=True, null=True)
+    # Normalized float32 copy of ``embedding`` that the search index is loaded from
+    embedding_f32 = Float32VectorField(blank=True, null=True)
+    # SHA-256 of the content the embedding was computed from; differs from the content's own hash once it is stale
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    # Kept up to date by Postgres; used by hybrid retrieval
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config='english'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    import_job = models.ForeignKey('KnowledgeImportJob', on_delete=models.SET_NULL, blank=True, null=True, related_name='entries')
+    # Set when the entry is one chunk of a longer KnowledgeDocument
+    document = models.ForeignKey('KnowledgeDocument', on_delete=models.CASCADE, blank=True, null=True, related_name='chunks')
+    chunk_index = models.PositiveIntegerField(blank=True, null=True)
+    char_start = models.PositiveIntegerField(blank=True, null=True)
+    char_end = models.PositiveIntegerField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='kb_entry_search_vector_gin'),
+        ]
+
     def __str__(self):
         # Show a preview of the content with the assistant's name
         return f"{self.assistant.name} - {self.content[:50]}"
 
+    def set_embedding(self, embedding):
+        """
+        Store an embedding, or clear it with None. Use this on paths that skip save().
+
+        The vector is kept in ``embedding_f32``; the ``embedding`` array is only
+        written when EMBEDDING_ARRAY_COLUMN is set, for the pgvector trigger.
+        """
+        self.embedding_f32 = embedding if embedding is not None and len(embedding) else None
+        keep_array = settings.EMBEDDING_ARRAY_COLUMN and self.embedding_f32 is not None
+        self.embedding = [float(value) for value in embedding] if keep_array else None
+
+    @property
+    def vector(self):
+        """
+        The entry's embedding: the float32 copy, or the array of entries saved before it existed.
+        """
+        return self.embedding_f32 if self.embedding_f32 is not None else self.embedding
+
+    @property
+    def embedding_is_stale(self):
+        """
+        True when the entry has no embedding or its content changed since it was embedded.
+        """
+        return not self.content_hash or content_digest(self.content) != self.content_hash
+
+    def save(self, *args, **kwargs):
+        deferred = self.get_deferred_fields()
+        # A vector assigned to ``embedding`` is moved into the float32 column
+        if 'embedding' not in deferred and self.embedding is not None:
+            self.set_embedding(self.embedding)
+        if 'embedding_f32' not in deferred:
+            if self.vector is None:
+                self.content_hash = ''
+            elif not self.content_hash:
+                # An embedding given without a hash is taken to match the content
+                self.content_hash = content_digest(self.content)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'embedding', 'embedding_f32'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'embedding', 'embedding_f32', 'content_hash'}
+        super().save(*args, **kwargs)
+
+
+
+class ExactAnswer(models.Model):
+    """
+    A question answered without retrieval when it is asked verbatim (up to case and spacing).
+
+    Curated pairs are entered in the admin, either with their own answer text
+    or pointing at a knowledge base entry. Learned pairs are recorded from
+    high-confidence knowledge base answers and only count for the
+    knowledge-base version they were learned under.
+    """
+    SOURCE_CHOICES = [
+        ('curated', 'Curated'),
+        ('learned', 'Learned'),
+    ]
+
+    assistant = models.ForeignKey('Assistant', on_delete=models.CASCADE, related_name='exact_answers')
+    question = models.TextField()
+    question_hash = models.CharField(max_length=64, editable=False)
+    answer = models.TextField(blank=True)
+    entry = models.ForeignKey('KnowledgeBaseEntry', on_delete=models.CASCADE, blank=True, null=True, related_name='exact_answers')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='curated')
+    knowledge_version = models.BigIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['assistant', 'question_hash'], name='unique_exact_answer_question'),
+        ]
+
+    def __str__(self):
+        return f"{self.assistant.name} - {self.question[:50]}"
+
+    def clean(self):
+        if not self.answer and self.entry_id is None:
+            raise ValidationError("Give an answer or pick a knowledge base entry.")
+
+    def save(self, *args, **kwargs):
+        self.question_hash = question_digest(self.question)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'question' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'question_hash'}
+        super().save(*args, **kwargs)
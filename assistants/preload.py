@@ -0,0 +1,45 @@
+"""
+Model warm-up for web processes.
+
+The embedding model and the Gemini client are loaded lazily on first use.
+Calling ``preload_models`` at startup (see neura/wsgi.py and neura/asgi.py, or
+``manage.py preload_models``) moves that cost out of the first user request.
+"""
+
+import logging
+import time
+from .gemini import get_gemini_model
+from .utils import get_model, get_embeddings
+from .embedding_server import get_embedding_client
+
+logger = logging.getLogger(__name__)
+
+
+def preload_models(gemini: bool = True):
+    """
+    Load the models and run one encode so lazy initialisation is done too.
+
+    With an embedding server configured the model stays in the server; only
+    the connection is warmed up. Returns how long each step took, in milliseconds.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    if get_embedding_client() is not None:
+        get_embeddings(["warm up"])
+        timings['embedding_server'] = round((time.perf_counter() - started) * 1000, 2)
+    else:
+        get_model()
+        timings['load_embedding_model'] = round((time.perf_counter() - started) * 1000, 2)
+
+        started = time.perf_counter()
+        get_model().encode(["warm up"])
+        timings['first_encode'] = round((time.perf_counter() - started) * 1000, 2)
+
+    if gemini:
+        started = time.perf_counter()
+        get_gemini_model()
+        timings['gemini_client'] = round((time.perf_counter() - started) * 1000, 2)
+
+    logger.info("preloaded models timings_ms=%s", timings)
+    return timings
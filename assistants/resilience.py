@@ -0,0 +1,233 @@
+"""
+Failure handling for calls to upstream services such as Gemini.
+
+``CircuitBreaker`` stops calling an upstream whose recent error rate is too
+high and lets a single probe through once the cool-down has passed.
+``call_with_retries`` retries transient errors with full-jitter exponential
+backoff, and ``hedged_call`` starts a second copy of a slow call and keeps
+whichever finishes first; ``ahedged_call`` does the same for coroutines.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker.
+
+    The circuit opens when at least ``min_calls`` of the last ``window`` calls
+    were made and ``failure_rate`` of them failed. After ``reset_timeout``
+    seconds one probe call is let through; its outcome closes or re-opens it.
+    """
+
+    def __init__(self, name, failure_rate=0.5, window=20, min_calls=10, reset_timeout=30.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._transitions = {}
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Whether a call may go ahead now.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            # A probe that never reported back (e.g. an abandoned stream) does not block forever
+            if self.state == HALF_OPEN and (not self._probe_in_flight or now - self._probe_started >= self.reset_timeout):
+                self._probe_in_flight = True
+                self._probe_started = now
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._outcomes.append(True)
+            if self.state == HALF_OPEN:
+                self._outcomes.clear()
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False)
+            if self.state == HALF_OPEN:
+                self._transition(OPEN)
+            elif self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._transition(OPEN)
+
+    def _transition(self, state):
+        key = f"{self.state}->{state}"
+        self._transitions[key] = self._transitions.get(key, 0) + 1
+        logger.warning("circuit %s %s", self.name, key)
+        self.state = state
+        self._probe_in_flight = False
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": self._outcomes.count(False),
+                "rejected": self._rejected,
+                "transitions": dict(self._transitions),
+            }
+
+
+class LatencyTracker:
+    """
+    Keeps the latencies of recent successful calls to estimate a percentile.
+    """
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct, min_samples=20):
+        """
+        The ``pct`` percentile in seconds, or None until ``min_samples`` calls were seen.
+        """
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """
+    Full-jitter exponential backoff: uniform in [0, min(max_delay, base_delay * 2**attempt)].
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def call_with_retries(fn, attempts=3, base_delay=0.2, max_delay=2.0, retry_on=(Exception,), sleep=time.sleep):
+    """
+    Call ``fn`` up to ``attempts`` times, sleeping with jitter between failures.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except retry_on as e:
+            if attempt == attempts - 1:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.info(f"Retrying after {type(e).__name__} in {delay:.2f}s (attempt {attempt + 1}/{attempts})")
+            sleep(delay)
+
+
+async def acall_with_retries(fn, attempts=3, base_delay=0.2, max_delay=2.0, retry_on=(Exception,)):
+    """
+    Async variant of call_with_retries; ``fn`` returns an awaitable.
+    """
+    for attempt in range(attempts):
+        try:
+            return await fn()
+        except retry_on as e:
+            if attempt == attempts - 1:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.info(f"Retrying after {type(e).__name__} in {delay:.2f}s (attempt {attempt + 1}/{attempts})")
+            await asyncio.sleep(delay)
+
+
+def _start_thread(fn):
+    """
+    Run ``fn`` on a new daemon thread and return a Future for its result.
+    """
+    future = Future()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name='hedge', daemon=True).start()
+    return future
+
+
+def hedged_call(fn, hedge_after):
+    """
+    Call ``fn``; if it has not finished after ``hedge_after`` seconds, start a
+    second call and return the first successful result.
+
+    Each copy gets its own thread rather than a slot in a shared pool, so
+    concurrent calls are never capped or queued, and a copy waiting for a
+    free worker can never be mistaken for a slow call and hedged.
+    """
+    futures = [_start_thread(fn)]
+    done, _ = wait(futures, timeout=hedge_after)
+    if not done:
+        logger.info(f"Hedging call after {hedge_after:.2f}s")
+        futures.append(_start_thread(fn))
+
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # The slower copy is left to finish on its own
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def ahedged_call(fn, hedge_after):
+    """
+    Async variant of hedged_call; ``fn`` returns an awaitable.
+
+    Unlike a thread, the copy that loses the race can be cancelled.
+    """
+    tasks = [asyncio.ensure_future(fn())]
+    done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+    if not done:
+        logger.info(f"Hedging call after {hedge_after:.2f}s")
+        tasks.append(asyncio.ensure_future(fn()))
+
+    pending = set(tasks)
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,310 @@
+"""
+Single-pass retrieval shared by AnswerQueryView and the WhatsApp webhook.
+
+The query is embedded once and the knowledge base is read once; the same
+ranked hits provide both the direct answer and the Gemini context.
+"""
+
+import logging
+import time
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .caching import get_knowledge_version, answer_cache_key, get_cached_answer, cache_answer
+from .chunking import merge_adjacent_chunks
+from .context import build_context
+from .exact_answers import find_exact_answer, learn_exact_answer
+from .gemini import GeminiStreamError, ask_gemini, ask_gemini_async, stream_gemini
+from .hybrid import hybrid_search, boost_identifier_matches
+from .semantic_search import open_index, load_matched_entries
+from .utils import get_embedding, get_embedding_async
+
+logger = logging.getLogger(__name__)
+
+DIRECT_ANSWER_THRESHOLD = 0.7
+GEMINI_CONFIDENCE = 0.5
+NO_CONTEXT_MESSAGE = "There is no relevant information available."
+FALLBACK_SOURCE = "knowledge_base_fallback"
+
+
+class RetrievalResult:
+    """
+    Best hit and top-k matches for one query, with per-stage timings in milliseconds.
+
+    ``more_hits`` are further ``(entry_id, score)`` hits below the top-k; they
+    are only loaded, page by page, if the Gemini context asks for them.
+    """
+
+    def __init__(self, matches, threshold, timings, more_hits=()):
+        self.matches = matches
+        self.threshold = threshold
+        self.timings = timings
+        self.more_hits = list(more_hits)
+
+    @property
+    def best_score(self):
+        # Hybrid matches are in fused order, so the highest cosine score need not come first
+        return max((score for _, score in self.matches), default=0.0)
+
+    @property
+    def direct_hit(self):
+        """
+        The first ``(entry, score)`` match, in ranked order, whose score reaches the threshold, or None.
+
+        Fusion and identifier boosts only reorder matches, so hybrid mode
+        answers directly whenever vector mode would.
+        """
+        return next(((entry, score) for entry, score in self.matches if score >= self.threshold), None)
+
+    @property
+    def best_entry(self):
+        # Only a hit above the threshold is good enough to answer directly
+        hit = self.direct_hit
+        return hit[0] if hit else None
+
+    def candidates(self):
+        """
+        Ranked ``(entry, score)`` pairs: the matches, then the remaining hits one page at a time.
+        """
+        yield from self.matches
+        page_size = max(len(self.matches), 1)
+        for start in range(0, len(self.more_hits), page_size):
+            yield from merge_adjacent_chunks(load_matched_entries(self.more_hits[start:start + page_size]))
+
+    @cached_property
+    def context(self):
+        """
+        Gemini context packed from the candidates within the token budget.
+        """
+        return build_context(self.candidates()) or NO_CONTEXT_MESSAGE
+
+
+class _StageTimer:
+    """
+    Records how long each named stage of the pipeline takes.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = round((now - self._last) * 1000, 2)
+        self._last = now
+
+
+def retrieve(assistant, query: str, top_k: int = 5, threshold: float = DIRECT_ANSWER_THRESHOLD):
+    """
+    Embed ``query`` once and return the assistant's top ``top_k`` matches.
+    """
+    timer = _StageTimer()
+
+    index = open_index(assistant)
+    timer.mark('load_index')
+
+    query_embedding = None
+    if index:
+        query_embedding = get_embedding(query)
+        timer.mark('embed')
+
+    return rank(assistant, index, query, query_embedding, top_k, threshold, timer)
+
+
+def rank(assistant, index, query, query_embedding, top_k, threshold, timer):
+    """
+    Search ``index`` with an already computed query embedding and fetch the winners.
+
+    Assistants in hybrid retrieval mode also rank by full-text search.
+    """
+    hybrid = assistant.retrieval_mode == 'hybrid'
+    matches = []
+    more_hits = []
+    if index:
+        # Ids and scores are cheap; extra candidates are only loaded if the context needs them
+        candidates = max(top_k, settings.CONTEXT_CANDIDATES)
+        if hybrid:
+            hits = hybrid_search(assistant, index, query, query_embedding, top_k=candidates)
+        else:
+            hits = index.search(query_embedding, top_k=candidates)
+        timer.mark('search')
+
+        matches = load_matched_entries(hits[:top_k])
+        if hybrid:
+            matches = boost_identifier_matches(matches, query)
+        matches = merge_adjacent_chunks(matches)
+        more_hits = hits[top_k:]
+        timer.mark('fetch')
+
+    result = RetrievalResult(matches, threshold, timer.timings, more_hits)
+    logger.info(
+        "retrieval assistant=%s matches=%d best_score=%.3f timings_ms=%s",
+        assistant.pk, len(matches), result.best_score, result.timings,
+    )
+    return result
+
+
+def answer_question(assistant, question: str):
+    """
+    Answer from the knowledge base when confident, otherwise fall back to Gemini.
+
+    Returns a dict with ``answer`` (None when nothing could be produced),
+    ``confidence`` and ``source``. Exact-match pairs are checked first, before
+    the question is embedded, and answers are cached per knowledge-base version.
+    """
+    version = get_knowledge_version(assistant.pk)
+    exact = find_exact_answer(assistant.pk, question, version)
+    if exact is not None:
+        return exact
+
+    cache_key = answer_cache_key(assistant.pk, question, version)
+    cached = get_cached_answer(cache_key)
+    if cached is not None:
+        return cached
+
+    result = retrieve(assistant, question)
+    if result.best_entry:
+        answer = direct_answer(result)
+        learn_exact_answer(assistant.pk, question, answer, version)
+    else:
+        started = time.perf_counter()
+        answer = gemini_answer(ask_gemini(question, result.context), result)
+        logger.info("gemini assistant=%s took_ms=%.2f", assistant.pk, (time.perf_counter() - started) * 1000)
+
+    if is_cacheable(answer):
+        cache_answer(cache_key, answer)
+    return answer
+
+
+def stream_answer(assistant, question: str):
+    """
+    Streaming variant of answer_question yielding ``(event, data)`` pairs.
+
+    Cached and knowledge-base answers are a single ``answer`` event. A Gemini
+    answer is forwarded as ``chunk`` events while it is generated, followed by
+    a ``done`` event carrying the complete answer.
+    """
+    version = get_knowledge_version(assistant.pk)
+    exact = find_exact_answer(assistant.pk, question, version)
+    if exact is not None:
+        yield "answer", exact
+        return
+
+    cache_key = answer_cache_key(assistant.pk, question, version)
+    cached = get_cached_answer(cache_key)
+    if cached is not None:
+        yield "answer", cached
+        return
+
+    result = retrieve(assistant, question)
+    if result.best_entry:
+        answer = direct_answer(result)
+        learn_exact_answer(assistant.pk, question, answer, version)
+        cache_answer(cache_key, answer)
+        yield "answer", answer
+        return
+
+    started = time.perf_counter()
+    parts = []
+    try:
+        for text in stream_gemini(question, result.context):
+            if not parts:
+                logger.info("gemini assistant=%s first_chunk_ms=%.2f", assistant.pk, (time.perf_counter() - started) * 1000)
+            parts.append(text)
+            yield "chunk", {"text": text}
+    except GeminiStreamError:
+        # Never cached. After partial chunks, an error event tells the client to replace them
+        yield ("error" if parts else "done"), gemini_answer(None, result)
+        return
+    logger.info("gemini assistant=%s took_ms=%.2f", assistant.pk, (time.perf_counter() - started) * 1000)
+
+    answer = gemini_answer("".join(parts).strip(), result)
+    if is_cacheable(answer):
+        cache_answer(cache_key, answer)
+    yield "done", answer
+
+
+def direct_answer(result):
+    entry, score = result.direct_hit
+    return {
+        "answer": entry.content,
+        "confidence": round(score, 2),
+        "source": "knowledge_base",
+    }
+
+
+def gemini_answer(text, result=None):
+    if text:
+        return {"answer": text, "confidence": GEMINI_CONFIDENCE, "source": "gemini"}
+    if result is not None and result.best_score >= settings.GEMINI_FALLBACK_MIN_SCORE:
+        # Gemini failed or its circuit is open: answer from the closest entry, if it is close enough
+        entry, score = max(result.matches, key=lambda match: match[1])
+        return {"answer": entry.content, "confidence": round(score, 2), "source": FALLBACK_SOURCE}
+    return {"answer": None, "confidence": 0, "source": None}
+
+
+def is_cacheable(answer):
+    # Fallback answers are not cached, so the next request tries Gemini again
+    return bool(answer["answer"]) and answer["source"] != FALLBACK_SOURCE
+
+
+_embedding_executor = None
+
+def _get_embedding_executor():
+    # Dedicated threads so CPU-bound encoding never blocks the event loop or the ORM thread
+    global _embedding_executor
+    if _embedding_executor is None:
+        # Enough threads for a full batch of server calls, so they are not queued behind each other
+        _embedding_executor = ThreadPoolExecutor(
+            max_workers=max(settings.ASYNC_EMBEDDING_WORKERS, settings.EMBEDDING_BATCH_MAX_SIZE),
+            thread_name_prefix='embedding',
+        )
+    return _embedding_executor
+
+
+async def retrieve_async(assistant, query: str, top_k: int = 5, threshold: float = DIRECT_ANSWER_THRESHOLD):
+    """
+    Async variant of retrieve: ORM work runs via sync_to_async, the query is embedded with get_embedding_async.
+    """
+    timer = _StageTimer()
+
+    index = await sync_to_async(open_index)(assistant)
+    timer.mark('load_index')
+
+    query_embedding = None
+    if index:
+        query_embedding = await get_embedding_async(query, _get_embedding_executor())
+        timer.mark('embed')
+
+    return await sync_to_async(rank)(assistant, index, query, query_embedding, top_k, threshold, timer)
+
+
+async def answer_question_async(assistant, question: str):
+    """
+    Async variant of answer_question that awaits Gemini instead of holding a worker.
+    """
+    version = await sync_to_async(get_knowledge_version)(assistant.pk)
+    exact = await sync_to_async(find_exact_answer)(assistant.pk, question, version)
+    if exact is not None:
+        return exact
+
+    cache_key = answer_cache_key(assistant.pk, question, version)
+    cached = await sync_to_async(get_cached_answer)(cache_key)
+    if cached is not None:
+        return cached
+
+    result = await retrieve_async(assistant, question)
+    if result.best_entry:
+        answer = direct_answer(result)
+        await sync_to_async(learn_exact_answer)(assistant.pk, question, answer, version)
+    else:
+        started = time.perf_counter()
+        # Packing the context may load further candidates from the database
+        context = await sync_to_async(getattr)(result, 'context')
+        answer = gemini_answer(await ask_gemini_async(question, context), result)
+        logger.info("gemini assistant=%s took_ms=%.2f", assistant.pk, (time.perf_counter() - started) * 1000)
+
+    if is_cacheable(answer):
+        await sync_to_async(cache_answer)(cache_key, answer)
+    return answer
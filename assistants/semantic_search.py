@@ -1,68 +1,411 @@
-import torch
-from sentence_transformers import util
+"""
+Vectorized semantic search over an assistant's knowledge base.
+
+An assistant's embeddings are loaded into one contiguous float32 matrix whose
+rows are normalized to unit length, so the cosine similarity of every entry is
+a single matrix-vector product. Only ids and vectors are read for scoring;
+``content`` is fetched afterwards for the winning entries only.
+
+With ``SEMANTIC_SEARCH_BACKEND = 'pgvector'`` the ranking is delegated to
+Postgres instead (see ``vector_store``).
+"""
+
+from itertools import chain, islice
+import numpy as np
+from django.conf import settings
 from .models import KnowledgeBaseEntry
+from .snapshots import open_snapshot
 from .utils import get_embedding
 
-def find_best_match(assistant, query: str, threshold: float = 0.6):
-    # Convert query to embedding
-    query_embedding = get_embedding(query)
 
-    entries = KnowledgeBaseEntry.objects.filter(assistant=assistant, embedding__isnull=False)
+def normalize_vector(vector):
+    """
+    Return ``vector`` as a unit-length float32 array (zero vectors stay zero).
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector = vector / norm
+    return vector
 
-    if not entries:
-        return None, 0.0
 
-    best_entry = None
-    best_score = 0.0
+def normalize_rows(matrix):
+    """
+    Normalize every row of ``matrix`` to unit length in place and return it.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class EmbeddingIndex:
+    """
+    Pre-normalized embedding matrix for one assistant, row-aligned with entry ids.
+    """
+
+    def __init__(self, ids, matrix):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.matrix = matrix
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build an index from ``(entry_id, embedding)`` pairs, skipping empty embeddings.
+        """
+        ids = []
+        vectors = []
+        for entry_id, embedding in rows:
+            if embedding is None or len(embedding) == 0:
+                continue
+            ids.append(entry_id)
+            vectors.append(embedding)
+
+        if not vectors:
+            return cls(ids, np.empty((0, 0), dtype=np.float32))
+
+        matrix = np.ascontiguousarray(np.array(vectors, dtype=np.float32))
+        return cls(ids, normalize_rows(matrix))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes
+
+    def scores(self, query_vector):
+        """
+        Cosine similarity of ``query_vector`` against every row.
+        """
+        return self.matrix @ normalize_vector(query_vector)
+
+    def search(self, query_vector, top_k: int = 5):
+        """
+        Return up to ``top_k`` ``(entry_id, score)`` pairs, highest score first.
+        """
+        if not len(self) or top_k <= 0:
+            return []
+
+        scores = self.scores(query_vector)
+        k = min(top_k, len(scores))
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(self.ids[i]), float(scores[i])) for i in order]
+
+    def with_changes(self, changed_ids, rows):
+        """
+        A new index with the rows of ``changed_ids`` dropped and ``rows`` appended.
+
+        ``rows`` are the current ``(entry_id, embedding)`` pairs of the changed
+        entries that still have one, so an entry is added, replaced or, when
+        it has no row, tombstoned. Only the new rows are normalized; the rest
+        of the matrix is copied as is.
+        """
+        added = EmbeddingIndex.from_rows(rows)
+        if not len(self):
+            return added
+        keep = ~np.isin(self.ids, changed_ids)
+        if not len(added):
+            return EmbeddingIndex(self.ids[keep], np.ascontiguousarray(self.matrix[keep]))
+        return EmbeddingIndex(
+            np.concatenate([self.ids[keep], added.ids]),
+            np.concatenate([self.matrix[keep], added.matrix]),
+        )
+
+
+SCORE_BLOCK_ROWS = 4096
+
+
+def quantize_int8(matrix):
+    """
+    Symmetric int8 codes with one float32 scale per row: ``row ~= codes * scale``.
+    """
+    scales = (np.abs(matrix).max(axis=1) / 127).astype(np.float32)
+    safe = np.where(scales > 0, scales, 1).astype(np.float32)
+    codes = np.rint(matrix / safe[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def quantize_matrix(matrix, precision):
+    """
+    ``(codes, scales)`` of a normalized float32 matrix; ``scales`` is None for float16.
+    """
+    if precision == 'int8':
+        return quantize_int8(matrix)
+    if precision == 'float16':
+        return matrix.astype(np.float16), None
+    raise ValueError(f"Unsupported search precision {precision!r}")
+
+
+class QuantizedIndex:
+    """
+    Memory-saving variant of EmbeddingIndex.
+
+    Rows are kept as int8 (with a per-row scale) or float16, about 4x or 2x
+    smaller than float32. Searches score every row approximately, then rescore
+    the best ``top_k * rescore_factor`` candidates against exact float32
+    vectors fetched through ``load_vectors(ids)``, so the returned scores are
+    the same as EmbeddingIndex's.
+    """
+
+    def __init__(self, ids, codes, scales, precision, load_vectors, rescore_factor=4):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.codes = codes
+        self.scales = scales
+        self.precision = precision
+        self.load_vectors = load_vectors
+        self.rescore_factor = rescore_factor
+
+    @classmethod
+    def from_blocks(cls, blocks, precision, load_vectors, rescore_factor=4):
+        """
+        Quantize an iterable of EmbeddingIndex blocks one block at a time.
+
+        Only one block is ever held as float32, so building the index never
+        needs the memory of the full-precision matrix.
+        """
+        quantize_matrix(np.empty((0, 0), dtype=np.float32), precision)
+        ids, codes, scales = [], [], []
+        for block in blocks:
+            if not len(block):
+                continue
+            block_codes, block_scales = quantize_matrix(block.matrix, precision)
+            ids.append(block.ids)
+            codes.append(block_codes)
+            scales.append(block_scales)
+
+        if not ids:
+            dtype = np.int8 if precision == 'int8' else np.float16
+            empty_scales = np.empty(0, dtype=np.float32) if precision == 'int8' else None
+            return cls([], np.empty((0, 0), dtype=dtype), empty_scales, precision, load_vectors, rescore_factor)
+        return cls(
+            np.concatenate(ids),
+            np.concatenate(codes),
+            np.concatenate(scales) if precision == 'int8' else None,
+            precision,
+            load_vectors,
+            rescore_factor,
+        )
+
+    @classmethod
+    def from_index(cls, index, precision, load_vectors, rescore_factor=4):
+        blocks = (
+            EmbeddingIndex(index.ids[start:start + SCORE_BLOCK_ROWS], index.matrix[start:start + SCORE_BLOCK_ROWS])
+            for start in range(0, len(index), SCORE_BLOCK_ROWS)
+        )
+        return cls.from_blocks(blocks, precision, load_vectors, rescore_factor)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, query_vector):
+        """
+        Approximate cosine similarity of ``query_vector`` against every row.
+        """
+        query = normalize_vector(query_vector)
+        scores = np.empty(len(self), dtype=np.float32)
+        # Upcast a block at a time so scoring never materializes the float32 matrix
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            block = self.codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def search(self, query_vector, top_k: int = 5):
+        """
+        Return up to ``top_k`` ``(entry_id, score)`` pairs with exact scores, highest first.
+        """
+        if not len(self) or top_k <= 0:
+            return []
+
+        approx = self.scores(query_vector)
+        n = min(len(approx), top_k * self.rescore_factor)
+        if n < len(approx):
+            candidates = np.argpartition(-approx, n - 1)[:n]
+        else:
+            candidates = np.arange(len(approx))
 
-    for entry in entries:
-        score = util.cos_sim(torch.tensor(query_embedding), torch.tensor(entry.embedding))[0][0].item()
-        if score > best_score:
-            best_score = score
-            best_entry = entry
+        exact = EmbeddingIndex.from_rows(self.load_vectors(self.ids[candidates].tolist()))
+        return exact.search(query_vector, top_k=top_k)
+
+    def with_changes(self, changed_ids, rows):
+        """
+        Same as EmbeddingIndex.with_changes; only the new rows are quantized.
+        """
+        added = EmbeddingIndex.from_rows(rows)
+        keep = ~np.isin(self.ids, changed_ids)
+        if not len(added):
+            scales = self.scales[keep] if self.scales is not None else None
+            return QuantizedIndex(self.ids[keep], self.codes[keep], scales, self.precision, self.load_vectors, self.rescore_factor)
+        added = QuantizedIndex.from_index(added, self.precision, self.load_vectors, self.rescore_factor)
+        if not len(self):
+            return added
+        scales = np.concatenate([self.scales[keep], added.scales]) if self.scales is not None else None
+        return QuantizedIndex(
+            np.concatenate([self.ids[keep], added.ids]),
+            np.concatenate([self.codes[keep], added.codes]),
+            scales,
+            self.precision,
+            self.load_vectors,
+            self.rescore_factor,
+        )
+
+
+def load_vectors(entry_ids):
+    """
+    Exact ``(entry_id, vector)`` pairs for the given entries.
+    """
+    entries = KnowledgeBaseEntry.objects.filter(id__in=entry_ids).order_by('id')
+    return chain(
+        entries.filter(embedding_f32__isnull=False).values_list('id', 'embedding_f32'),
+        entries.filter(embedding_f32__isnull=True, embedding__isnull=False).values_list('id', 'embedding'),
+    )
+
+
+def embedding_rows(assistant, chunk_size=None):
+    """
+    ``(entry_id, vector)`` pairs of an assistant's knowledge base.
+
+    Vectors come from the float32 column, whose values arrive as arrays over
+    the fetched bytes; only entries that have no float32 copy yet fall back
+    to parsing the ``double precision[]`` column. With ``chunk_size`` rows
+    are streamed instead of fetched all at once.
+    """
+    entries = KnowledgeBaseEntry.objects.filter(assistant=assistant).order_by('id')
+    packed = entries.filter(embedding_f32__isnull=False).values_list('id', 'embedding_f32')
+    legacy = entries.filter(embedding_f32__isnull=True, embedding__isnull=False).values_list('id', 'embedding')
+    if chunk_size:
+        return chain(packed.iterator(chunk_size=chunk_size), legacy.iterator(chunk_size=chunk_size))
+    return chain(packed, legacy)
+
+
+def build_index(assistant):
+    """
+    Load the embeddings of an assistant's knowledge base from the database into an EmbeddingIndex.
+    """
+    return EmbeddingIndex.from_rows(embedding_rows(assistant))
+
+
+def build_quantized_index(assistant):
+    """
+    Stream an assistant's embeddings from the database straight into a QuantizedIndex.
+    """
+    return QuantizedIndex.from_blocks(
+        _row_blocks(embedding_rows(assistant, chunk_size=SCORE_BLOCK_ROWS)),
+        assistant.search_precision,
+        load_vectors,
+        settings.SEARCH_RESCORE_FACTOR,
+    )
+
+
+def _row_blocks(rows):
+    rows = iter(rows)
+    while True:
+        block = list(islice(rows, SCORE_BLOCK_ROWS))
+        if not block:
+            return
+        yield EmbeddingIndex.from_rows(block)
+
+
+def load_index(assistant):
+    """
+    The EmbeddingIndex of an assistant's knowledge base.
+
+    With SEARCH_SNAPSHOT_DIR set, the matrix is memory-mapped from a snapshot
+    shared by all processes on the host (see ``snapshots``). Assistants with
+    a reduced ``search_precision`` get a QuantizedIndex, quantized block by
+    block from the snapshot or the database.
+    """
+    if settings.SEARCH_SNAPSHOT_DIR:
+        index = open_snapshot(settings.SEARCH_SNAPSHOT_DIR, assistant.pk, lambda: build_index(assistant), EmbeddingIndex)
+    elif assistant.search_precision != 'float32':
+        return build_quantized_index(assistant)
+    else:
+        return build_index(assistant)
+
+    if assistant.search_precision != 'float32':
+        return QuantizedIndex.from_index(index, assistant.search_precision, load_vectors, settings.SEARCH_RESCORE_FACTOR)
+    return index
+
+
+def open_index(assistant):
+    """
+    Return the searchable index for an assistant using the configured backend.
+
+    With SEARCH_INDEX_CACHE_BYTES set, in-process indexes are kept in the
+    process-wide IndexRegistry between queries. Quantized indexes are always
+    kept there, since rebuilding one per query would cost more memory and
+    time than the float32 index it replaces.
+    """
+    if settings.SEMANTIC_SEARCH_BACKEND == 'pgvector':
+        from .vector_store import PgVectorIndex, pgvector_ready
+        if pgvector_ready():
+            return PgVectorIndex(assistant.pk)
+    if settings.SEARCH_INDEX_CACHE_BYTES or assistant.search_precision != 'float32':
+        from .index_registry import get_index_registry
+        return get_index_registry().get(assistant)
+    return load_index(assistant)
+
+
+def load_matched_entries(hits):
+    """
+    Turn ``(entry_id, score)`` hits into ``(entry, score)`` pairs, fetching content only.
+    """
+    if not hits:
+        return []
+    entries = KnowledgeBaseEntry.objects.defer('embedding', 'embedding_f32', 'search_vector').in_bulk([entry_id for entry_id, _ in hits])
+    return [(entries[entry_id], score) for entry_id, score in hits if entry_id in entries]
+
+
+def find_best_match(assistant, query: str, threshold: float = 0.6):
+    index = open_index(assistant)
+
+    if not index:
+        return None, 0.0
+
+    # Convert query to embedding
+    hits = index.search(get_embedding(query), top_k=1)
+    if not hits:
+        return None, 0.0
+    best_score = hits[0][1]
 
     if best_score >= threshold:
-        return best_entry, best_score
+        matches = load_matched_entries(hits)
+        if matches:
+            return matches[0]
 
     return None, best_score
 
 
 def find_top_matches(assistant, query: str, top_k: int = 5):
-    query_embedding = get_embedding(query)
-    entries = KnowledgeBaseEntry.objects.filter(assistant=assistant, embedding__isnull=False)
+    index = open_index(assistant)
 
-    if not entries:
+    if not index:
         return []
 
-    scored_entries = []
-    for entry in entries:
-        score = util.cos_sim(torch.tensor(query_embedding), torch.tensor(entry.embedding))[0][0].item()
-        scored_entries.append((entry, score))
-
-    # Sort by highest score
-    scored_entries.sort(key=lambda x: x[1], reverse=True)
-
-    # Return top_k entries with scores
-    return scored_entries[:top_k]
+    hits = index.search(get_embedding(query), top_k=top_k)
+    return load_matched_entries(hits)
 
 
 def find_top_matches_from_entries(entries, query: str, top_k: int = 5):
     """
     Same as find_top_matches but takes entries as parameter instead of querying database
     """
-    query_embedding = get_embedding(query)
-    
+    entries = [entry for entry in entries if entry.vector is not None and len(entry.vector)]
+
     if not entries:
         return []
 
-    scored_entries = []
-    for entry in entries:
-        score = util.cos_sim(torch.tensor(query_embedding), torch.tensor(entry.embedding))[0][0].item()
-        scored_entries.append((entry, score))
-
-    # Sort by highest score
-    scored_entries.sort(key=lambda x: x[1], reverse=True)
+    index = EmbeddingIndex.from_rows((position, entry.vector) for position, entry in enumerate(entries))
+    hits = index.search(get_embedding(query), top_k=top_k)
 
     # Return top_k entries with scores
-    return scored_entries[:top_k]
-
+    return [(entries[position], score) for position, score in hits]
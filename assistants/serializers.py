@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Assistant, KnowledgeBaseEntry
+from .models import Assistant, KnowledgeBaseEntry, KnowledgeDocument, KnowledgeImportJob
 import re
 
 class AssistantSerializer(serializers.ModelSerializer):
@@ -39,5 +39,51 @@ class KnowledgeBaseEntrySerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = KnowledgeBaseEntry
-        fields = '__all__'
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        # The vector is stored in embedding_f32 and exposed as ``embedding``
+        exclude = ['embedding_f32', 'search_vector']
+        read_only_fields = ['id', 'import_job', 'document', 'chunk_index', 'char_start', 'char_end', 'created_at', 'updated_at']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        vector = instance.vector
+        # Unit length, as stored; only the direction of an embedding matters for search
+        data['embedding'] = None if vector is None else [float(value) for value in vector]
+        return data
+
+
+class KnowledgeDocumentSerializer(serializers.ModelSerializer):
+    """
+    Serializer for long documents that are stored as chunked knowledge entries.
+    """
+    chunk_count = serializers.IntegerField(source='chunks.count', read_only=True)
+
+    class Meta:
+        model = KnowledgeDocument
+        fields = ['id', 'assistant', 'title', 'content', 'chunk_count', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'chunk_count', 'created_at', 'updated_at']
+
+    def validate_assistant(self, value):
+        # Documents can only be added to the requesting user's own assistants
+        request = self.context.get('request')
+        if request and value.user != request.user:
+            raise serializers.ValidationError("Invalid or Unauthorized Assistant")
+        return value
+
+
+class KnowledgeImportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for bulk import job progress.
+    """
+    rows_embedded = serializers.SerializerMethodField()
+
+    class Meta:
+        model = KnowledgeImportJob
+        fields = [
+            'id', 'assistant', 'file_name', 'file_format', 'status',
+            'rows_processed', 'rows_imported', 'rows_failed', 'rows_embedded',
+            'errors', 'created_at', 'updated_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def get_rows_embedded(self, obj):
+        return obj.entries.filter(embedding_f32__isnull=False).count()
\ No newline at end of file
@@ -1,18 +1,38 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import KnowledgeBaseEntry
-import threading
-from .utils import get_model
+from .models import KnowledgeBaseEntry, ExactAnswer
+from .caching import bump_knowledge_version
+from .embeddings import get_embedding_worker
 
 # Signal runs after a KnowledgeBase object is saved
 @receiver(post_save, sender=KnowledgeBaseEntry)
 def generate_embedding(sender, instance, created, **kwargs):
-    if created and not instance.embedding:
-        # Threading to avoid blocking the request
-        def process_embedding():
-            model = get_model()
-            embedding = model.encode(instance.content).tolist()  # Convert numpy array to list
-            instance.embedding = embedding
-            instance.save(update_fields=['embedding'])  # Save only the embedding field
+    # New entries and edited content get a fresh embedding; other edits cost nothing
+    if not {'content', 'content_hash'} & instance.get_deferred_fields() and instance.embedding_is_stale:
+        # Hand the entry to the process-wide batching worker once the row is visible
+        entry_id = instance.pk
+        transaction.on_commit(lambda: get_embedding_worker().enqueue(entry_id))
 
-        threading.Thread(target=process_embedding).start()
+
+# Any change to an entry invalidates the assistant's cached answers and is
+# recorded so loaded search indexes can update just that entry
+@receiver(post_save, sender=KnowledgeBaseEntry)
+@receiver(post_delete, sender=KnowledgeBaseEntry)
+def invalidate_cached_answers(sender, instance, **kwargs):
+    assistant_id = instance.assistant_id
+    entry_id = instance.pk
+    # After commit, so a concurrent request cannot cache pre-change data under the new version
+    transaction.on_commit(lambda: bump_knowledge_version(assistant_id, changed_ids=[entry_id]))
+
+
+# Curated pairs reach other processes' exact-answer mirrors through a version bump.
+# Learned pairs are tied to the current version already, so saving one bumps nothing
+@receiver(post_save, sender=ExactAnswer)
+@receiver(post_delete, sender=ExactAnswer)
+def invalidate_exact_answers(sender, instance, **kwargs):
+    if kwargs.get('signal') is post_save and instance.source == 'learned':
+        return
+    assistant_id = instance.assistant_id
+    # No entry changed, so loaded search indexes stay as they are
+    transaction.on_commit(lambda: bump_knowledge_version(assistant_id, changed_ids=[]))
@@ -0,0 +1,124 @@
+"""
+Memory-mapped on-disk snapshots of the in-process search index.
+
+An assistant's index (entry ids and the normalized float32 matrix) is saved
+as two ``.npy`` files named after its knowledge-base version and opened with
+``np.load(mmap_mode='r')``. Every worker on the host then reads the same
+page-cache pages instead of holding a private copy, and a restarted worker
+maps the file instead of reloading the embeddings from Postgres.
+
+Snapshots are immutable: a change to the knowledge base bumps the version,
+and the first reader of the new version builds the next snapshot under a
+file lock, writes it to temporary files and renames them into place. Older
+versions are deleted afterwards; processes that still map them keep reading
+the unlinked pages. Versions live in the Django cache, so workers only share
+snapshots when CACHES points at a cache they share (Redis, database, file).
+"""
+
+import fcntl
+import glob
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+from .caching import get_knowledge_version
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_paths(directory, assistant_id, version):
+    prefix = os.path.join(directory, f"{assistant_id}-{version}")
+    return f"{prefix}.ids.npy", f"{prefix}.f32.npy"
+
+
+def _save_atomically(path, array):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def write_snapshot(index, directory, assistant_id, version):
+    """
+    Save ``index`` as the snapshot of ``version``. The matrix file is renamed into place last and marks it complete.
+    """
+    ids_path, matrix_path = snapshot_paths(directory, assistant_id, version)
+    _save_atomically(ids_path, np.ascontiguousarray(index.ids, dtype=np.int64))
+    _save_atomically(matrix_path, np.ascontiguousarray(index.matrix, dtype=np.float32))
+
+
+def read_snapshot(directory, assistant_id, version, index_class):
+    """
+    Map the snapshot of ``version`` into an ``index_class(ids, matrix)``, or return None if there is none.
+    """
+    ids_path, matrix_path = snapshot_paths(directory, assistant_id, version)
+    try:
+        matrix = np.load(matrix_path, mmap_mode='r')
+        ids = np.load(ids_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    return index_class(ids, matrix)
+
+
+def remove_stale_snapshots(directory, assistant_id, version):
+    keep = set(snapshot_paths(directory, assistant_id, version))
+    for path in glob.glob(os.path.join(directory, f"{assistant_id}-*.npy")):
+        if path not in keep:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+@contextmanager
+def _locked(path):
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def open_snapshot(directory, assistant_id, build, index_class, version=None):
+    """
+    Index for an assistant's knowledge base at ``version`` (default: the current one), mapped from its snapshot.
+
+    ``build()`` produces the index, from the database or by patching an older
+    one; it is called, and its result saved, only when no snapshot of that
+    version exists yet. Empty indexes are returned without a snapshot.
+    """
+    if version is None:
+        version = get_knowledge_version(assistant_id)
+    index = read_snapshot(directory, assistant_id, version, index_class)
+    if index is not None:
+        return index
+
+    os.makedirs(directory, exist_ok=True)
+    # One process builds; the others wait and then map its result
+    with _locked(os.path.join(directory, f"{assistant_id}.lock")):
+        index = read_snapshot(directory, assistant_id, version, index_class)
+        if index is not None:
+            return index
+
+        built = build()
+        if not len(built):
+            return built
+        try:
+            write_snapshot(built, directory, assistant_id, version)
+        except OSError as e:
+            logger.warning(f"Could not write search snapshot for assistant {assistant_id}: {e}")
+            return built
+        remove_stale_snapshots(directory, assistant_id, version)
+        logger.info("search snapshot assistant=%s version=%s rows=%d", assistant_id, version, len(built))
+
+    index = read_snapshot(directory, assistant_id, version, index_class)
+    return index if index is not None else built
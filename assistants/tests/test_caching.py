@@ -0,0 +1,169 @@
+"""
+Tests for knowledge-base versioning and the answer cache.
+"""
+
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from assistants.models import Assistant, KnowledgeBaseEntry
+from assistants.caching import get_knowledge_version, bump_knowledge_version, answer_cache_key
+from assistants.retrieval import answer_question
+from assistants.checks import check_shared_cache
+from unittest.mock import patch
+
+
+class KnowledgeVersionTest(TestCase):
+    """
+    Tests that entry changes bump the assistant's knowledge-base version.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        self.entry = KnowledgeBaseEntry.objects.create(
+            assistant=self.assistant,
+            content="Our business hours are 9 AM to 5 PM.",
+            embedding=[1.0, 0.0],
+        )
+
+    def test_bump_increments_version(self):
+        """Test that bumping returns a strictly newer version"""
+        version = get_knowledge_version(self.assistant.id)
+        self.assertGreater(bump_knowledge_version(self.assistant.id), version)
+
+    def test_save_bumps_version_on_commit(self):
+        """Test that editing an entry bumps the version once committed"""
+        version = get_knowledge_version(self.assistant.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.content = "Our business hours are 8 AM to 6 PM."
+            self.entry.save()
+
+        self.assertGreater(get_knowledge_version(self.assistant.id), version)
+
+    def test_delete_bumps_version_on_commit(self):
+        """Test that deleting an entry bumps the version once committed"""
+        version = get_knowledge_version(self.assistant.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.delete()
+
+        self.assertGreater(get_knowledge_version(self.assistant.id), version)
+
+    def test_key_changes_with_version(self):
+        """Test that cached answers become unreachable after a bump"""
+        key = answer_cache_key(self.assistant.id, "When are you open?")
+        bump_knowledge_version(self.assistant.id)
+        self.assertNotEqual(key, answer_cache_key(self.assistant.id, "When are you open?"))
+
+    def test_key_is_normalized(self):
+        """Test that whitespace and case do not change the key"""
+        self.assertEqual(
+            answer_cache_key(self.assistant.id, "When are you open?"),
+            answer_cache_key(self.assistant.id, "  when ARE you open? "),
+        )
+
+
+class AnswerCacheTest(TestCase):
+    """
+    Tests that answer_question serves repeats from the cache.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        self.entry = KnowledgeBaseEntry.objects.create(
+            assistant=self.assistant,
+            content="Our business hours are 9 AM to 5 PM.",
+            embedding=[1.0, 0.0],
+        )
+
+    @patch('assistants.retrieval.ask_gemini')
+    @patch('assistants.retrieval.get_embedding')
+    def test_repeat_question_skips_gemini(self, mock_get_embedding, mock_gemini):
+        """Test that an identical question reuses the cached Gemini answer"""
+        mock_get_embedding.return_value = [0.0, 1.0]
+        mock_gemini.return_value = "Generated answer"
+
+        first = answer_question(self.assistant, "Do you sell gift cards?")
+        second = answer_question(self.assistant, "do you sell gift cards?")
+
+        self.assertEqual(first, second)
+        self.assertEqual(second["confidence"], 0.5)
+        mock_gemini.assert_called_once()
+        mock_get_embedding.assert_called_once()
+
+    @patch('assistants.retrieval.ask_gemini')
+    @patch('assistants.retrieval.get_embedding')
+    def test_edit_invalidates_cached_answer(self, mock_get_embedding, mock_gemini):
+        """Test that an edited entry is never answered from a stale cache"""
+        mock_get_embedding.return_value = [1.0, 0.0]
+
+        first = answer_question(self.assistant, "When are you open?")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.content = "Our business hours are 8 AM to 6 PM."
+            self.entry.save()
+
+        second = answer_question(self.assistant, "When are you open?")
+
+        self.assertEqual(first["answer"], "Our business hours are 9 AM to 5 PM.")
+        self.assertEqual(second["answer"], "Our business hours are 8 AM to 6 PM.")
+
+    @patch('assistants.retrieval.ask_gemini')
+    @patch('assistants.retrieval.get_embedding')
+    def test_failed_answers_are_not_cached(self, mock_get_embedding, mock_gemini):
+        """Test that a Gemini failure is retried on the next request"""
+        mock_get_embedding.return_value = [0.0, 1.0]
+        mock_gemini.return_value = None
+
+        answer_question(self.assistant, "Do you sell gift cards?")
+        answer_question(self.assistant, "Do you sell gift cards?")
+
+        self.assertEqual(mock_gemini.call_count, 2)
+
+    @override_settings(ANSWER_CACHE_TIMEOUT=0)
+    @patch('assistants.retrieval.ask_gemini')
+    @patch('assistants.retrieval.get_embedding')
+    def test_cache_can_be_disabled(self, mock_get_embedding, mock_gemini):
+        """Test that a zero timeout disables the answer cache"""
+        mock_get_embedding.return_value = [0.0, 1.0]
+        mock_gemini.return_value = "Generated answer"
+
+        answer_question(self.assistant, "Do you sell gift cards?")
+        answer_question(self.assistant, "Do you sell gift cards?")
+
+        self.assertEqual(mock_gemini.call_count, 2)
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    """
+    Tests for the system check that the cache is shared between workers.
+    """
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_memory_cache_warns(self):
+        """Test that a per-process cache is reported"""
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ['assistants.W001'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1'}})
+    def test_shared_cache_passes(self):
+        """Test that a shared cache raises no warning"""
+        self.assertEqual(check_shared_cache(None), [])
@@ -0,0 +1,102 @@
+"""
+Tests for long document chunking and merging of adjacent chunk hits.
+"""
+
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.contrib.auth import get_user_model
+from assistants.models import Assistant, KnowledgeBaseEntry
+from assistants.chunking import chunk_spans, ingest_document, merge_adjacent_chunks, MergedChunk
+from unittest.mock import patch
+
+
+class ChunkSpansTest(SimpleTestCase):
+    """
+    Tests for token-bounded, overlapping chunk spans.
+    """
+    def test_short_text_is_one_chunk(self):
+        """Test that text within the budget is not split"""
+        text = "one two three"
+        self.assertEqual(chunk_spans(text, max_tokens=5, overlap=1), [(0, len(text))])
+
+    def test_chunks_are_bounded_and_overlap(self):
+        """Test that chunks respect max_tokens and share overlap tokens"""
+        text = " ".join(f"w{i}" for i in range(10))
+
+        chunks = [text[start:end].split() for start, end in chunk_spans(text, max_tokens=4, overlap=1)]
+
+        self.assertTrue(all(len(chunk) <= 4 for chunk in chunks))
+        self.assertEqual(chunks[0], ["w0", "w1", "w2", "w3"])
+        self.assertEqual(chunks[1][0], "w3")
+        self.assertEqual(chunks[-1][-1], "w9")
+
+    def test_empty_text(self):
+        """Test that empty text has no chunks"""
+        self.assertEqual(chunk_spans("   ", max_tokens=4, overlap=1), [])
+
+    def test_overlap_must_be_smaller(self):
+        """Test that an overlap as large as the chunk is rejected"""
+        with self.assertRaises(ValueError):
+            chunk_spans("a b c", max_tokens=2, overlap=2)
+
+
+@override_settings(CHUNK_MAX_TOKENS=4, CHUNK_OVERLAP_TOKENS=1)
+@patch('assistants.chunking.get_tokenizer', return_value=None)
+class IngestDocumentTest(TestCase):
+    """
+    Tests for storing documents as embedded chunk entries.
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        self.text = " ".join(f"w{i}" for i in range(10))
+
+    @patch('assistants.chunking.get_embeddings')
+    def test_chunks_embedded_in_one_batch(self, mock_get_embeddings, mock_get_tokenizer):
+        """Test that every chunk is stored and embedded with a single call"""
+        mock_get_embeddings.side_effect = lambda texts: [[1.0, 0.0] for _ in texts]
+
+        document = ingest_document(self.assistant, self.text, title="Handbook")
+
+        chunks = list(document.chunks.order_by('chunk_index'))
+        self.assertEqual(len(chunks), 3)
+        mock_get_embeddings.assert_called_once()
+        self.assertTrue(all(chunk.vector.tolist() == [1.0, 0.0] for chunk in chunks))
+        self.assertEqual(chunks[0].content, self.text[chunks[0].char_start:chunks[0].char_end])
+
+    @patch('assistants.chunking.get_embeddings')
+    def test_merge_adjacent_chunk_hits(self, mock_get_embeddings, mock_get_tokenizer):
+        """Test that neighbouring chunk hits become one passage without repeated overlap"""
+        mock_get_embeddings.side_effect = lambda texts: [[1.0, 0.0] for _ in texts]
+        document = ingest_document(self.assistant, self.text)
+        first, second, third = document.chunks.order_by('chunk_index')
+        other = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Standalone", embedding=[0.0, 1.0])
+
+        merged = merge_adjacent_chunks([(second, 0.9), (other, 0.8), (first, 0.7)])
+
+        self.assertEqual(len(merged), 2)
+        passage, score = merged[0]
+        self.assertIsInstance(passage, MergedChunk)
+        self.assertEqual(score, 0.9)
+        self.assertEqual(passage.content, self.text[first.char_start:second.char_end])
+        self.assertEqual(passage.pk, second.pk)
+        self.assertEqual(merged[1], (other, 0.8))
+
+    @patch('assistants.chunking.get_embeddings')
+    def test_non_adjacent_chunks_are_kept(self, mock_get_embeddings, mock_get_tokenizer):
+        """Test that chunks that are not neighbours are left alone"""
+        mock_get_embeddings.side_effect = lambda texts: [[1.0, 0.0] for _ in texts]
+        document = ingest_document(self.assistant, self.text)
+        first, _, third = document.chunks.order_by('chunk_index')
+
+        matches = [(third, 0.9), (first, 0.8)]
+
+        self.assertEqual(merge_adjacent_chunks(matches), matches)
@@ -0,0 +1,61 @@
+"""
+Tests for the token-budgeted Gemini context builder.
+"""
+
+from django.test import SimpleTestCase
+from assistants.context import pack_context, build_context
+from unittest.mock import patch
+
+
+class Passage:
+    def __init__(self, content):
+        self.content = content
+
+
+@patch('assistants.context.get_loaded_tokenizer', return_value=None)
+class PackContextTest(SimpleTestCase):
+    """
+    Tests for greedy, diversity-aware packing.
+    """
+    def test_stays_within_budget(self, mock_tokenizer):
+        """Test that passages are added in rank order until the budget is spent"""
+        candidates = [(Passage(f"topic{i} alpha beta gamma delta epsilon"), 1.0 - i / 10) for i in range(5)]
+
+        # Six words is estimated at eight tokens
+        selected = pack_context(candidates, max_tokens=20, diversity=0.0, duplicate_threshold=1.1)
+
+        self.assertEqual([entry for entry, _ in selected], [candidates[0][0], candidates[1][0]])
+
+    def test_drops_near_duplicates(self, mock_tokenizer):
+        """Test that a passage repeating a chosen one is dropped"""
+        first = Passage("Our store opens at nine and closes at five")
+        repeat = Passage("Our store opens at nine and closes at five.")
+        other = Passage("Returns are accepted within thirty days")
+
+        selected = pack_context([(first, 0.9), (repeat, 0.89), (other, 0.5)], max_tokens=100)
+
+        self.assertEqual([entry for entry, _ in selected], [first, other])
+
+    def test_skips_passages_that_do_not_fit(self, mock_tokenizer):
+        """Test that a long passage is skipped in favour of a shorter one that fits"""
+        long = Passage(" ".join(f"word{i}" for i in range(50)))
+        short = Passage("Short answer here")
+
+        self.assertEqual(build_context([(long, 0.9), (short, 0.8)], max_tokens=10), "Short answer here")
+
+    def test_candidates_are_consumed_lazily(self, mock_tokenizer):
+        """Test that candidates are not pulled once the budget is spent"""
+        pulled = []
+
+        def candidates():
+            for i in range(100):
+                pulled.append(i)
+                yield Passage(f"unique{i} text"), 1.0
+
+        pack_context(candidates(), max_tokens=3, lookahead=2)
+
+        self.assertLess(len(pulled), 10)
+
+    def test_nothing_fits(self, mock_tokenizer):
+        """Test that an empty context is returned when no candidate fits"""
+        self.assertEqual(build_context([(Passage("one two three four"), 1.0)], max_tokens=2), "")
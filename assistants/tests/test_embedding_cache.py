@@ -0,0 +1,163 @@
+"""
+Tests for the query embedding cache in assistants.utils.
+"""
+
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch, MagicMock
+from assistants import utils
+from assistants.utils import EmbeddingCache, QueryBatcher, get_embedding, get_embedding_cache, normalize_query
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import asyncio
+import numpy as np
+
+
+class EmbeddingCacheTest(SimpleTestCase):
+    """
+    Tests for LRU eviction, TTL expiry and hit/miss counters.
+    """
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted as hits or misses"""
+        cache = EmbeddingCache(max_size=2, ttl=60)
+        cache.set("a", [1.0])
+
+        self.assertEqual(cache.get("a"), [1.0])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that the least recently used key is dropped when full"""
+        cache = EmbeddingCache(max_size=2, ttl=60)
+        cache.set("a", [1.0])
+        cache.set("b", [2.0])
+        cache.get("a")
+        cache.set("c", [3.0])
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), [1.0])
+        self.assertEqual(cache.get("c"), [3.0])
+
+    @patch('assistants.utils.time.monotonic')
+    def test_expired_items_are_misses(self, mock_monotonic):
+        """Test that items older than the TTL are not returned"""
+        mock_monotonic.return_value = 100.0
+        cache = EmbeddingCache(max_size=2, ttl=10)
+        cache.set("a", [1.0])
+
+        mock_monotonic.return_value = 111.0
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_normalize_query(self):
+        """Test that whitespace and case differences are normalized away"""
+        self.assertEqual(normalize_query("  What are   your HOURS?\n"), "what are your hours?")
+
+
+class GetEmbeddingCacheTest(SimpleTestCase):
+    """
+    Tests that get_embedding skips the model for repeated questions.
+    """
+    def setUp(self):
+        get_embedding_cache().clear()
+
+    @patch('assistants.utils.get_model')
+    def test_repeated_question_skips_model(self, mock_get_model):
+        """Test that a normalized repeat is served from the cache"""
+        model = MagicMock()
+        model.encode.return_value = np.array([0.1, 0.2, 0.3])
+        mock_get_model.return_value = model
+
+        first = get_embedding("What are your hours?")
+        second = get_embedding("  what are YOUR hours? ")
+
+        self.assertEqual(first, second)
+        model.encode.assert_called_once()
+        self.assertEqual(utils.get_embedding_cache().stats()["hits"], 1)
+
+
+class QueryBatcherTest(SimpleTestCase):
+    """
+    Tests for coalescing concurrent query encodes.
+    """
+    def test_concurrent_queries_share_one_encode(self):
+        """Test that queries submitted together are encoded in one call and answered in order"""
+        calls = []
+
+        def encode_batch(texts):
+            calls.append(list(texts))
+            return [len(text) for text in texts]
+
+        batcher = QueryBatcher(encode_batch, max_batch=4, max_wait=0.5)
+        futures = [batcher.submit(text) for text in ("a", "bb", "ccc", "dddd")]
+
+        self.assertEqual([future.result(timeout=5) for future in futures], [1, 2, 3, 4])
+        self.assertEqual(calls, [["a", "bb", "ccc", "dddd"]])
+        self.assertEqual(batcher.metrics()["largest_batch"], 4)
+
+    def test_errors_reach_every_caller(self):
+        """Test that a failed encode is raised to each waiting caller and the batcher keeps running"""
+        def encode_batch(texts):
+            if "bad" in texts:
+                raise RuntimeError("encode failed")
+            return texts
+
+        batcher = QueryBatcher(encode_batch, max_batch=2, max_wait=0.5)
+        futures = [batcher.submit("bad"), batcher.submit("good")]
+
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        self.assertEqual(batcher.submit("next").result(timeout=5), "next")
+
+    def test_cancelled_queries_are_not_encoded(self):
+        """Test that a caller who gave up does not break the batch it was in"""
+        calls = []
+
+        def encode_batch(texts):
+            calls.append(list(texts))
+            return texts
+
+        batcher = QueryBatcher(encode_batch, max_batch=2, max_wait=0.5)
+        abandoned = Future()
+        abandoned.cancel()
+        kept = Future()
+
+        batcher.process_batch([("abandoned", abandoned), ("kept", kept)])
+
+        self.assertEqual(calls, [["kept"]])
+        self.assertEqual(kept.result(timeout=0), "kept")
+
+    @override_settings(EMBEDDING_BATCH_MAX_SIZE=4, EMBEDDING_QUERY_TIMEOUT=0.05)
+    @patch('assistants.utils.get_query_batcher')
+    def test_encode_query_times_out(self, mock_get_batcher):
+        """Test that a query is not left waiting forever on a stuck batcher"""
+        mock_get_batcher.return_value.submit.return_value = Future()
+
+        with self.assertRaises(FutureTimeoutError):
+            utils.encode_query("hello")
+
+    @override_settings(EMBEDDING_SERVER_SOCKET='')
+    @patch('assistants.utils.get_query_batcher')
+    def test_async_queries_await_the_batcher(self, mock_get_batcher):
+        """Test that async callers join a batch without holding an executor thread"""
+        get_embedding_cache().clear()
+        batcher = QueryBatcher(lambda texts: [np.array([float(len(text))]) for text in texts], max_batch=8, max_wait=0.2)
+        mock_get_batcher.return_value = batcher
+        # A single-thread executor would serialize the queries if it were used
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        async def ask_all():
+            return await asyncio.gather(*(utils.get_embedding_async(text, executor) for text in ("a", "bb", "ccc")))
+
+        self.assertEqual(asyncio.run(ask_all()), [[1.0], [2.0], [3.0]])
+        self.assertEqual(batcher.metrics()["largest_batch"], 3)
+        executor.shutdown()
+
+    @override_settings(EMBEDDING_BATCH_MAX_SIZE=1)
+    @patch('assistants.utils.get_model')
+    def test_batching_can_be_disabled(self, mock_get_model):
+        """Test that a max batch size of 1 encodes on the calling thread"""
+        mock_get_model.return_value.encode.return_value = np.array([0.1, 0.2])
+
+        self.assertEqual(utils.encode_query("hello").tolist(), [0.1, 0.2])
+        mock_get_model.return_value.encode.assert_called_once_with("hello")
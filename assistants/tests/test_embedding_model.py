@@ -0,0 +1,87 @@
+"""
+Tests for loading the embedding model, its tokenizer and its backends in assistants.utils.
+"""
+
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch, MagicMock
+from assistants import utils
+import numpy as np
+import threading
+import time
+
+
+class GetModelTest(SimpleTestCase):
+    """
+    Tests for the lazily loaded, process-wide embedding model.
+    """
+    @patch('assistants.utils._model', None)
+    @patch('sentence_transformers.SentenceTransformer')
+    def test_concurrent_first_calls_load_once(self, mock_sentence_transformer):
+        """Test that concurrent first requests share a single model load"""
+        def slow_load(name):
+            time.sleep(0.05)
+            return MagicMock()
+
+        mock_sentence_transformer.side_effect = slow_load
+        threads = [threading.Thread(target=utils.get_model) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_sentence_transformer.assert_called_once_with(utils.MODEL_NAME)
+
+    @patch('assistants.utils._model', None)
+    @patch('assistants.utils._tokenizer', None)
+    def test_loaded_tokenizer_never_loads_model(self):
+        """Test that asking for the loaded tokenizer does not trigger a model load"""
+        with patch('assistants.utils.get_model') as mock_get_model:
+            self.assertIsNone(utils.get_loaded_tokenizer())
+        mock_get_model.assert_not_called()
+
+    @patch('assistants.utils._model', None)
+    @patch('assistants.utils._tokenizer', None)
+    @patch('transformers.AutoTokenizer.from_pretrained')
+    def test_tokenizer_loads_without_model(self, mock_from_pretrained):
+        """Test that chunking can tokenize without loading the embedding model"""
+        with patch('assistants.utils.get_model') as mock_get_model:
+            self.assertIs(utils.get_tokenizer(), mock_from_pretrained.return_value)
+            self.assertIs(utils.get_tokenizer(), mock_from_pretrained.return_value)
+        mock_get_model.assert_not_called()
+        mock_from_pretrained.assert_called_once_with(utils.TOKENIZER_NAME)
+
+
+class EmbeddingBackendTest(SimpleTestCase):
+    """
+    Tests for selecting the embedding backend and checking parity between backends.
+    """
+    @override_settings(EMBEDDING_BACKEND='onnx', EMBEDDING_ONNX_FILE='onnx/model_quint8_avx2.onnx')
+    @patch('sentence_transformers.SentenceTransformer')
+    def test_onnx_backend(self, mock_sentence_transformer):
+        """Test that the onnx backend loads the quantized export of the same model"""
+        utils.load_model()
+
+        mock_sentence_transformer.assert_called_once_with(
+            utils.MODEL_NAME, backend='onnx', model_kwargs={'file_name': 'onnx/model_quint8_avx2.onnx'},
+        )
+
+    @patch('sentence_transformers.SentenceTransformer')
+    def test_unknown_backend(self, mock_sentence_transformer):
+        """Test that a misspelled backend is rejected"""
+        with self.assertRaises(ValueError):
+            utils.load_model('tensorflow')
+
+    @patch('assistants.utils.load_model')
+    def test_embedding_parity(self, mock_load_model):
+        """Test that parity reports per-text cosine similarity between backends"""
+        reference = MagicMock()
+        reference.encode.return_value = np.array([[1.0, 0.0], [0.0, 1.0]])
+        candidate = MagicMock()
+        candidate.encode.return_value = np.array([[1.0, 0.0], [1.0, 1.0]])
+        mock_load_model.side_effect = lambda backend: reference if backend == 'torch' else candidate
+
+        cosines, timings = utils.embedding_parity(["a", "b"])
+
+        self.assertAlmostEqual(cosines[0], 1.0, places=5)
+        self.assertAlmostEqual(cosines[1], 2 ** -0.5, places=5)
+        self.assertEqual(set(timings), {'torch', 'onnx'})
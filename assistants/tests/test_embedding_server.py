@@ -0,0 +1,92 @@
+"""
+Tests for the shared embedding server and its client.
+"""
+
+import os
+import socket
+import tempfile
+import threading
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch, MagicMock
+from assistants import utils
+from assistants.embedding_server import EmbeddingClient, EmbeddingServerError, make_server
+from assistants.utils import get_embeddings
+import numpy as np
+
+
+def fake_encode(texts, batch_size):
+    return [[float(len(text)), 1.0] for text in texts]
+
+
+class EmbeddingServerTest(SimpleTestCase):
+    """
+    Tests for encoding through the Unix socket server.
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'embeddings.sock')
+
+    def start_server(self, encode=fake_encode):
+        server = make_server(self.path, encode)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_encode_round_trip(self):
+        """Test that embeddings come back in order over a reused connection"""
+        self.start_server()
+        client = EmbeddingClient(self.path, timeout=5)
+        self.addCleanup(client.close)
+
+        self.assertEqual(client.encode(["ab", "abcd"]), [[2.0, 1.0], [4.0, 1.0]])
+        self.assertEqual(client.encode(["a"]), [[1.0, 1.0]])
+
+    def test_reconnects_when_kept_connection_is_closed(self):
+        """Test that a kept-alive connection closed by the server side is replaced once"""
+        self.start_server()
+        client = EmbeddingClient(self.path, timeout=5)
+        self.addCleanup(client.close)
+        stale, peer = socket.socketpair()
+        peer.close()
+        client._local.sock = stale
+
+        self.assertEqual(client.encode(["abc"]), [[3.0, 1.0]])
+
+    def test_server_errors_are_raised(self):
+        """Test that a failed encode on the server reaches the client as EmbeddingServerError"""
+        def failing(texts, batch_size):
+            raise RuntimeError("out of memory")
+
+        self.start_server(failing)
+        client = EmbeddingClient(self.path, timeout=5)
+        self.addCleanup(client.close)
+
+        with self.assertRaisesMessage(EmbeddingServerError, "out of memory"):
+            client.encode(["a"])
+
+    def test_get_embeddings_uses_server(self):
+        """Test that configured processes encode through the server without loading the model"""
+        self.start_server()
+
+        with override_settings(EMBEDDING_SERVER_SOCKET=self.path), patch('assistants.utils.get_model') as mock_get_model:
+            self.assertEqual(get_embeddings(["abc"]), [[3.0, 1.0]])
+        mock_get_model.assert_not_called()
+
+    @patch('assistants.utils._server_down_until', 0.0)
+    @patch('assistants.utils.get_model')
+    def test_falls_back_to_local_model(self, mock_get_model):
+        """Test that encoding falls back in-process while the server is down, without retrying every call"""
+        model = MagicMock()
+        model.encode.return_value = np.array([[0.5, 0.5]])
+        mock_get_model.return_value = model
+
+        with override_settings(EMBEDDING_SERVER_SOCKET=self.path), \
+                patch('assistants.embedding_server.EmbeddingClient.encode', side_effect=EmbeddingServerError("down")) as mock_encode:
+            self.assertEqual(get_embeddings(["abc"]), [[0.5, 0.5]])
+            get_embeddings(["abc"])
+
+        mock_encode.assert_called_once()
+        self.assertGreater(utils._server_down_until, 0.0)
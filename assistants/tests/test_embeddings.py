@@ -0,0 +1,250 @@
+"""
+Tests for batched (re)embedding of knowledge base entries.
+"""
+
+from contextlib import contextmanager
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from assistants.models import Assistant, KnowledgeBaseEntry
+from assistants.embeddings import embed_entries, stale_embeddings, ContentDigest, EmbeddingWorker
+from assistants.utils import content_digest
+from assistants.admin import generate_embeddings
+from unittest.mock import patch, MagicMock
+import numpy as np
+
+
+def fake_embeddings(texts, batch_size=32):
+    return [[float(len(text)), 1.0] for text in texts]
+
+
+class EmbedEntriesTest(TestCase):
+    """
+    Tests for embed_entries() and the reembed management command.
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        self.other_assistant = Assistant.objects.create(
+            user=self.user,
+            name="Other Assistant",
+            tag_name="other_assistant",
+        )
+        for i in range(5):
+            KnowledgeBaseEntry.objects.create(assistant=self.assistant, content=f"Entry {i}", embedding=[0.0, 1.0])
+        KnowledgeBaseEntry.objects.create(assistant=self.other_assistant, content="Other", embedding=[0.0, 1.0])
+        # Simulate entries whose background embedding never ran
+        KnowledgeBaseEntry.objects.update(embedding_f32=None, content_hash='')
+
+    @patch('assistants.embeddings.get_embeddings', side_effect=fake_embeddings)
+    def test_embed_entries_in_chunks(self, mock_get_embeddings):
+        """Test that entries are encoded with one model call per chunk"""
+        progress = []
+
+        done = embed_entries(
+            KnowledgeBaseEntry.objects.filter(assistant=self.assistant),
+            chunk_size=2,
+            progress=lambda count, last_id: progress.append(count),
+        )
+
+        self.assertEqual(done, 5)
+        self.assertEqual(mock_get_embeddings.call_count, 3)
+        self.assertEqual(progress, [2, 4, 5])
+        self.assertFalse(KnowledgeBaseEntry.objects.filter(assistant=self.assistant, embedding_f32__isnull=True).exists())
+        self.assertTrue(KnowledgeBaseEntry.objects.filter(assistant=self.other_assistant, embedding_f32__isnull=True).exists())
+
+    @patch('assistants.embeddings.get_embeddings', side_effect=fake_embeddings)
+    def test_reembed_command_missing_only(self, mock_get_embeddings):
+        """Test that the command only embeds entries without an embedding by default"""
+        other = KnowledgeBaseEntry.objects.get(assistant=self.other_assistant)
+        other.embedding = [0.5, 0.5]
+        other.save()
+        out = StringIO()
+
+        call_command('reembed', stdout=out)
+
+        self.assertIn("Embedded 5 entries", out.getvalue())
+        other.refresh_from_db()
+        np.testing.assert_allclose(other.vector, [0.5 ** 0.5, 0.5 ** 0.5], rtol=1e-6)
+
+    @patch('assistants.embeddings.get_embeddings', side_effect=fake_embeddings)
+    def test_reembed_command_picks_up_edited_content(self, mock_get_embeddings):
+        """Test that the default scope includes entries edited since they were embedded"""
+        other = KnowledgeBaseEntry.objects.get(assistant=self.other_assistant)
+        other.embedding = [0.5, 0.5]
+        other.save()
+        KnowledgeBaseEntry.objects.filter(pk=other.pk).update(content="Other, edited")
+        out = StringIO()
+
+        call_command('reembed', '--assistant', str(self.other_assistant.id), stdout=out)
+
+        self.assertIn("Embedded 1 entries", out.getvalue())
+        other.refresh_from_db()
+        np.testing.assert_allclose(other.vector, np.array([13.0, 1.0]) / np.hypot(13.0, 1.0), rtol=1e-6)
+
+    @patch('assistants.embeddings.get_embeddings', side_effect=fake_embeddings)
+    def test_reembed_command_resume(self, mock_get_embeddings):
+        """Test resuming an --all run after a given id"""
+        first = KnowledgeBaseEntry.objects.order_by('id').first()
+        out = StringIO()
+
+        call_command('reembed', '--all', '--assistant', str(self.assistant.id), '--after-id', str(first.id), stdout=out)
+
+        self.assertIn("Embedded 4 entries", out.getvalue())
+        first.refresh_from_db()
+        self.assertIsNone(first.vector)
+
+    def test_sql_digest_matches_python_digest(self):
+        """Test that Postgres hashes content exactly like content_digest, so fresh entries are not stale"""
+        entry = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Café ☕ opens at 9", embedding=[1.0, 0.0])
+
+        digest = KnowledgeBaseEntry.objects.annotate(digest=ContentDigest('content')).get(pk=entry.pk).digest
+
+        self.assertEqual(digest, content_digest(entry.content))
+        self.assertFalse(stale_embeddings(KnowledgeBaseEntry.objects.filter(pk=entry.pk)).exists())
+
+    def test_clear_embedding_arrays_keeps_float32(self):
+        """Test that the command drops arrays that already have a float32 copy"""
+        with self.settings(EMBEDDING_ARRAY_COLUMN=True):
+            entry = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Kept", embedding=[3.0, 4.0])
+        out = StringIO()
+
+        with self.settings(EMBEDDING_ARRAY_COLUMN=False):
+            call_command('clear_embedding_arrays', stdout=out)
+
+        self.assertIn("Cleared 1 embedding arrays", out.getvalue())
+        entry.refresh_from_db()
+        self.assertIsNone(entry.embedding)
+        np.testing.assert_allclose(entry.vector, [0.6, 0.8], rtol=1e-6)
+
+
+class EmbeddingWorkerTest(TestCase):
+    """
+    Tests for the micro-batching background embedding worker.
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        # Worker thread is never started; batches are driven by the test
+        self.worker = EmbeddingWorker(max_queue=3, batch_size=2, max_wait=0)
+        self.worker.start = lambda: None
+
+    def test_next_batch_respects_batch_size(self):
+        """Test that pending ids are coalesced up to the batch size"""
+        for entry_id in (1, 2, 3):
+            self.worker.enqueue(entry_id)
+
+        self.assertEqual([entry_id for entry_id, _ in self.worker.next_batch(block=False)], [1, 2])
+        self.assertEqual(self.worker.metrics()["queue_depth"], 1)
+
+    def test_full_queue_defers_to_rescan(self):
+        """Test that overflow is counted instead of blocking the caller"""
+        for entry_id in (1, 2, 3, 4):
+            self.worker.enqueue(entry_id)
+
+        self.assertEqual(self.worker.metrics()["dropped"], 1)
+
+    @patch('assistants.embeddings.get_embeddings', side_effect=fake_embeddings)
+    def test_process_batch_uses_one_encode_call(self, mock_get_embeddings):
+        """Test that a batch is encoded and written in one go"""
+        entries = [
+            KnowledgeBaseEntry.objects.create(assistant=self.assistant, content=f"Entry {i}", embedding=[0.0, 1.0])
+            for i in range(2)
+        ]
+        KnowledgeBaseEntry.objects.update(embedding_f32=None, content_hash='')
+        for entry in entries:
+            self.worker.enqueue(entry.id)
+
+        self.worker.process_batch(self.worker.next_batch(block=False))
+
+        mock_get_embeddings.assert_called_once()
+        self.assertFalse(KnowledgeBaseEntry.objects.filter(embedding_f32__isnull=True).exists())
+        self.assertEqual(self.worker.metrics()["last_batch_size"], 2)
+
+    @patch('assistants.embeddings.get_embeddings', side_effect=fake_embeddings)
+    def test_rescan_recovers_missing_embeddings(self, mock_get_embeddings):
+        """Test that entries left without embeddings are picked up on start-up"""
+        KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Entry", embedding=[0.0, 1.0])
+        KnowledgeBaseEntry.objects.update(embedding_f32=None, content_hash='')
+
+        self.worker.rescan()
+
+        self.assertFalse(KnowledgeBaseEntry.objects.filter(embedding_f32__isnull=True).exists())
+
+    @patch('assistants.embeddings.embed_entries')
+    def test_rescan_skipped_while_another_process_scans(self, mock_embed_entries):
+        """Test that only the process holding the re-scan lock scans the table"""
+        @contextmanager
+        def held_elsewhere():
+            yield False
+
+        with patch('assistants.embeddings.rescan_lock', held_elsewhere):
+            self.worker.rescan()
+
+        mock_embed_entries.assert_not_called()
+        self.assertFalse(self.worker._needs_rescan)
+
+    @patch('assistants.signals.get_embedding_worker')
+    def test_created_entry_is_enqueued_on_commit(self, mock_get_worker):
+        """Test that creating an entry hands it to the worker instead of spawning a thread"""
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="New entry")
+
+        mock_get_worker.return_value.enqueue.assert_called_once_with(entry.id)
+
+    @patch('assistants.signals.get_embedding_worker')
+    def test_only_content_edits_are_reembedded(self, mock_get_worker):
+        """Test that editing an entry's content enqueues it while other edits do not"""
+        entry = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Entry", embedding=[0.0, 1.0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        mock_get_worker.return_value.enqueue.assert_not_called()
+
+        entry.content = "Edited entry"
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        mock_get_worker.return_value.enqueue.assert_called_once_with(entry.id)
+
+    @patch('assistants.admin.get_embedding_worker')
+    def test_admin_action_queues_entries(self, mock_get_worker):
+        """Test that the admin action enqueues the selection instead of encoding in the request"""
+        entries = [KnowledgeBaseEntry.objects.create(assistant=self.assistant, content=f"Entry {i}") for i in range(2)]
+        modeladmin = MagicMock()
+
+        generate_embeddings(modeladmin, None, KnowledgeBaseEntry.objects.filter(id__in=[entry.id for entry in entries]))
+
+        enqueued = [call.args[0] for call in mock_get_worker.return_value.enqueue.call_args_list]
+        self.assertEqual(sorted(enqueued), sorted(entry.id for entry in entries))
+        self.assertIn("Queued 2 entries", modeladmin.message_user.call_args[0][1])
+
+    @patch('assistants.embeddings.get_embeddings', side_effect=fake_embeddings)
+    def test_rescan_reembeds_edited_content(self, mock_get_embeddings):
+        """Test that entries whose content no longer matches their embedding are picked up"""
+        entry = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Entry", embedding=[0.0, 1.0])
+        KnowledgeBaseEntry.objects.filter(pk=entry.pk).update(content="Edited entry")
+
+        self.worker.rescan()
+
+        self.assertEqual(mock_get_embeddings.call_args[0][0], ["Edited entry"])
+        entry.refresh_from_db()
+        self.assertFalse(entry.embedding_is_stale)
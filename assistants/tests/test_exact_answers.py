@@ -0,0 +1,96 @@
+"""
+Tests for the exact-question fast path.
+"""
+
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from assistants.models import Assistant, KnowledgeBaseEntry, ExactAnswer
+from assistants.exact_answers import EXACT_SOURCE
+from assistants.retrieval import answer_question
+from unittest.mock import patch
+
+
+class ExactAnswerTest(TestCase):
+    """
+    Tests for curated and learned exact-match answers.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        self.entry = KnowledgeBaseEntry.objects.create(
+            assistant=self.assistant,
+            content="Our business hours are 9 AM to 5 PM.",
+            embedding=[1.0, 0.0],
+        )
+
+    @patch('assistants.retrieval.get_embedding')
+    def test_curated_answer_skips_embedding(self, mock_get_embedding):
+        """Test that a curated pair answers differently spaced and cased repeats without embedding"""
+        with self.captureOnCommitCallbacks(execute=True):
+            ExactAnswer.objects.create(assistant=self.assistant, question="Do you ship abroad?", answer="Yes, worldwide.")
+
+        result = answer_question(self.assistant, "  do you SHIP abroad? ")
+
+        self.assertEqual(result, {"answer": "Yes, worldwide.", "confidence": 1.0, "source": EXACT_SOURCE})
+        mock_get_embedding.assert_not_called()
+
+    @patch('assistants.retrieval.get_embedding')
+    def test_curated_entry_answer_follows_edits(self, mock_get_embedding):
+        """Test that a pair pointing at an entry answers with the entry's current content"""
+        with self.captureOnCommitCallbacks(execute=True):
+            ExactAnswer.objects.create(assistant=self.assistant, question="When are you open?", entry=self.entry)
+        answer_question(self.assistant, "When are you open?")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.content = "Our business hours are 8 AM to 6 PM."
+            self.entry.save()
+
+        self.assertEqual(answer_question(self.assistant, "When are you open?")["answer"], "Our business hours are 8 AM to 6 PM.")
+        mock_get_embedding.assert_not_called()
+
+    @patch('assistants.retrieval.ask_gemini')
+    @patch('assistants.retrieval.get_embedding', return_value=[1.0, 0.0])
+    def test_confident_answer_is_learned(self, mock_get_embedding, mock_gemini):
+        """Test that a high-confidence knowledge base answer is stored and reused"""
+        first = answer_question(self.assistant, "When are you open?")
+        second = answer_question(self.assistant, "When are you open?")
+
+        self.assertEqual(first["source"], "knowledge_base")
+        self.assertEqual(second["source"], EXACT_SOURCE)
+        self.assertEqual(second["answer"], self.entry.content)
+        self.assertEqual(ExactAnswer.objects.get().source, 'learned')
+        mock_get_embedding.assert_called_once()
+
+    @patch('assistants.retrieval.ask_gemini', return_value="Generated answer")
+    @patch('assistants.retrieval.get_embedding', return_value=[0.0, 1.0])
+    def test_gemini_answers_are_not_learned(self, mock_get_embedding, mock_gemini):
+        """Test that only knowledge base answers become exact-match pairs"""
+        answer_question(self.assistant, "Do you sell gift cards?")
+
+        self.assertFalse(ExactAnswer.objects.exists())
+
+    @patch('assistants.retrieval.ask_gemini')
+    @patch('assistants.retrieval.get_embedding', return_value=[1.0, 0.0])
+    def test_learned_answer_expires_with_knowledge_version(self, mock_get_embedding, mock_gemini):
+        """Test that a learned pair is not used once the knowledge base changes"""
+        answer_question(self.assistant, "When are you open?")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.content = "Our business hours are 8 AM to 6 PM."
+            self.entry.save()
+
+        result = answer_question(self.assistant, "When are you open?")
+
+        self.assertEqual(result["source"], "knowledge_base")
+        self.assertEqual(result["answer"], "Our business hours are 8 AM to 6 PM.")
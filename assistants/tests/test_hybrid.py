@@ -0,0 +1,103 @@
+"""
+Tests for hybrid full-text and vector retrieval.
+"""
+
+from django.test import TestCase, SimpleTestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from assistants.models import Assistant, KnowledgeBaseEntry
+from assistants.hybrid import reciprocal_rank_fusion, identifier_tokens, lexical_search, boost_identifier_matches
+from assistants.retrieval import retrieve
+from unittest.mock import patch, MagicMock
+
+
+class ReciprocalRankFusionTest(SimpleTestCase):
+    """
+    Tests for fusing rankings and spotting identifiers.
+    """
+    def test_agreement_wins(self):
+        """Test that an id ranked by both lists beats ids ranked first by only one"""
+        fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4]], k=60)
+
+        self.assertEqual([item for item, _ in fused], [3, 1, 4, 2])
+
+    def test_empty_rankings(self):
+        """Test that nothing is returned when no list ranks anything"""
+        self.assertEqual(reciprocal_rank_fusion([[], []]), [])
+
+    def test_identifier_tokens(self):
+        """Test that only tokens with digits count as identifiers"""
+        self.assertEqual(identifier_tokens("Where is order ORD-12345 or AB12C? Call 42"), {"ord-12345", "ab12c"})
+
+    def test_near_miss_identifier_is_not_boosted(self):
+        """Test that identifiers only match whole tokens, not digits inside longer ones"""
+        longer = MagicMock(content="Order ORD-482130 is on its way.")
+        exact = MagicMock(content="Order 48213 was delivered.")
+        matches = [(longer, 0.5), (exact, 0.3)]
+
+        self.assertEqual(boost_identifier_matches(matches, "Where is 48213?"), [(exact, 0.3), (longer, 0.5)])
+        self.assertEqual(boost_identifier_matches(matches[:1], "Where is 48213?"), matches[:1])
+        self.assertEqual(boost_identifier_matches(matches[:1], "What about 123?"), matches[:1])
+
+
+class HybridRetrievalTest(TestCase):
+    """
+    Tests for full-text matches reaching the direct answer threshold.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+            retrieval_mode="hybrid",
+        )
+        self.shipping = KnowledgeBaseEntry.objects.create(
+            assistant=self.assistant,
+            content="Orders usually ship within two business days.",
+            embedding=[1.0, 0.0],
+        )
+        self.order = KnowledgeBaseEntry.objects.create(
+            assistant=self.assistant,
+            content="Order ORD-48213 was delivered to the pickup point on Monday.",
+            embedding=[0.5, 1.0],
+        )
+
+    def test_lexical_search_matches_exact_tokens(self):
+        """Test that full-text search finds the entry quoting the order number"""
+        self.assertEqual(lexical_search(self.assistant.pk, "status of ORD-48213?")[0], self.order.pk)
+
+    @patch('assistants.retrieval.get_embedding', return_value=[1.0, 0.1])
+    def test_identifier_match_leads_without_forced_confidence(self, mock_get_embedding):
+        """Test that the entry containing the order number comes first but keeps its own score"""
+        result = retrieve(self.assistant, "Where is my order ORD-48213?")
+
+        self.assertEqual(result.matches[0][0], self.order)
+        self.assertLess(result.matches[0][1], 0.7)
+
+    @patch('assistants.retrieval.get_embedding', return_value=[0.75, -0.6614])
+    def test_hybrid_keeps_vector_direct_answer(self, mock_get_embedding):
+        """Test that a reordered hit below the threshold does not hide a direct answer vector mode gives"""
+        hybrid = retrieve(self.assistant, "Where is my order ORD-48213?")
+        self.assistant.retrieval_mode = "vector"
+        vector = retrieve(self.assistant, "Where is my order ORD-48213?")
+
+        self.assertEqual(hybrid.matches[0][0], self.order)
+        self.assertEqual(vector.best_entry, self.shipping)
+        self.assertEqual(hybrid.best_entry, vector.best_entry)
+        self.assertAlmostEqual(hybrid.best_score, 0.75, places=3)
+
+    @patch('assistants.retrieval.get_embedding', return_value=[1.0, 0.1])
+    def test_vector_mode_is_unchanged(self, mock_get_embedding):
+        """Test that assistants in vector mode rank by similarity only"""
+        self.assistant.retrieval_mode = "vector"
+
+        result = retrieve(self.assistant, "Where is my order ORD-48213?")
+
+        self.assertEqual(result.matches[0][0], self.shipping)
@@ -0,0 +1,133 @@
+"""
+Tests for streaming bulk knowledge base imports.
+"""
+
+import io
+import json
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, SimpleTestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from assistants.models import Assistant, KnowledgeBaseEntry, KnowledgeImportJob
+from assistants.imports import RowError, detect_format, iter_rows, run_import
+from unittest.mock import patch
+
+
+class IterRowsTest(SimpleTestCase):
+    """
+    Tests for row parsing and validation.
+    """
+    def test_csv_rows(self):
+        """Test that CSV rows are read from the content column"""
+        stream = io.StringIO("content,tag\nFirst answer,a\n  ,b\nSecond answer,c\n")
+
+        rows = list(iter_rows(stream, 'csv'))
+
+        self.assertEqual(rows[0], (2, "First answer"))
+        self.assertIsInstance(rows[1][1], RowError)
+        self.assertEqual(rows[2], (4, "Second answer"))
+
+    def test_csv_requires_content_column(self):
+        """Test that a CSV without a content column is rejected"""
+        with self.assertRaises(ValueError):
+            list(iter_rows(io.StringIO("text\nhello\n"), 'csv'))
+
+    def test_jsonl_rows(self):
+        """Test that JSON Lines rows are validated one by one"""
+        stream = io.StringIO('{"content": "First answer"}\nnot json\n\n["list"]\n{"content": 3}\n')
+
+        rows = list(iter_rows(stream, 'jsonl'))
+
+        self.assertEqual(rows[0], (1, "First answer"))
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(all(isinstance(content, RowError) for _, content in rows[1:]))
+
+    def test_detect_format(self):
+        """Test resolving the format from the file name or an explicit value"""
+        self.assertEqual(detect_format("faq.csv"), 'csv')
+        self.assertEqual(detect_format("faq.jsonl"), 'jsonl')
+        self.assertEqual(detect_format("faq.txt", 'json'), 'jsonl')
+        with self.assertRaises(ValueError):
+            detect_format("faq.xlsx")
+
+
+class RunImportTest(TestCase):
+    """
+    Tests for chunked inserts and job progress.
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+
+    @patch('assistants.imports.embed_chunk')
+    def test_run_import_in_chunks(self, mock_embed_chunk):
+        """Test that valid rows are inserted in chunks and embedded per chunk"""
+        lines = [json.dumps({"content": f"Answer {i}"}) for i in range(5)] + ['{"content": ""}']
+        job = KnowledgeImportJob.objects.create(assistant=self.assistant, file_format='jsonl')
+
+        run_import(job, io.StringIO("\n".join(lines)), chunk_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.rows_processed, 6)
+        self.assertEqual(job.rows_imported, 5)
+        self.assertEqual(job.rows_failed, 1)
+        self.assertEqual(job.errors[0]["row"], 6)
+        self.assertEqual(mock_embed_chunk.call_count, 3)
+        self.assertEqual(KnowledgeBaseEntry.objects.filter(assistant=self.assistant, import_job=job).count(), 5)
+
+
+class KnowledgeBaseImportViewTest(TestCase):
+    """
+    Tests for the bulk import endpoint.
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        self.client.force_authenticate(user=self.user)
+
+    @patch('assistants.views.start_import')
+    def test_import_returns_job(self, mock_start_import):
+        """Test that an upload creates a job and starts it in the background"""
+        upload = SimpleUploadedFile("faq.csv", b"content\nOur hours are 9 to 5\n", content_type="text/csv")
+
+        response = self.client.post(reverse('knowledge-import'), {'assistant': self.assistant.id, 'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = KnowledgeImportJob.objects.get(pk=response.json()['id'])
+        self.assertEqual(job.file_format, 'csv')
+        mock_start_import.assert_called_once()
+
+        response = self.client.get(reverse('knowledge-import-detail', kwargs={'pk': job.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'pending')
+
+    def test_import_rejects_unknown_format(self):
+        """Test that unsupported files are rejected up front"""
+        upload = SimpleUploadedFile("faq.xlsx", b"data")
+
+        response = self.client.post(reverse('knowledge-import'), {'assistant': self.assistant.id, 'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(KnowledgeImportJob.objects.exists())
@@ -2,9 +2,17 @@
 Unit tests for Assistant and KnowledgeBaseEntry models.
 """
 
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase
 from django.contrib.auth import get_user_model
 from assistants.models import Assistant, KnowledgeBaseEntry
+from assistants.fields import pack_vector, unpack_vector
+from assistants.semantic_search import load_index
+import numpy as np
+
+
+def pack_and_unpack(values):
+    return unpack_vector(pack_vector(values))
+
 
 class AssistantModelTest(TestCase):
     """
@@ -107,7 +115,7 @@ class KnowledgeBaseEntryModelTest(TestCase):
             content="Test content"
         )
         
-        self.assertIsNone(entry.embedding)
+        self.assertIsNone(entry.vector)
         
         # Test setting embedding
         test_embedding = [0.1, 0.2, 0.3]
@@ -115,4 +123,63 @@ class KnowledgeBaseEntryModelTest(TestCase):
         entry.save()
         
         entry.refresh_from_db()
-        self.assertEqual(entry.embedding, test_embedding)
\ No newline at end of file
+        np.testing.assert_allclose(entry.vector, pack_and_unpack(test_embedding), rtol=1e-6)
+
+    def test_embedding_stored_as_normalized_float32(self):
+        """Test that saving an embedding stores only its compact float32 copy"""
+        entry = KnowledgeBaseEntry.objects.create(
+            assistant=self.assistant,
+            content="Test content",
+            embedding=[3.0, 4.0],
+        )
+
+        entry.refresh_from_db()
+        self.assertIsNone(entry.embedding)
+        self.assertEqual(entry.embedding_f32.dtype, np.float32)
+        np.testing.assert_allclose(entry.embedding_f32, [0.6, 0.8], rtol=1e-6)
+
+        entry.set_embedding(None)
+        entry.save(update_fields=['embedding_f32'])
+        entry.refresh_from_db()
+        self.assertIsNone(entry.embedding_f32)
+        self.assertEqual(entry.content_hash, '')
+
+    def test_array_column_kept_for_pgvector(self):
+        """Test that the array column is still written when the pgvector trigger needs it"""
+        with self.settings(EMBEDDING_ARRAY_COLUMN=True):
+            entry = KnowledgeBaseEntry.objects.create(
+                assistant=self.assistant,
+                content="Test content",
+                embedding=[3.0, 4.0],
+            )
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.embedding, [3.0, 4.0])
+        np.testing.assert_allclose(entry.embedding_f32, [0.6, 0.8], rtol=1e-6)
+
+    def test_load_index_falls_back_to_array_column(self):
+        """Test that entries without a float32 copy are still searchable"""
+        packed = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Packed", embedding=[1.0, 0.0])
+        legacy = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Legacy")
+        # Saved before the float32 column existed
+        KnowledgeBaseEntry.objects.filter(pk=legacy.pk).update(embedding=[0.0, 2.0], embedding_f32=None)
+
+        index = load_index(self.assistant)
+
+        self.assertEqual(sorted(index.ids.tolist()), [packed.pk, legacy.pk])
+        self.assertEqual(index.search([0.0, 1.0], top_k=1)[0][0], legacy.pk)
+
+
+class Float32VectorTest(SimpleTestCase):
+    """
+    Tests for packing vectors into little-endian float32 blobs.
+    """
+    def test_round_trip(self):
+        """Test that packed vectors are unit length and decode without copying"""
+        blob = pack_vector([0.0, 3.0, 4.0])
+
+        self.assertEqual(len(blob), 3 * 4)
+        self.assertEqual(blob[4:8], np.float32(0.6).astype('<f4').tobytes())
+        vector = unpack_vector(blob)
+        np.testing.assert_allclose(vector, [0.0, 0.6, 0.8], rtol=1e-6)
+        self.assertFalse(vector.flags.owndata)
@@ -0,0 +1,432 @@
+"""
+Tests for the Gemini client's retries, circuit breaker and hedging.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from django.test import TestCase, SimpleTestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from google.api_core import exceptions as api_exceptions
+from assistants.models import Assistant, KnowledgeBaseEntry
+from assistants.resilience import CircuitBreaker, LatencyTracker, call_with_retries, hedged_call, ahedged_call, CLOSED, OPEN, HALF_OPEN
+from assistants.gemini import ask_gemini, ask_gemini_async
+from assistants.fake_gemini import make_server
+from assistants.retrieval import answer_question, FALLBACK_SOURCE
+from unittest.mock import patch, MagicMock
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    """
+    Tests for circuit state transitions.
+    """
+    def test_opens_on_error_rate(self):
+        """Test that the circuit opens once enough recent calls failed"""
+        breaker = CircuitBreaker('test', failure_rate=0.5, window=4, min_calls=4, reset_timeout=60)
+
+        for _ in range(2):
+            breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.metrics()["transitions"], {"closed->open": 1})
+        self.assertEqual(breaker.metrics()["rejected"], 1)
+
+    def test_half_open_probe(self):
+        """Test that one probe is let through after the cool-down and closes the circuit"""
+        breaker = CircuitBreaker('test', window=2, min_calls=2, reset_timeout=0)
+        breaker.record_failure()
+        breaker.record_failure()
+
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        breaker.record_success()
+
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.metrics()["transitions"], {"closed->open": 1, "open->half_open": 1, "half_open->closed": 1})
+
+    def test_failed_probe_reopens(self):
+        """Test that a failing probe opens the circuit again"""
+        breaker = CircuitBreaker('test', window=2, min_calls=2, reset_timeout=0)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.allow()
+
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, OPEN)
+
+
+class RetryAndHedgeTest(SimpleTestCase):
+    """
+    Tests for retries with jitter and hedged calls.
+    """
+    def test_retries_until_success(self):
+        """Test that transient errors are retried with a bounded sleep"""
+        calls = []
+        sleeps = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise TimeoutError()
+            return "ok"
+
+        result = call_with_retries(flaky, attempts=3, base_delay=0.1, max_delay=0.15, sleep=sleeps.append)
+
+        self.assertEqual(result, "ok")
+        self.assertEqual(len(sleeps), 2)
+        self.assertTrue(all(0 <= delay <= 0.15 for delay in sleeps))
+
+    def test_gives_up_after_attempts(self):
+        """Test that the last error is raised once attempts run out"""
+        def failing():
+            raise TimeoutError()
+
+        with self.assertRaises(TimeoutError):
+            call_with_retries(failing, attempts=2, sleep=lambda delay: None)
+
+    def test_non_retryable_error_is_not_retried(self):
+        """Test that errors outside retry_on are raised immediately"""
+        calls = []
+
+        def rejected():
+            calls.append(1)
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            call_with_retries(rejected, attempts=3, retry_on=(TimeoutError,), sleep=lambda delay: None)
+        self.assertEqual(len(calls), 1)
+
+    def test_hedged_call_uses_faster_copy(self):
+        """Test that a slow first call is overtaken by the hedged second call"""
+        calls = []
+        lock = threading.Lock()
+
+        def call():
+            with lock:
+                calls.append(1)
+                first = len(calls) == 1
+            if first:
+                time.sleep(0.5)
+                return "slow"
+            return "fast"
+
+        self.assertEqual(hedged_call(call, hedge_after=0.05), "fast")
+        self.assertEqual(len(calls), 2)
+
+    def test_fast_call_is_not_hedged(self):
+        """Test that no second call is made when the first finishes in time"""
+        calls = []
+
+        def call():
+            calls.append(1)
+            return "ok"
+
+        self.assertEqual(hedged_call(call, hedge_after=1), "ok")
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrent_calls_are_not_queued(self):
+        """Test that many concurrent hedged calls all run at once instead of waiting for a pool slot"""
+        calls = []
+
+        def call():
+            calls.append(1)
+            time.sleep(0.2)
+            return "ok"
+
+        threads = [threading.Thread(target=hedged_call, args=(call, 0.5)) for _ in range(12)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(len(calls), 12)
+
+    def test_async_hedged_call_uses_faster_copy(self):
+        """Test that the async hedge overtakes a slow first call and cancels it"""
+        calls = []
+        cancelled = []
+
+        async def call():
+            calls.append(1)
+            if len(calls) == 1:
+                try:
+                    await asyncio.sleep(0.5)
+                except asyncio.CancelledError:
+                    cancelled.append(1)
+                    raise
+                return "slow"
+            return "fast"
+
+        async def run():
+            result = await ahedged_call(call, hedge_after=0.05)
+            await asyncio.sleep(0)
+            return result
+
+        self.assertEqual(asyncio.run(run()), "fast")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cancelled, [1])
+
+
+class AskGeminiResilienceTest(SimpleTestCase):
+    """
+    Tests for ask_gemini failing fast while Gemini is down.
+    """
+    @patch('assistants.gemini._generate')
+    def test_open_circuit_skips_gemini(self, mock_generate):
+        """Test that repeated upstream errors open the circuit and later calls fail fast"""
+        mock_generate.side_effect = api_exceptions.ServiceUnavailable("down")
+        breaker = CircuitBreaker('gemini', window=2, min_calls=2, reset_timeout=60)
+
+        with patch('assistants.gemini._breaker', breaker), self.settings(GEMINI_MAX_ATTEMPTS=1):
+            self.assertIsNone(ask_gemini("question", "context"))
+            self.assertIsNone(ask_gemini("question", "context"))
+            self.assertEqual(breaker.state, OPEN)
+
+            self.assertIsNone(ask_gemini("question", "context"))
+
+        self.assertEqual(mock_generate.call_count, 2)
+
+    @patch('assistants.gemini.get_gemini_model')
+    def test_async_path_is_hedged(self, mock_get_model):
+        """Test that GEMINI_HEDGE also hedges ask_gemini_async, which serves the WhatsApp webhook"""
+        calls = []
+
+        async def generate_content_async(prompt, request_options=None):
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(1)
+            return MagicMock(text="Hedged answer")
+
+        mock_get_model.return_value.generate_content_async = generate_content_async
+        breaker = CircuitBreaker('gemini', window=2, min_calls=2, reset_timeout=60)
+
+        with patch('assistants.gemini._breaker', breaker), patch('assistants.gemini._latency', LatencyTracker()), \
+                self.settings(GEMINI_HEDGE=True, GEMINI_HEDGE_DELAY=0.05):
+            started = time.monotonic()
+            self.assertEqual(asyncio.run(ask_gemini_async("question", "context")), "Hedged answer")
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(len(calls), 2)
+
+    @patch('assistants.gemini._generate')
+    def test_rejected_prompt_does_not_trip_circuit(self, mock_generate):
+        """Test that errors from a responsive upstream count as healthy"""
+        mock_generate.side_effect = ValueError("blocked")
+        breaker = CircuitBreaker('gemini', window=2, min_calls=2, reset_timeout=60)
+
+        with patch('assistants.gemini._breaker', breaker):
+            ask_gemini("question", "context")
+            ask_gemini("question", "context")
+
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(mock_generate.call_count, 2)
+
+
+class KnowledgeBaseFallbackTest(TestCase):
+    """
+    Tests for answering from the knowledge base while Gemini is unavailable.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        self.entry = KnowledgeBaseEntry.objects.create(
+            assistant=self.assistant,
+            content="Our business hours are 9 AM to 5 PM.",
+            embedding=[1.0, 2.0],
+        )
+
+    @patch('assistants.retrieval.ask_gemini', return_value=None)
+    @patch('assistants.retrieval.get_embedding', return_value=[1.0, 0.3])
+    def test_falls_back_to_closest_entry(self, mock_get_embedding, mock_gemini):
+        """Test that the closest entry is returned, and not cached, when Gemini fails"""
+        first = answer_question(self.assistant, "When are you open?")
+        answer_question(self.assistant, "When are you open?")
+
+        self.assertEqual(first["answer"], self.entry.content)
+        self.assertEqual(first["source"], FALLBACK_SOURCE)
+        self.assertEqual(mock_gemini.call_count, 2)
+
+    @patch('assistants.retrieval.ask_gemini', return_value=None)
+    @patch('assistants.retrieval.get_embedding', return_value=[1.0, 0.0])
+    def test_unrelated_entry_is_not_a_fallback(self, mock_get_embedding, mock_gemini):
+        """Test that nothing is answered when the closest entry is below the fallback score"""
+        answer = answer_question(self.assistant, "Do you sell gift cards?")
+
+        self.assertEqual(answer, {"answer": None, "confidence": 0, "source": None})
+
+
+def start_fake_gemini(test, **kwargs):
+    """
+    Serve a fake Gemini endpoint for the duration of ``test``.
+    """
+    server = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server
+
+
+def use_fake_gemini(test, server, **overrides):
+    """
+    Point a fresh Gemini client and circuit breaker at ``server`` for the duration of ``test``.
+    """
+    host, port = server.server_address[:2]
+    overridden = test.settings(
+        GEMINI_API_KEY='fake-key',
+        GEMINI_API_ENDPOINT=f"http://{host}:{port}",
+        GEMINI_RETRY_BASE_DELAY=0,
+        GEMINI_RETRY_MAX_DELAY=0,
+        **overrides,
+    )
+    overridden.enable()
+    test.addCleanup(overridden.disable)
+
+    breaker = CircuitBreaker('gemini', window=2, min_calls=2, reset_timeout=60)
+    for patcher in (patch('assistants.gemini._model', None), patch('assistants.gemini._breaker', breaker)):
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    return breaker
+
+
+class FakeGeminiServerTest(SimpleTestCase):
+    """
+    Tests for the local fake Gemini endpoint.
+    """
+    def start_server(self, **kwargs):
+        return start_fake_gemini(self, **kwargs)
+
+    def post(self, server, action):
+        host, port = server.server_address[:2]
+        request = urllib.request.Request(
+            f"http://{host}:{port}/v1beta/models/gemini-2.0-flash:{action}",
+            data=b"{}",
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())
+
+    def test_generate_content(self):
+        """Test that the fake answers in the generateContent response format"""
+        server = self.start_server(answer="Hello there")
+
+        payload = self.post(server, "generateContent")
+
+        self.assertEqual(payload["candidates"][0]["content"]["parts"][0]["text"], "Hello there")
+
+    def test_stream_generate_content(self):
+        """Test that streamed answers are split into partial responses"""
+        server = self.start_server(answer="Hello there")
+
+        payload = self.post(server, "streamGenerateContent")
+
+        self.assertEqual("".join(chunk["candidates"][0]["content"]["parts"][0]["text"] for chunk in payload), "Hello there")
+
+    def test_injected_errors(self):
+        """Test that the fake fails requests with the configured status"""
+        server = self.start_server(error_rate=1.0, error_status=503)
+
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            self.post(server, "generateContent")
+        self.assertEqual(raised.exception.code, 503)
+
+
+class FakeGeminiEndToEndTest(TestCase):
+    """
+    Tests for ask_gemini and answer_question against the fake endpoint with injected latency and errors.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        self.entry = KnowledgeBaseEntry.objects.create(
+            assistant=self.assistant,
+            content="Our business hours are 9 AM to 5 PM.",
+            embedding=[1.0, 2.0],
+        )
+
+    def test_answer_from_healthy_endpoint(self):
+        """Test that a Gemini answer travels through the real client"""
+        server = start_fake_gemini(self, answer="We open at nine.")
+        use_fake_gemini(self, server)
+
+        self.assertEqual(ask_gemini("When are you open?", "context"), "We open at nine.")
+        self.assertEqual(server.requests, 1)
+
+    def test_slow_endpoint_times_out_and_is_retried(self):
+        """Test that each attempt is cut off at GEMINI_TIMEOUT and retried"""
+        server = start_fake_gemini(self, latency=1.0)
+        breaker = use_fake_gemini(self, server, GEMINI_TIMEOUT=0.2, GEMINI_MAX_ATTEMPTS=2)
+
+        started = time.monotonic()
+        self.assertIsNone(ask_gemini("When are you open?", "context"))
+
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(breaker.metrics()["recent_failures"], 1)
+
+    def test_failing_endpoint_opens_circuit(self):
+        """Test that injected 503s are retried, then open the circuit so later calls make no request"""
+        server = start_fake_gemini(self, error_rate=1.0, error_status=503)
+        breaker = use_fake_gemini(self, server, GEMINI_MAX_ATTEMPTS=2)
+
+        self.assertIsNone(ask_gemini("When are you open?", "context"))
+        self.assertIsNone(ask_gemini("When are you open?", "context"))
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(server.requests, 4)
+
+        self.assertIsNone(ask_gemini("When are you open?", "context"))
+        self.assertEqual(server.requests, 4)
+
+    @patch('assistants.retrieval.get_embedding', return_value=[1.0, 0.3])
+    def test_answer_question_falls_back_while_endpoint_fails(self, mock_get_embedding):
+        """Test that answer_question returns the closest entry when the endpoint keeps failing"""
+        server = start_fake_gemini(self, error_rate=1.0, error_status=503)
+        use_fake_gemini(self, server, GEMINI_MAX_ATTEMPTS=1)
+
+        answer = answer_question(self.assistant, "When are you open?")
+
+        self.assertEqual(answer["answer"], self.entry.content)
+        self.assertEqual(answer["source"], FALLBACK_SOURCE)
+        self.assertEqual(server.requests, 1)
+
+    @patch('assistants.retrieval.get_embedding', return_value=[1.0, 0.3])
+    def test_answer_question_uses_endpoint_answer(self, mock_get_embedding):
+        """Test that answer_question returns the endpoint's answer when it is healthy"""
+        server = start_fake_gemini(self, answer="We open at nine.", latency=0.05)
+        use_fake_gemini(self, server)
+
+        answer = answer_question(self.assistant, "When are you open?")
+
+        self.assertEqual(answer["answer"], "We open at nine.")
+        self.assertEqual(answer["source"], "gemini")
@@ -0,0 +1,184 @@
+"""
+Tests for the single-pass retrieval pipeline shared by the API and the webhook.
+"""
+
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from assistants.models import Assistant, KnowledgeBaseEntry
+from assistants.gemini import GeminiStreamError
+from assistants.retrieval import retrieve, answer_question, answer_question_async, stream_answer, NO_CONTEXT_MESSAGE
+from unittest.mock import patch, AsyncMock
+
+
+class RetrievalTest(TestCase):
+    """
+    Tests for retrieve() and answer_question().
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+            platform="whatsapp"
+        )
+        self.entry1 = KnowledgeBaseEntry.objects.create(
+            assistant=self.assistant,
+            content="Our business hours are Monday to Friday, 9 AM to 5 PM.",
+            embedding=[1.0, 0.0, 0.0],
+        )
+        self.entry2 = KnowledgeBaseEntry.objects.create(
+            assistant=self.assistant,
+            content="You can contact us at support@example.com.",
+            embedding=[0.0, 1.0, 0.0],
+        )
+
+    @patch('assistants.retrieval.get_embedding')
+    def test_retrieve_embeds_query_once(self, mock_get_embedding):
+        """Test that the query is embedded once for both best hit and context"""
+        mock_get_embedding.return_value = [1.0, 0.0, 0.0]
+
+        result = retrieve(self.assistant, "When are you open?")
+
+        mock_get_embedding.assert_called_once_with("When are you open?")
+        self.assertEqual(result.best_entry, self.entry1)
+        self.assertAlmostEqual(result.best_score, 1.0, places=4)
+        self.assertEqual([entry for entry, _ in result.matches], [self.entry1, self.entry2])
+        self.assertIn('embed', result.timings)
+
+    @patch('assistants.retrieval.get_embedding')
+    def test_retrieve_below_threshold(self, mock_get_embedding):
+        """Test that a weak best hit is not used as a direct answer"""
+        mock_get_embedding.return_value = [1.0, 1.0, 0.0]
+
+        result = retrieve(self.assistant, "Anything?", threshold=0.9)
+
+        self.assertIsNone(result.best_entry)
+        self.assertIn(self.entry1.content, result.context)
+        self.assertIn(self.entry2.content, result.context)
+
+    @patch('assistants.retrieval.get_embedding')
+    def test_context_reaches_past_top_k(self, mock_get_embedding):
+        """Test that the context packs hits beyond top_k, loading them only when asked"""
+        mock_get_embedding.return_value = [1.0, 0.5, 0.0]
+
+        result = retrieve(self.assistant, "When are you open?", top_k=1)
+
+        self.assertEqual([entry for entry, _ in result.matches], [self.entry1])
+        self.assertEqual([entry_id for entry_id, _ in result.more_hits], [self.entry2.pk])
+        self.assertIn(self.entry2.content, result.context)
+
+    @patch('assistants.retrieval.get_embedding')
+    def test_retrieve_empty_knowledge_base_skips_embedding(self, mock_get_embedding):
+        """Test that an assistant without embeddings never runs the model"""
+        KnowledgeBaseEntry.objects.all().delete()
+
+        result = retrieve(self.assistant, "When are you open?")
+
+        mock_get_embedding.assert_not_called()
+        self.assertEqual(result.context, NO_CONTEXT_MESSAGE)
+
+    @patch('assistants.retrieval.ask_gemini')
+    @patch('assistants.retrieval.get_embedding')
+    def test_answer_question_direct_hit(self, mock_get_embedding, mock_gemini):
+        """Test that a confident match is answered without Gemini"""
+        mock_get_embedding.return_value = [1.0, 0.0, 0.0]
+
+        result = answer_question(self.assistant, "When are you open?")
+
+        self.assertEqual(result["answer"], self.entry1.content)
+        self.assertEqual(result["confidence"], 1.0)
+        mock_gemini.assert_not_called()
+
+    @patch('assistants.retrieval.ask_gemini')
+    @patch('assistants.retrieval.get_embedding')
+    def test_answer_question_gemini_fallback(self, mock_get_embedding, mock_gemini):
+        """Test that Gemini gets the top matches as context"""
+        mock_get_embedding.return_value = [0.0, 0.0, 1.0]
+        mock_gemini.return_value = "Generated answer"
+
+        result = answer_question(self.assistant, "Something else?")
+
+        self.assertEqual(result["answer"], "Generated answer")
+        self.assertEqual(result["confidence"], 0.5)
+        context = mock_gemini.call_args[0][1]
+        self.assertIn(self.entry1.content, context)
+
+    @patch('assistants.retrieval.stream_gemini')
+    @patch('assistants.retrieval.get_embedding')
+    def test_stream_answer_direct_hit_is_one_event(self, mock_get_embedding, mock_stream):
+        """Test that a knowledge-base hit is streamed as a single answer event"""
+        mock_get_embedding.return_value = [1.0, 0.0, 0.0]
+
+        events = list(stream_answer(self.assistant, "When are you open?"))
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0][0], "answer")
+        self.assertEqual(events[0][1]["answer"], self.entry1.content)
+        mock_stream.assert_not_called()
+
+    @patch('assistants.retrieval.stream_gemini')
+    @patch('assistants.retrieval.get_embedding')
+    def test_stream_answer_forwards_gemini_chunks(self, mock_get_embedding, mock_stream):
+        """Test that Gemini chunks are forwarded and the full answer is cached"""
+        mock_get_embedding.return_value = [0.0, 0.0, 1.0]
+        mock_stream.return_value = iter(["Generated ", "answer"])
+
+        events = list(stream_answer(self.assistant, "Something else?"))
+
+        self.assertEqual(events[:2], [("chunk", {"text": "Generated "}), ("chunk", {"text": "answer"})])
+        self.assertEqual(events[2], ("done", {"answer": "Generated answer", "confidence": 0.5, "source": "gemini"}))
+
+        # The assembled answer is cached like a non-streamed one
+        self.assertEqual(list(stream_answer(self.assistant, "Something else?")), [("answer", events[2][1])])
+
+    @patch('assistants.retrieval.stream_gemini')
+    @patch('assistants.retrieval.get_embedding')
+    def test_stream_answer_failing_midway_is_not_cached(self, mock_get_embedding, mock_stream):
+        """Test that a stream cut off after its first chunk ends in an error event and is not cached"""
+        mock_get_embedding.return_value = [0.0, 0.0, 1.0]
+
+        def failing_stream(question, context):
+            yield "Generated "
+            raise GeminiStreamError("connection reset")
+
+        mock_stream.side_effect = failing_stream
+
+        events = list(stream_answer(self.assistant, "Something else?"))
+
+        self.assertEqual(events[0], ("chunk", {"text": "Generated "}))
+        self.assertEqual(events[-1][0], "error")
+        self.assertNotEqual(events[-1][1]["answer"], "Generated ")
+        mock_stream.side_effect = lambda question, context: iter(["Complete answer"])
+        self.assertEqual(list(stream_answer(self.assistant, "Something else?"))[-1][1]["answer"], "Complete answer")
+
+    @patch('assistants.retrieval.ask_gemini_async', new_callable=AsyncMock)
+    @patch('assistants.retrieval.get_embedding_async', new_callable=AsyncMock)
+    async def test_answer_question_async_gemini_fallback(self, mock_get_embedding, mock_gemini):
+        """Test that the async path awaits Gemini with the same context"""
+        mock_get_embedding.return_value = [0.0, 0.0, 1.0]
+        mock_gemini.return_value = "Generated answer"
+
+        result = await answer_question_async(self.assistant, "Something else?")
+
+        self.assertEqual(result["answer"], "Generated answer")
+        mock_get_embedding.assert_called_once_with("Something else?")
+        self.assertIn(self.entry1.content, mock_gemini.call_args[0][1])
+
+    @patch('assistants.retrieval.ask_gemini_async', new_callable=AsyncMock)
+    @patch('assistants.retrieval.get_embedding_async', new_callable=AsyncMock)
+    async def test_answer_question_async_direct_hit(self, mock_get_embedding, mock_gemini):
+        """Test that a confident match is answered without awaiting Gemini"""
+        mock_get_embedding.return_value = [1.0, 0.0, 0.0]
+
+        result = await answer_question_async(self.assistant, "When are you open?")
+
+        self.assertEqual(result["answer"], self.entry1.content)
+        mock_gemini.assert_not_called()
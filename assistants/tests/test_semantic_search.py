@@ -1,9 +1,15 @@
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from assistants.models import Assistant, KnowledgeBaseEntry
-from assistants.semantic_search import find_best_match, find_top_matches, find_top_matches_from_entries
+from assistants.semantic_search import EmbeddingIndex, QuantizedIndex, load_index, open_index, find_best_match, find_top_matches, find_top_matches_from_entries
+from assistants.management.commands.search_recall import recall_report
+from assistants.index_registry import IndexRegistry
+from assistants.caching import bump_knowledge_version
 from unittest.mock import patch, MagicMock
 import numpy as np
+import os
+import tempfile
 
 class SemanticSearchTest(TestCase):
     """
@@ -207,10 +213,10 @@ class SemanticSearchTest(TestCase):
         mock_get_embedding.return_value = [0.1, 0.2, 0.3]
         
         # Ensure entries have no embeddings
-        self.entry1.embedding = None
+        self.entry1.set_embedding(None)
         self.entry1.save()
         
-        self.entry2.embedding = None
+        self.entry2.set_embedding(None)
         self.entry2.save()
         
         # Test query
@@ -220,3 +226,308 @@ class SemanticSearchTest(TestCase):
         # Should call get_embedding for query and entries
         self.assertGreater(mock_get_embedding.call_count, 1)
         self.assertIsNotNone(best_entry)
+
+
+class EmbeddingIndexTest(SimpleTestCase):
+    """
+    Tests for the in-memory embedding matrix used by semantic search.
+    """
+    def test_rows_are_normalized(self):
+        """Test that every row of the matrix has unit length"""
+        index = EmbeddingIndex.from_rows([(1, [3.0, 4.0]), (2, [0.0, 2.0])])
+
+        self.assertEqual(index.matrix.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(index.matrix, axis=1), [1.0, 1.0], rtol=1e-6)
+
+    def test_empty_embeddings_are_skipped(self):
+        """Test that entries without an embedding are not indexed"""
+        index = EmbeddingIndex.from_rows([(1, None), (2, []), (3, [1.0, 0.0])])
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.ids.tolist(), [3])
+
+    def test_search_returns_top_k_sorted(self):
+        """Test that search returns the k best entries, highest score first"""
+        index = EmbeddingIndex.from_rows([
+            (1, [1.0, 0.0]),
+            (2, [0.0, 1.0]),
+            (3, [0.9, 0.1]),
+            (4, [-1.0, 0.0]),
+        ])
+
+        hits = index.search([1.0, 0.0], top_k=2)
+
+        self.assertEqual([entry_id for entry_id, _ in hits], [1, 3])
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+
+    def test_search_top_k_larger_than_index(self):
+        """Test that asking for more results than entries returns them all"""
+        index = EmbeddingIndex.from_rows([(1, [1.0, 0.0]), (2, [0.0, 1.0])])
+
+        self.assertEqual(len(index.search([0.0, 1.0], top_k=10)), 2)
+
+    def test_search_empty_index(self):
+        """Test that searching an empty index returns no hits"""
+        self.assertEqual(EmbeddingIndex.from_rows([]).search([1.0, 0.0]), [])
+
+
+class QuantizedIndexTest(SimpleTestCase):
+    """
+    Tests for int8/float16 in-memory vectors with exact rescoring.
+    """
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.exact = EmbeddingIndex.from_rows((i, rng.normal(size=64)) for i in range(500))
+        self.vectors = dict(zip(self.exact.ids.tolist(), self.exact.matrix))
+        self.queries = rng.normal(size=(20, 64))
+
+    def quantized(self, precision):
+        return QuantizedIndex.from_index(
+            self.exact, precision, lambda ids: ((entry_id, self.vectors[entry_id]) for entry_id in ids),
+        )
+
+    def test_int8_matches_exact_search(self):
+        """Test that rescored int8 search returns the exact hits and scores"""
+        index = self.quantized('int8')
+
+        for query in self.queries:
+            expected = self.exact.search(query, top_k=5)
+            found = index.search(query, top_k=5)
+            self.assertEqual([entry_id for entry_id, _ in found], [entry_id for entry_id, _ in expected])
+            self.assertAlmostEqual(found[0][1], expected[0][1], places=5)
+
+    def test_memory_savings(self):
+        """Test that int8 is about 4x and float16 2x smaller than float32"""
+        self.assertLess(self.quantized('int8').nbytes, self.exact.matrix.nbytes / 3.5)
+        self.assertEqual(self.quantized('float16').nbytes, self.exact.matrix.nbytes / 2)
+
+    def test_recall_report(self):
+        """Test that the recall report agrees fully for near-lossless quantization"""
+        report = recall_report(self.exact, self.quantized('float16'), list(self.queries), top_k=5)
+
+        self.assertEqual(report["recall_at_k"], 1.0)
+        self.assertEqual(report["direct_answer_agreement"], 1.0)
+
+
+class QuantizedLoadIndexTest(TestCase):
+    """
+    Tests for choosing the search precision per assistant.
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+            search_precision='int8',
+        )
+        self.hours = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Hours", embedding=[1.0, 0.1, 0.0])
+        self.contact = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Contact", embedding=[0.0, 1.0, 0.2])
+
+    def test_int8_assistant_gets_quantized_index(self):
+        """Test that rescoring loads exact vectors from the database"""
+        index = load_index(self.assistant)
+
+        self.assertIsInstance(index, QuantizedIndex)
+        hits = index.search([1.0, 0.1, 0.0], top_k=1)
+        self.assertEqual(hits[0][0], self.hours.pk)
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+
+    def test_quantized_index_is_built_in_blocks(self):
+        """Test that a quantized index is streamed from the database without a float32 index"""
+        with patch('assistants.semantic_search.SCORE_BLOCK_ROWS', 1), \
+                patch('assistants.semantic_search.build_index') as mock_build_index:
+            index = load_index(self.assistant)
+
+        mock_build_index.assert_not_called()
+        self.assertEqual(index.ids.tolist(), [self.hours.pk, self.contact.pk])
+        self.assertEqual(index.codes.dtype, np.int8)
+        self.assertEqual(len(index.scales), 2)
+
+    def test_quantized_index_stays_resident(self):
+        """Test that a quantized index is kept between queries even without a cache budget"""
+        with self.settings(SEARCH_INDEX_CACHE_BYTES=0), patch('assistants.index_registry._registry', None):
+            first = open_index(self.assistant)
+            second = open_index(self.assistant)
+
+        self.assertIs(first, second)
+
+
+class SnapshotIndexTest(TestCase):
+    """
+    Tests for memory-mapped index snapshots.
+    """
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        self.hours = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Hours", embedding=[1.0, 0.0])
+        self.contact = KnowledgeBaseEntry.objects.create(assistant=self.assistant, content="Contact", embedding=[0.0, 1.0])
+
+    def test_index_is_mapped_from_snapshot(self):
+        """Test that the second load maps the snapshot instead of reading the database"""
+        with self.settings(SEARCH_SNAPSHOT_DIR=self.directory):
+            first = load_index(self.assistant)
+            with patch('assistants.semantic_search.build_index') as mock_build_index:
+                second = load_index(self.assistant)
+
+        mock_build_index.assert_not_called()
+        self.assertIsInstance(second.matrix, np.memmap)
+        self.assertEqual(second.search([1.0, 0.0], top_k=1), first.search([1.0, 0.0], top_k=1))
+
+    def test_snapshot_is_rebuilt_after_change(self):
+        """Test that an edit produces a new snapshot and removes the old one"""
+        with self.settings(SEARCH_SNAPSHOT_DIR=self.directory):
+            load_index(self.assistant)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.contact.embedding = [1.0, 0.1]
+                self.contact.save()
+            index = load_index(self.assistant)
+
+        self.assertEqual(len(os.listdir(self.directory)), 3)  # ids, matrix and the lock file
+        self.assertGreater(index.search([1.0, 0.0], top_k=2)[1][1], 0.9)
+
+    def test_registry_patches_snapshot(self):
+        """Test that an edit is patched into a new shared snapshot without reloading the assistant"""
+        registry = IndexRegistry(max_bytes=None)
+        with self.settings(SEARCH_SNAPSHOT_DIR=self.directory):
+            registry.get(self.assistant)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.contact.embedding = [1.0, 0.1]
+                self.contact.save()
+            with patch('assistants.semantic_search.build_index') as mock_build_index:
+                index = registry.get(self.assistant)
+                mapped = load_index(self.assistant)
+
+        mock_build_index.assert_not_called()
+        self.assertEqual(registry.stats()["updates"], 1)
+        self.assertIsInstance(index.matrix, np.memmap)
+        self.assertEqual(sorted(mapped.ids.tolist()), [self.hours.pk, self.contact.pk])
+        self.assertGreater(mapped.search([1.0, 0.0], top_k=2)[1][1], 0.9)
+
+
+class IndexRegistryTest(SimpleTestCase):
+    """
+    Tests for lazily loaded, LRU-evicted indexes.
+    """
+    def setUp(self):
+        cache.clear()
+        self.loads = []
+
+    def assistant(self, pk):
+        return MagicMock(pk=pk, search_precision='float32')
+
+    def loader(self, assistant):
+        self.loads.append(assistant.pk)
+        # Two float32 rows of two dimensions and two int64 ids: 32 bytes
+        return EmbeddingIndex.from_rows([(1, [1.0, 0.0]), (2, [0.0, 1.0])])
+
+    def test_index_is_loaded_once(self):
+        """Test that repeat queries are served from the registry"""
+        registry = IndexRegistry(max_bytes=1000, loader=self.loader)
+
+        first = registry.get(self.assistant(1))
+        second = registry.get(self.assistant(1))
+
+        self.assertIs(first, second)
+        self.assertEqual(self.loads, [1])
+        self.assertEqual(registry.stats()["hits"], 1)
+        self.assertEqual(registry.stats()["misses"], 1)
+        self.assertEqual(registry.stats()["bytes"], 32)
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that the least recently used index is dropped once over budget"""
+        registry = IndexRegistry(max_bytes=64, loader=self.loader)
+
+        registry.get(self.assistant(1))
+        registry.get(self.assistant(2))
+        registry.get(self.assistant(1))
+        registry.get(self.assistant(3))
+        registry.get(self.assistant(1))
+        registry.get(self.assistant(2))
+
+        self.assertEqual(self.loads, [1, 2, 3, 2])
+        self.assertEqual(registry.stats()["evictions"], 2)
+        self.assertLessEqual(registry.stats()["bytes"], 64)
+
+    def test_new_knowledge_version_reloads(self):
+        """Test that an index is reloaded after its knowledge base changed"""
+        registry = IndexRegistry(max_bytes=1000, loader=self.loader)
+
+        registry.get(self.assistant(1))
+        bump_knowledge_version(1)
+        registry.get(self.assistant(1))
+
+        self.assertEqual(self.loads, [1, 1])
+        self.assertEqual(registry.stats()["indexes"], 1)
+
+    def test_recorded_changes_patch_the_index(self):
+        """Test that entries changed since the index was loaded are patched in without a reload"""
+        vectors = lambda ids: [(2, [1.0, 1.0]), (3, [0.0, 2.0])]
+        registry = IndexRegistry(max_bytes=1000, loader=self.loader, vector_loader=vectors)
+
+        registry.get(self.assistant(1))
+        bump_knowledge_version(1, changed_ids=[1, 2])
+        bump_knowledge_version(1, changed_ids=[3])
+        index = registry.get(self.assistant(1))
+
+        self.assertEqual(self.loads, [1])
+        self.assertEqual(registry.stats()["updates"], 1)
+        self.assertEqual(index.ids.tolist(), [2, 3])
+        self.assertEqual(index.search([0.0, 1.0], top_k=1)[0][0], 3)
+
+    def test_unrecorded_change_reloads(self):
+        """Test that a version bump without change ids falls back to a full reload"""
+        registry = IndexRegistry(max_bytes=1000, loader=self.loader, vector_loader=lambda ids: [])
+
+        registry.get(self.assistant(1))
+        bump_knowledge_version(1, changed_ids=[1])
+        bump_knowledge_version(1)
+        registry.get(self.assistant(1))
+
+        self.assertEqual(self.loads, [1, 1])
+        self.assertEqual(registry.stats()["updates"], 0)
+
+
+class IndexChangesTest(SimpleTestCase):
+    """
+    Tests for patching an index with changed entries.
+    """
+    def setUp(self):
+        self.index = EmbeddingIndex.from_rows([(1, [1.0, 0.0]), (2, [0.0, 1.0]), (3, [1.0, 1.0])])
+
+    def test_changed_entries_are_replaced_added_and_removed(self):
+        """Test that edited rows are replaced, new ones appended and rowless ones dropped"""
+        changed = self.index.with_changes([2, 3, 4], [(2, [1.0, 0.0]), (4, [0.0, 3.0])])
+
+        self.assertEqual(changed.ids.tolist(), [1, 2, 4])
+        self.assertTrue(np.allclose(changed.matrix[1], [1.0, 0.0]))
+        self.assertTrue(np.allclose(changed.matrix[2], [0.0, 1.0]))
+        self.assertEqual(len(self.index), 3)
+
+    def test_quantized_index_quantizes_new_rows(self):
+        """Test that a QuantizedIndex keeps its codes and quantizes appended rows"""
+        quantized = QuantizedIndex.from_index(self.index, 'int8', lambda ids: [])
+
+        changed = quantized.with_changes([1, 4], [(4, [0.0, 3.0])])
+
+        self.assertEqual(changed.ids.tolist(), [2, 3, 4])
+        self.assertEqual(changed.codes.shape, (3, 2))
+        self.assertEqual(changed.precision, 'int8')
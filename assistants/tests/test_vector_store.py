@@ -0,0 +1,149 @@
+"""
+Tests for the pgvector search backend.
+
+These run against a local Postgres with the ``vector`` extension installed and
+are skipped otherwise.
+"""
+
+import unittest
+from unittest.mock import patch, MagicMock
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from assistants.models import Assistant, KnowledgeBaseEntry
+from assistants.semantic_search import load_index, open_index
+from assistants.vector_store import PgVectorIndex, iterative_scan_enabled, pgvector_available, to_vector_literal
+
+
+def _unit(position, dimensions=384):
+    vector = [0.0] * dimensions
+    vector[position] = 1.0
+    return vector
+
+
+class VectorLiteralTest(unittest.TestCase):
+    def test_to_vector_literal(self):
+        """Test formatting a vector in pgvector's text format"""
+        self.assertEqual(to_vector_literal([1, 0.5, -2]), "[1,0.5,-2]")
+
+
+class PgVectorFallbackTest(unittest.TestCase):
+    @override_settings(SEMANTIC_SEARCH_BACKEND='pgvector', SEARCH_INDEX_CACHE_BYTES=0)
+    @patch('assistants.semantic_search.load_index')
+    @patch('assistants.vector_store.pgvector_ready', return_value=False)
+    def test_open_index_falls_back_without_column(self, mock_ready, mock_load_index):
+        """Test that a missing embedding_vector column falls back to in-process search"""
+        index = open_index(MagicMock(pk=1, search_precision='float32'))
+
+        self.assertIs(index, mock_load_index.return_value)
+
+    @override_settings(PGVECTOR_ITERATIVE_SCAN=False)
+    @patch('assistants.vector_store.connection')
+    def test_short_ann_result_is_repeated_exactly(self, mock_connection):
+        """Test that fewer than k ANN rows trigger an exact scan of the assistant's rows"""
+        cursor = mock_connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.side_effect = [[(1, 0.9)], [(1, 0.9), (2, 0.4)]]
+        cursor.fetchone.return_value = (2,)
+
+        with patch('assistants.vector_store.transaction'):
+            hits = PgVectorIndex(1).search(_unit(0), top_k=2)
+
+        self.assertEqual(hits, [(1, 0.9), (2, 0.4)])
+        cursor.execute.assert_any_call("SET LOCAL enable_indexscan = off")
+
+    @override_settings(PGVECTOR_ITERATIVE_SCAN=True)
+    @patch('assistants.vector_store.connection')
+    def test_small_assistant_is_not_rescanned(self, mock_connection):
+        """Test that an assistant with fewer than k entries gets one ANN query and no exact scan"""
+        cursor = mock_connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [(1, 0.9), (2, 0.4)]
+        cursor.fetchone.return_value = (2,)
+
+        with patch('assistants.vector_store.transaction'):
+            hits = PgVectorIndex(1).search(_unit(0), top_k=20)
+
+        self.assertEqual(hits, [(1, 0.9), (2, 0.4)])
+        self.assertEqual(cursor.fetchall.call_count, 1)
+        cursor.execute.assert_any_call("SET LOCAL hnsw.iterative_scan = relaxed_order")
+        self.assertNotIn("SET LOCAL enable_indexscan = off", [call.args[0] for call in cursor.execute.call_args_list])
+
+    @override_settings(PGVECTOR_ITERATIVE_SCAN=None)
+    @patch('assistants.vector_store._iterative_scan', None)
+    @patch('assistants.vector_store.pgvector_version', return_value=(0, 8, 0))
+    def test_iterative_scan_detected_from_version(self, mock_version):
+        """Test that iterative scans are used by default on pgvector 0.8+"""
+        self.assertTrue(iterative_scan_enabled())
+
+
+@override_settings(EMBEDDING_ARRAY_COLUMN=True)
+class PgVectorIndexTest(TestCase):
+    """
+    Tests for ORDER BY embedding_vector <=> query LIMIT k search.
+    """
+    def setUp(self):
+        if not pgvector_available():
+            self.skipTest("pgvector extension is not installed")
+
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+        )
+        self.other_assistant = Assistant.objects.create(
+            user=self.user,
+            name="Other Assistant",
+            tag_name="other_assistant",
+        )
+        self.entries = [
+            KnowledgeBaseEntry.objects.create(
+                assistant=self.assistant, content=f"Entry {i}", embedding=_unit(i)
+            )
+            for i in range(5)
+        ]
+        # Identical vector on another assistant must never be returned
+        KnowledgeBaseEntry.objects.create(
+            assistant=self.other_assistant, content="Other", embedding=_unit(0)
+        )
+
+    def test_search_matches_numpy_backend(self):
+        """Test that pgvector and in-process search rank entries the same way"""
+        query = _unit(2)
+        query[3] = 0.5
+
+        pg_hits = PgVectorIndex(self.assistant.pk).search(query, top_k=2)
+        numpy_hits = load_index(self.assistant).search(query, top_k=2)
+
+        self.assertEqual([entry_id for entry_id, _ in pg_hits], [entry_id for entry_id, _ in numpy_hits])
+        for (_, pg_score), (_, numpy_score) in zip(pg_hits, numpy_hits):
+            self.assertAlmostEqual(pg_score, numpy_score, places=4)
+
+    def test_search_is_scoped_to_assistant(self):
+        """Test that only the assistant's own entries are returned"""
+        hits = PgVectorIndex(self.assistant.pk).search(_unit(0), top_k=10)
+
+        self.assertEqual(len(hits), 5)
+        self.assertEqual(hits[0][0], self.entries[0].id)
+
+    def test_embedding_update_syncs_vector_column(self):
+        """Test that the trigger keeps embedding_vector in sync with embedding"""
+        entry = self.entries[4]
+        entry.embedding = _unit(10)
+        entry.save()
+
+        hits = PgVectorIndex(self.assistant.pk).search(_unit(10), top_k=1)
+
+        self.assertEqual(hits[0][0], entry.id)
+        self.assertAlmostEqual(hits[0][1], 1.0, places=4)
+
+    @override_settings(SEMANTIC_SEARCH_BACKEND='pgvector')
+    def test_open_index_uses_pgvector(self):
+        """Test that the backend setting selects the pgvector index"""
+        index = open_index(self.assistant)
+
+        self.assertIsInstance(index, PgVectorIndex)
+        self.assertTrue(index)
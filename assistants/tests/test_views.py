@@ -9,6 +9,7 @@ from rest_framework.test import APIClient
 from rest_framework import status
 from assistants.models import Assistant, KnowledgeBaseEntry
 import json
+from unittest.mock import patch
 
 class AssistantViewsTest(TestCase):
     """
@@ -235,3 +236,28 @@ class AnswerQueryViewTest(TestCase):
         url = reverse('answer_query')
         response = self.client.get(url, {'query': 'test question', 'assistant_id': other_assistant.id})
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @patch('assistants.views.stream_answer')
+    def test_answer_query_stream(self, mock_stream_answer):
+        """Test that the streaming endpoint forwards answer chunks as Server-Sent Events"""
+        mock_stream_answer.return_value = iter([
+            ("chunk", {"text": "Hello "}),
+            ("chunk", {"text": "there"}),
+            ("done", {"answer": "Hello there", "confidence": 0.5, "source": "gemini"}),
+        ])
+        self.client.force_authenticate(user=self.user)
+        url = reverse('answer_query_stream')
+
+        response = self.client.get(url, {'query': 'test question', 'assistant_id': self.assistant.id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b"".join(response.streaming_content).decode()
+        self.assertIn('event: chunk\ndata: {"text": "Hello "}\n\n', body)
+        self.assertIn('event: done\ndata: {"question": "test question", "answer": "Hello there", "confidence": 0.5}', body)
+
+    def test_answer_query_stream_invalid_assistant(self):
+        """Test that the streaming endpoint validates like the JSON one"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('answer_query_stream'), {'query': 'test question', 'assistant_id': 999})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -3,20 +3,28 @@ Tests for WhatsApp webhook and setup instructions endpoints.
 Covers message parsing, error handling, and Gemini fallback.
 """
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
-from assistants.models import Assistant, KnowledgeBaseEntry
-from unittest.mock import patch, MagicMock
+from assistants.models import Assistant, KnowledgeBaseEntry, ExactAnswer
+from assistants.retrieval import RetrievalResult
+from whatsapp.replies import deliver_reply
+from whatsapp.senders import LocalSender
+from whatsapp.views import acknowledge
+from unittest.mock import patch, MagicMock, AsyncMock
+import asyncio
 import json
+import threading
 
 class WhatsAppWebhookTest(TestCase):
     """
     Test suite for WhatsApp webhook endpoint.
     """
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             email="test@example.com",
@@ -65,14 +73,14 @@ class WhatsAppWebhookTest(TestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         
-    @patch('assistants.semantic_search.find_best_match')
-    @patch('assistants.gemini.ask_gemini')
-    def test_webhook_semantic_match_found(self, mock_gemini, mock_find_best_match):
+    @patch('assistants.retrieval.retrieve')
+    @patch('assistants.retrieval.ask_gemini')
+    def test_webhook_semantic_match_found(self, mock_gemini, mock_retrieve):
         """Test webhook when semantic search finds a good match"""
-        # Mock semantic search to return a good match
+        # Mock retrieval to return a good match
         mock_entry = MagicMock()
         mock_entry.content = "This is the answer from knowledge base"
-        mock_find_best_match.return_value = (mock_entry, 0.8)
+        mock_retrieve.return_value = RetrievalResult([(mock_entry, 0.8)], 0.7, {})
         
         url = reverse('whatsapp-webhook')
         data = {'Body': '@test_assistant: What is the answer?'}
@@ -82,18 +90,14 @@ class WhatsAppWebhookTest(TestCase):
         self.assertIn('This is the answer from knowledge base', response.content.decode())
         mock_gemini.assert_not_called()  # Gemini should not be called
         
-    @patch('assistants.semantic_search.find_best_match')
-    @patch('assistants.semantic_search.find_top_matches_from_entries')
-    @patch('assistants.gemini.ask_gemini')
-    def test_webhook_gemini_fallback(self, mock_gemini, mock_find_top_matches, mock_find_best_match):
+    @patch('assistants.retrieval.retrieve')
+    @patch('assistants.retrieval.ask_gemini')
+    def test_webhook_gemini_fallback(self, mock_gemini, mock_retrieve):
         """Test webhook when using Gemini fallback"""
-        # Mock semantic search to return no good match
-        mock_find_best_match.return_value = (None, 0.3)
-        
-        # Mock top matches for context
+        # Mock retrieval to return only a weak match, used as context
         mock_entry = MagicMock()
         mock_entry.content = "Context information"
-        mock_find_top_matches.return_value = [(mock_entry, 0.6)]
+        mock_retrieve.return_value = RetrievalResult([(mock_entry, 0.6)], 0.7, {})
         
         # Mock Gemini response
         mock_gemini.return_value = "This is the answer from Gemini"
@@ -104,18 +108,14 @@ class WhatsAppWebhookTest(TestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('This is the answer from Gemini', response.content.decode())
-        mock_gemini.assert_called_once()
+        mock_gemini.assert_called_once_with('What is the answer?', 'Context information')
         
-    @patch('assistants.semantic_search.find_best_match')
-    @patch('assistants.semantic_search.find_top_matches_from_entries')
-    @patch('assistants.gemini.ask_gemini')
-    def test_webhook_no_knowledge_base(self, mock_gemini, mock_find_top_matches, mock_find_best_match):
+    @patch('assistants.retrieval.retrieve')
+    @patch('assistants.retrieval.ask_gemini')
+    def test_webhook_no_knowledge_base(self, mock_gemini, mock_retrieve):
         """Test webhook when assistant has no knowledge base"""
-        # Mock semantic search to return no good match
-        mock_find_best_match.return_value = (None, 0.3)
-        
-        # Mock no top matches (empty knowledge base)
-        mock_find_top_matches.return_value = []
+        # Mock no matches (empty knowledge base)
+        mock_retrieve.return_value = RetrievalResult([], 0.7, {})
         
         # Mock Gemini response
         mock_gemini.return_value = "This is the answer from Gemini"
@@ -127,16 +127,12 @@ class WhatsAppWebhookTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('This is the answer from Gemini', response.content.decode())
         
-    @patch('assistants.semantic_search.find_best_match')
-    @patch('assistants.semantic_search.find_top_matches_from_entries')
-    @patch('assistants.gemini.ask_gemini')
-    def test_webhook_gemini_failure(self, mock_gemini, mock_find_top_matches, mock_find_best_match):
+    @patch('assistants.retrieval.retrieve')
+    @patch('assistants.retrieval.ask_gemini')
+    def test_webhook_gemini_failure(self, mock_gemini, mock_retrieve):
         """Test webhook when both semantic search and Gemini fail"""
-        # Mock semantic search to return no good match
-        mock_find_best_match.return_value = (None, 0.3)
-        
-        # Mock no top matches
-        mock_find_top_matches.return_value = []
+        # Mock no matches
+        mock_retrieve.return_value = RetrievalResult([], 0.7, {})
         
         # Mock Gemini to return None (failure)
         mock_gemini.return_value = None
@@ -153,9 +149,9 @@ class WhatsAppWebhookTest(TestCase):
         url = reverse('whatsapp-webhook')
         data = {'Body': '@test_assistant: What is the answer?'}
         
-        with patch('assistants.semantic_search.find_best_match') as mock_find_best_match:
-            with patch('assistants.gemini.ask_gemini') as mock_gemini:
-                mock_find_best_match.return_value = (None, 0.3)
+        with patch('assistants.retrieval.retrieve') as mock_retrieve:
+            with patch('assistants.retrieval.ask_gemini') as mock_gemini:
+                mock_retrieve.return_value = RetrievalResult([], 0.7, {})
                 mock_gemini.return_value = "Test response"
                 
                 response = self.client.post(url, data)
@@ -163,6 +159,163 @@ class WhatsAppWebhookTest(TestCase):
                 self.assertEqual(response.status_code, status.HTTP_200_OK)
                 self.assertIn('Test response', response.content.decode())
 
+class AsyncWhatsAppWebhookTest(TestCase):
+    """
+    Test suite for the native async WhatsApp webhook.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+            platform="whatsapp"
+        )
+        self.url = reverse('whatsapp-webhook-async')
+
+    async def test_async_webhook_invalid_format(self):
+        """Test async webhook with invalid message format"""
+        response = await self.async_client.post(self.url, {'Body': 'This is not in the correct format'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_async_webhook_invalid_tag(self):
+        """Test async webhook with non-existent tag"""
+        response = await self.async_client.post(self.url, {'Body': '@nonexistent_tag: What is this?'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch('whatsapp.views.answer_question_async', new_callable=AsyncMock)
+    async def test_async_webhook_answer(self, mock_answer):
+        """Test async webhook replies with the awaited answer"""
+        mock_answer.return_value = {"answer": "Async answer", "confidence": 0.9, "source": "knowledge_base"}
+
+        response = await self.async_client.post(self.url, {'Body': '@test_assistant: What is the answer?'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Async answer', response.content.decode())
+
+    @override_settings(WHATSAPP_WEBHOOK_TIMEOUT=0.01)
+    @patch('whatsapp.views.answer_question_async')
+    async def test_async_webhook_timeout(self, mock_answer):
+        """Test that a slow answer is cut off by the per-request timeout"""
+        async def slow_answer(assistant, question):
+            await asyncio.sleep(1)
+
+        mock_answer.side_effect = slow_answer
+
+        response = await self.async_client.post(self.url, {'Body': '@test_assistant: What is the answer?'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('took too long', response.content.decode())
+
+
+@override_settings(WHATSAPP_REPLY_MODE='deferred')
+class DeferredWhatsAppReplyTest(TestCase):
+    """
+    Test suite for the acknowledge-then-reply webhook mode.
+    """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            first_name='testname',
+            last_name="testlastname",
+            password="testpassword",
+        )
+        self.assistant = Assistant.objects.create(
+            user=self.user,
+            name="Test Assistant",
+            tag_name="test_assistant",
+            platform="whatsapp"
+        )
+        self.data = {
+            'Body': '@test_assistant: What is the answer?',
+            'From': 'whatsapp:+15550001111',
+            'To': 'whatsapp:+14155238886',
+            'MessageSid': 'SM123',
+        }
+
+    @patch('whatsapp.replies.get_reply_executor')
+    @patch('assistants.retrieval.retrieve')
+    def test_webhook_acknowledges_immediately(self, mock_retrieve, mock_get_executor):
+        """Test that the webhook returns an empty TwiML response and queues the question"""
+        response = self.client.post(reverse('whatsapp-webhook'), self.data)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('<Message>', response.content.decode())
+        mock_retrieve.assert_not_called()
+        args = mock_get_executor.return_value.submit.call_args[0]
+        self.assertEqual(args[1:], (self.assistant.pk, 'What is the answer?', 'whatsapp:+15550001111', 'whatsapp:+14155238886'))
+
+    @patch('whatsapp.replies.get_reply_executor')
+    def test_retried_message_is_queued_once(self, mock_get_executor):
+        """Test that Twilio retries of the same MessageSid are not answered twice"""
+        self.client.post(reverse('whatsapp-webhook'), self.data)
+        response = self.client.post(reverse('whatsapp-webhook'), self.data)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_get_executor.return_value.submit.assert_called_once()
+
+    @patch('whatsapp.replies.get_reply_executor')
+    async def test_async_webhook_acknowledges(self, mock_get_executor):
+        """Test that the async webhook also acknowledges in deferred mode"""
+        response = await self.async_client.post(reverse('whatsapp-webhook-async'), self.data)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('<Message>', response.content.decode())
+        mock_get_executor.return_value.submit.assert_called_once()
+
+    @patch('whatsapp.replies.get_reply_executor')
+    async def test_async_webhook_acknowledges_off_the_event_loop(self, mock_get_executor):
+        """Test that the sync cache call in acknowledge() is not made on the event loop thread"""
+        threads = []
+
+        def recording_acknowledge(*args):
+            threads.append(threading.current_thread())
+            return acknowledge(*args)
+
+        with patch('whatsapp.views.acknowledge', side_effect=recording_acknowledge):
+            response = await self.async_client.post(reverse('whatsapp-webhook-async'), self.data)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    @patch('whatsapp.replies.get_reply_executor')
+    def test_exact_answer_is_replied_inline(self, mock_get_executor):
+        """Test that a curated exact-match answer is sent in the TwiML response instead of queued"""
+        ExactAnswer.objects.create(assistant=self.assistant, question="What is the answer?", answer="42")
+
+        response = self.client.post(reverse('whatsapp-webhook'), self.data)
+
+        self.assertIn('<Message>42</Message>', response.content.decode())
+        mock_get_executor.return_value.submit.assert_not_called()
+
+    @patch('whatsapp.replies.get_sender')
+    @patch('assistants.retrieval.retrieve')
+    @patch('assistants.retrieval.ask_gemini')
+    def test_deliver_reply_with_local_sender(self, mock_gemini, mock_retrieve, mock_get_sender):
+        """Test that the queued answer is sent through the configured sender"""
+        sender = LocalSender()
+        mock_get_sender.return_value = sender
+        mock_retrieve.return_value = RetrievalResult([], 0.7, {})
+        mock_gemini.return_value = "Generated answer"
+
+        deliver_reply(self.assistant.pk, 'What is the answer?', 'whatsapp:+15550001111', 'whatsapp:+14155238886')
+
+        self.assertEqual(sender.outbox, [{
+            "to": 'whatsapp:+15550001111',
+            "from": 'whatsapp:+14155238886',
+            "body": "Generated answer",
+        }])
+
+
 class WhatsAppSetupInstructionsTest(TestCase):
     """
     Test suite for WhatsApp setup instructions endpoint.
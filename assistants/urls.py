@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import AssistantListCreateView, AssistantDetailView, KnowledgeBaseEntryListCreateView, KnowledgeBaseEntryDetailView, AnswerQueryView
+from .views import AssistantListCreateView, AssistantDetailView, KnowledgeBaseEntryListCreateView, KnowledgeBaseEntryDetailView, AnswerQueryView, AnswerQueryStreamView, EmbeddingStatusView, GeminiStatusView, KnowledgeBaseImportView, KnowledgeImportJobDetailView, KnowledgeDocumentListCreateView, KnowledgeDocumentDetailView
 
 urlpatterns = [
     path('', AssistantListCreateView.as_view(), name='assistant-list-create'),
@@ -8,6 +8,14 @@ urlpatterns = [
     # Knowledge Base Routes
     path('knowledge/', KnowledgeBaseEntryListCreateView.as_view(), name='knowledge-list-create'),
     path('knowledge/<int:pk>/', KnowledgeBaseEntryDetailView.as_view(), name='knowledge-detail'),
+    path('knowledge/import/', KnowledgeBaseImportView.as_view(), name='knowledge-import'),
+    path('knowledge/import/<int:pk>/', KnowledgeImportJobDetailView.as_view(), name='knowledge-import-detail'),
+    path('documents/', KnowledgeDocumentListCreateView.as_view(), name='document-list-create'),
+    path('documents/<int:pk>/', KnowledgeDocumentDetailView.as_view(), name='document-detail'),
 
     path("answer/", AnswerQueryView.as_view(), name="answer_query"),
+    path("answer/stream/", AnswerQueryStreamView.as_view(), name="answer_query_stream"),
+
+    path("status/embeddings/", EmbeddingStatusView.as_view(), name="embedding-status"),
+    path("status/gemini/", GeminiStatusView.as_view(), name="gemini-status"),
 ]
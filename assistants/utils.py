@@ -1,14 +1,406 @@
-from sentence_transformers import SentenceTransformer
+import asyncio
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from django.conf import settings
+from .embedding_server import EmbeddingServerError, get_embedding_client
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+TOKENIZER_NAME = f'sentence-transformers/{MODEL_NAME}'
+EMBEDDING_BACKENDS = ('torch', 'onnx')
+
+
+def load_model(backend: str = None):
+    """
+    Build the embedding model on the given backend (default: EMBEDDING_BACKEND).
+
+    ``onnx`` runs an int8-quantized ONNX export of the same model through ONNX
+    Runtime; tokenizer and pooling are unchanged, so its vectors can be mixed
+    with stored PyTorch ones (see ``manage.py embedding_parity``).
+    """
+    from sentence_transformers import SentenceTransformer
+
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    if backend == 'onnx':
+        return SentenceTransformer(MODEL_NAME, backend='onnx', model_kwargs={'file_name': settings.EMBEDDING_ONNX_FILE})
+    return SentenceTransformer(MODEL_NAME)
+
 
 _model = None
+_model_lock = threading.Lock()
 
 def get_model():
+    """
+    The process-wide embedding model, loaded once even under concurrent first requests.
+
+    sentence_transformers (and with it torch) is only imported here, so
+    management commands that never embed anything do not pay for it.
+    """
     global _model
     if _model is None:
-        _model = SentenceTransformer('all-MiniLM-L6-v2')
+        with _model_lock:
+            if _model is None:
+                _model = load_model()
     return _model
 
+
+_tokenizer = None
+
+def get_tokenizer():
+    """
+    The embedding model's own tokenizer, for token-accurate length estimates.
+
+    Taken from the model when it is already in memory; otherwise only the
+    tokenizer files are loaded, so processes that embed through
+    EMBEDDING_SERVER_SOCKET never load the model just to count tokens.
+    """
+    global _tokenizer
+    if _model is not None:
+        return _model.tokenizer
+    if _tokenizer is None:
+        with _model_lock:
+            if _tokenizer is None:
+                from transformers import AutoTokenizer
+                _tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+    return _tokenizer
+
+
+def get_loaded_tokenizer():
+    """
+    The tokenizer if it is already in memory, otherwise None. Never loads anything.
+    """
+    return _model.tokenizer if _model is not None else _tokenizer
+
+
+def normalize_query(text: str) -> str:
+    """
+    Collapse whitespace and case so trivially different phrasings share a key.
+    """
+    return " ".join(text.split()).lower()
+
+
+def question_digest(text: str) -> str:
+    """
+    SHA-256 hex digest of the normalized question.
+    """
+    return hashlib.sha256(normalize_query(text).encode('utf-8')).hexdigest()
+
+
+def content_digest(text: str) -> str:
+    """
+    SHA-256 hex digest of ``text`` exactly as stored.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU cache with a per-item TTL for query embeddings.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                value, expires_at = item
+                if not self.ttl or expires_at > time.monotonic():
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_embedding_cache = None
+
+def get_embedding_cache():
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_SIZE, settings.EMBEDDING_CACHE_TTL)
+    return _embedding_cache
+
+
+class QueryBatcher:
+    """
+    Coalesces single-query encodes from concurrent threads into one model call.
+
+    The worker thread takes the first waiting query, then collects more until
+    ``max_batch`` are gathered or ``max_wait`` seconds have passed, and encodes
+    them together. Queries arriving while a batch is being encoded wait for
+    the next one, so under load batches form without any extra delay. Each
+    caller gets a Future with its own vector.
+    """
+
+    def __init__(self, encode_batch, max_batch: int = 16, max_wait: float = 0.002):
+        self.encode_batch = encode_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def start(self):
+        with self._lock:
+            # A thread started before a fork does not exist in the child
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='query-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        self.start()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def metrics(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+    def next_batch(self):
+        """
+        Wait for the first query, then collect more until the batch is full or the deadline passes.
+        """
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Past the deadline, still take whatever is already queued
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def process_batch(self, batch):
+        # Callers that gave up (timed out or were cancelled) are not encoded
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        futures = [future for _, future in batch]
+        try:
+            embeddings = self.encode_batch([text for text, _ in batch])
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, embedding in zip(futures, embeddings):
+            future.set_result(embedding)
+
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+    def _run(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                self.process_batch(batch)
+            except Exception:
+                logger.exception("query batch failed")
+
+
+def encode_queries(texts):
+    """
+    Encode a batch of queries with one model call. A lone query is encoded exactly as before batching.
+    """
+    model = get_model()
+    if len(texts) == 1:
+        return [model.encode(texts[0])]
+    return list(model.encode(texts, batch_size=len(texts), show_progress_bar=False))
+
+
+_query_batcher = None
+_query_batcher_lock = threading.Lock()
+
+def get_query_batcher():
+    """
+    The process-wide QueryBatcher, or None when EMBEDDING_BATCH_MAX_SIZE is 1 or less.
+    """
+    global _query_batcher
+    if settings.EMBEDDING_BATCH_MAX_SIZE <= 1:
+        return None
+    if _query_batcher is None:
+        with _query_batcher_lock:
+            if _query_batcher is None:
+                _query_batcher = QueryBatcher(
+                    encode_queries,
+                    max_batch=settings.EMBEDDING_BATCH_MAX_SIZE,
+                    max_wait=settings.EMBEDDING_BATCH_MAX_WAIT_MS / 1000,
+                )
+    return _query_batcher
+
+
+def encode_query(text: str):
+    """
+    Encode one query in-process, batched with concurrent callers when batching is enabled.
+    """
+    batcher = get_query_batcher()
+    if batcher is None:
+        return get_model().encode(text)
+    # Bounded so a wedged batcher thread cannot hold the request forever
+    return batcher.submit(text).result(timeout=settings.EMBEDDING_QUERY_TIMEOUT)
+
+
+_server_down_until = 0.0
+
+def embedding_server_available():
+    """
+    Whether queries should be sent to the embedding server rather than encoded in-process.
+    """
+    return get_embedding_client() is not None and time.monotonic() >= _server_down_until
+
+
+def encode_on_server(texts, batch_size: int = 32):
+    """
+    Embeddings of ``texts`` from the shared embedding server, or None to encode in-process.
+
+    After a failure the server is left alone for EMBEDDING_SERVER_RETRY_AFTER
+    seconds, so an outage costs one timeout rather than one per request.
+    """
+    global _server_down_until
+    if not embedding_server_available():
+        return None
+    client = get_embedding_client()
+    try:
+        return client.encode(texts, batch_size=batch_size)
+    except EmbeddingServerError as e:
+        _server_down_until = time.monotonic() + settings.EMBEDDING_SERVER_RETRY_AFTER
+        logger.warning(f"Embedding server unavailable, encoding in-process: {e}")
+        return None
+
+
+def query_cache_key(text: str):
+    return (MODEL_NAME, settings.EMBEDDING_BACKEND, normalize_query(text))
+
+
 def get_embedding(text: str):
+    # Repeated questions skip the transformer forward pass entirely
+    cache = get_embedding_cache()
+    key = query_cache_key(text)
+    embedding = cache.get(key)
+    if embedding is None:
+        embeddings = encode_on_server([text])
+        if embeddings is not None:
+            embedding = embeddings[0]
+        else:
+            embedding = encode_query(text).tolist()  # Convert numpy array to list for DB storage
+        cache.set(key, embedding)
+    return list(embedding)
+
+
+async def get_embedding_async(text: str, executor=None):
+    """
+    Async variant of get_embedding.
+
+    When queries are batched in-process, the batcher's future is awaited on the
+    event loop, so every concurrent question can join the same batch instead of
+    waiting for a free ``executor`` thread. Server calls and unbatched encodes
+    still block, and run in ``executor``.
+    """
+    cache = get_embedding_cache()
+    key = query_cache_key(text)
+    embedding = cache.get(key)
+    if embedding is not None:
+        return list(embedding)
+
+    batcher = get_query_batcher()
+    if batcher is None or embedding_server_available():
+        return await asyncio.get_running_loop().run_in_executor(executor, get_embedding, text)
+
+    future = asyncio.wrap_future(batcher.submit(text))
+    embedding = (await asyncio.wait_for(future, settings.EMBEDDING_QUERY_TIMEOUT)).tolist()
+    cache.set(key, embedding)
+    return list(embedding)
+
+
+def get_embeddings(texts, batch_size: int = 32):
+    """
+    Encode many texts with one batched model call.
+    """
+    if not texts:
+        return []
+    embeddings = encode_on_server(texts, batch_size=batch_size)
+    if embeddings is not None:
+        return embeddings
     model = get_model()
-    embedding = model.encode(text)
-    return embedding.tolist()  # Convert numpy array to list for DB storage
+    embeddings = model.encode(list(texts), batch_size=batch_size, show_progress_bar=False)
+    return embeddings.tolist()
+
+
+def embedding_parity(texts, reference: str = 'torch', candidate: str = 'onnx'):
+    """
+    Compare two backends on ``texts``.
+
+    Returns the per-text cosine similarity of their embeddings and each
+    backend's encode time in milliseconds.
+    """
+    import numpy as np
+
+    results = {}
+    timings = {}
+    for backend in (reference, candidate):
+        model = load_model(backend)
+        model.encode(texts[:1])  # Leave one-off initialisation out of the timing
+        started = time.perf_counter()
+        results[backend] = np.asarray(model.encode(list(texts), show_progress_bar=False), dtype=np.float32)
+        timings[backend] = round((time.perf_counter() - started) * 1000, 2)
+
+    a, b = results[reference], results[candidate]
+    cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return cosines.tolist(), timings
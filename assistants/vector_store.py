@@ -0,0 +1,153 @@
+"""
+pgvector-backed nearest-neighbour search.
+
+Used when ``SEMANTIC_SEARCH_BACKEND = 'pgvector'``. Top-k is computed inside
+Postgres with ``ORDER BY embedding_vector <=> query LIMIT k`` against the HNSW
+index created by migration 0007, so no embeddings are shipped to Python.
+
+The HNSW index spans every assistant and ``assistant_id`` is filtered after
+the scan, so an assistant holding a small share of the rows can get fewer
+than k hits. On pgvector 0.8+ the scan is made iterative, so it keeps going
+until k rows pass the filter. A search that still comes back short is only
+repeated as an exact scan of the assistant's own rows when the assistant
+really has more embedded rows than were returned.
+"""
+
+import logging
+from django.conf import settings
+from django.db import connection, transaction
+from .models import KnowledgeBaseEntry
+
+logger = logging.getLogger(__name__)
+
+TABLE = KnowledgeBaseEntry._meta.db_table
+
+SEARCH_SQL = f"""
+    SELECT id, 1 - (embedding_vector <=> %s::vector) AS score
+    FROM {TABLE}
+    WHERE assistant_id = %s AND embedding_vector IS NOT NULL
+    ORDER BY embedding_vector <=> %s::vector
+    LIMIT %s
+"""
+
+EXISTS_SQL = f"SELECT 1 FROM {TABLE} WHERE assistant_id = %s AND embedding_vector IS NOT NULL LIMIT 1"
+
+# Counts at most LIMIT rows, so it stays cheap for large assistants
+CAPPED_COUNT_SQL = f"""
+    SELECT count(*) FROM (
+        SELECT 1 FROM {TABLE} WHERE assistant_id = %s AND embedding_vector IS NOT NULL LIMIT %s
+    ) AS capped
+"""
+
+
+def pgvector_available():
+    """
+    True when the database has the ``embedding_vector`` column from migration 0007.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        columns = connection.introspection.get_table_description(cursor, TABLE)
+    return any(column.name == 'embedding_vector' for column in columns)
+
+
+_available = None
+
+def pgvector_ready():
+    """
+    ``pgvector_available()``, checked once per process; logs an error when it is not.
+    """
+    global _available
+    if _available is None:
+        _available = pgvector_available()
+        if not _available:
+            logger.error(
+                "SEMANTIC_SEARCH_BACKEND is 'pgvector' but the embedding_vector column is missing "
+                "(see migration 0007); falling back to in-process search"
+            )
+    return _available
+
+
+def pgvector_version():
+    """
+    Installed version of the ``vector`` extension as a tuple of ints, or None.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return tuple(int(part) for part in row[0].split('.') if part.isdigit())
+
+
+_iterative_scan = None
+
+def iterative_scan_enabled():
+    """
+    PGVECTOR_ITERATIVE_SCAN, or when it is unset, whether pgvector is 0.8+ (checked once per process).
+    """
+    global _iterative_scan
+    if settings.PGVECTOR_ITERATIVE_SCAN is not None:
+        return settings.PGVECTOR_ITERATIVE_SCAN
+    if _iterative_scan is None:
+        _iterative_scan = (pgvector_version() or ()) >= (0, 8)
+    return _iterative_scan
+
+
+def to_vector_literal(vector):
+    """
+    Format a query vector in pgvector's text representation.
+    """
+    return "[" + ",".join(f"{float(value):.7g}" for value in vector) + "]"
+
+
+class PgVectorIndex:
+    """
+    Index-like view of one assistant's embeddings stored in Postgres.
+
+    Exposes the same ``search`` interface as ``EmbeddingIndex`` so retrieval
+    does not care which backend is active.
+    """
+
+    def __init__(self, assistant_id):
+        self.assistant_id = assistant_id
+        self._has_entries = None
+
+    def __bool__(self):
+        if self._has_entries is None:
+            with connection.cursor() as cursor:
+                cursor.execute(EXISTS_SQL, [self.assistant_id])
+                self._has_entries = cursor.fetchone() is not None
+        return self._has_entries
+
+    def _embedded_rows(self, cursor, limit):
+        # Assistants with fewer than top_k entries come back short without anything being missed
+        cursor.execute(CAPPED_COUNT_SQL, [self.assistant_id, limit])
+        return cursor.fetchone()[0]
+
+    def search(self, query_vector, top_k: int = 5):
+        """
+        Return up to ``top_k`` ``(entry_id, score)`` pairs, highest score first.
+        """
+        if top_k <= 0:
+            return []
+
+        literal = to_vector_literal(query_vector)
+        params = [literal, self.assistant_id, literal, top_k]
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Lets HNSW keep scanning until the assistant_id filter yields k rows (pgvector >= 0.8)
+            if iterative_scan_enabled():
+                cursor.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+            cursor.execute(SEARCH_SQL, params)
+            rows = cursor.fetchall()
+            if len(rows) < top_k and self._embedded_rows(cursor, top_k) > len(rows):
+                # The filtered ANN scan came up short: rank the assistant's rows exactly,
+                # reaching them through the assistant_id index instead of HNSW
+                cursor.execute("SET LOCAL enable_indexscan = off")
+                cursor.execute(SEARCH_SQL, params)
+                rows = cursor.fetchall()
+
+        hits = [(entry_id, float(score)) for entry_id, score in rows]
+        # relaxed_order may return rows slightly out of order
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits
@@ -1,14 +1,21 @@
 from rest_framework import generics, permissions
-from .models import Assistant, KnowledgeBaseEntry
-from .serializers import AssistantSerializer, KnowledgeBaseEntrySerializer
+from .models import Assistant, KnowledgeBaseEntry, KnowledgeDocument, KnowledgeImportJob
+from .serializers import AssistantSerializer, KnowledgeBaseEntrySerializer, KnowledgeDocumentSerializer, KnowledgeImportJobSerializer
 from .permissions import IsOwner
-from rest_framework.permissions import IsAuthenticated
-from django.http import JsonResponse
-from .semantic_search import find_best_match, find_top_matches, find_top_matches_from_entries
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views import View
 from django.conf import settings
-from .gemini import ask_gemini, get_knowledge_context
+from .retrieval import answer_question, stream_answer
+from .embeddings import get_embedding_worker
+from .index_registry import get_index_registry
+from .gemini import gemini_metrics
+from .utils import get_embedding_cache, get_query_batcher
+from .imports import detect_format, start_import
+from .chunking import ingest_document
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
+import json
 
 class AssistantListCreateView(generics.ListCreateAPIView):
     serializer_class = AssistantSerializer
@@ -41,6 +48,72 @@ class KnowledgeBaseEntryListCreateView(generics.ListCreateAPIView):
         serializer.save(assistant=assistant)
 
 
+class KnowledgeDocumentListCreateView(generics.ListCreateAPIView):
+    """
+    Long documents are split into token-bounded, overlapping chunk entries on upload.
+    """
+    serializer_class = KnowledgeDocumentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        assistant_id = self.request.query_params.get('assistant')
+        return KnowledgeDocument.objects.filter(assistant__user=self.request.user, assistant__id=assistant_id)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = ingest_document(data['assistant'], data['content'], data.get('title', ''))
+
+
+class KnowledgeDocumentDetailView(generics.RetrieveDestroyAPIView):
+    serializer_class = KnowledgeDocumentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return KnowledgeDocument.objects.filter(assistant__user=self.request.user)
+
+
+class KnowledgeBaseImportView(APIView):
+    """
+    Bulk import knowledge entries from an uploaded CSV (with a 'content' column)
+    or JSON Lines file ({"content": ...} per line). Returns a job to poll.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        assistant_id = request.data.get('assistant')
+
+        if not upload:
+            return JsonResponse({'error': 'No file uploaded'}, status=400)
+
+        if not assistant_id:
+            return JsonResponse({'message': 'Missing Assistant ID'}, status=400)
+
+        try:
+            assistant = Assistant.objects.get(id=assistant_id, user=request.user)
+        except (Assistant.DoesNotExist, ValueError):
+            return JsonResponse({'message': 'Invalid or Unauthorized Assistant'}, status=403)
+
+        try:
+            file_format = detect_format(upload.name, request.data.get('format'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        job = KnowledgeImportJob.objects.create(assistant=assistant, file_name=upload.name, file_format=file_format)
+        start_import(job, upload)
+
+        return JsonResponse(KnowledgeImportJobSerializer(job).data, status=202)
+
+
+class KnowledgeImportJobDetailView(generics.RetrieveAPIView):
+    serializer_class = KnowledgeImportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return KnowledgeImportJob.objects.filter(assistant__user=self.request.user)
+
+
 class KnowledgeBaseEntryDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = KnowledgeBaseEntrySerializer
     permission_classes = [permissions.IsAuthenticated, IsOwner]
@@ -50,55 +123,112 @@ class KnowledgeBaseEntryDetailView(generics.RetrieveUpdateDestroyAPIView):
         return KnowledgeBaseEntry.objects.filter(assistant__user=self.request.user)
 
 
+NO_ANSWER_MESSAGE = "Sorry, I couldn't find an answer to that question."
+
+
 class AnswerQueryView(APIView):
     permission_classes = [IsAuthenticated]
-    def get(self, request, *args, **kwargs):
+
+    def get_assistant(self, request):
+        """
+        Validate the query parameters. Returns (query, assistant, error_response).
+        """
         query = request.GET.get("query")
         assistant_id = request.GET.get('assistant_id')
 
         if not query:
-            return JsonResponse({"error": "No question provided"}, status=400)
+            return query, None, JsonResponse({"error": "No question provided"}, status=400)
         
         if not assistant_id:
-            return JsonResponse({'message': 'Missing Assistant ID'}, status=400)
+            return query, None, JsonResponse({'message': 'Missing Assistant ID'}, status=400)
         
         try:
             assistant = Assistant.objects.get(id=assistant_id, user=request.user)
         except Assistant.DoesNotExist:
-            return JsonResponse({'message': 'Invalid or Unauthorized Assistant'}, status=403)
-        
-        best_entry, score = find_best_match(assistant, query, threshold=0.6)
+            return query, None, JsonResponse({'message': 'Invalid or Unauthorized Assistant'}, status=403)
 
-        if best_entry and score >= 0.7:
-            return JsonResponse({
-                "question": query,
-                "answer": best_entry.content,
-                "confidence": round(score, 2)
-            })
-        
-        entries = KnowledgeBaseEntry.objects.filter(assistant=assistant, embedding__isnull=False)
+        return query, assistant, None
+
+    def get(self, request, *args, **kwargs):
+        query, assistant, error = self.get_assistant(request)
+        if error:
+            return error
         
-        if entries:
-            top_matches = find_top_matches_from_entries(entries, query, top_k=5)
-            if top_matches:
-                context_parts = [f"{entry.content}" for entry, _ in top_matches]
-                context = "\n\n".join(context_parts)
-            else:
-                context = "There is no relevant information available."
-        else:
-            context = "There is no relevant information available."
-
-        gemini_answer = ask_gemini(query, context)
-
-        if gemini_answer:
+        result = answer_question(assistant, query)
+
+        if result["answer"]:
             return JsonResponse({
                 "question": query,
-                "answer": gemini_answer,
-                "confidence": 0.5
+                "answer": result["answer"],
+                "confidence": result["confidence"]
             })
 
         return JsonResponse({
             "question": query,
-            "answer": "Sorry, I couldn't find an answer to that question.",
+            "answer": NO_ANSWER_MESSAGE,
             "confidence": 0
         })
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class AnswerQueryStreamView(AnswerQueryView):
+    """
+    Opt-in streaming variant of AnswerQueryView using Server-Sent Events.
+
+    Gemini answers are forwarded as ``chunk`` events while they are generated
+    and closed by a ``done`` event; knowledge-base hits arrive as a single
+    ``answer`` event. If Gemini fails mid-answer, an ``error`` event carries
+    the answer that replaces the chunks already sent.
+    """
+
+    def get(self, request, *args, **kwargs):
+        query, assistant, error = self.get_assistant(request)
+        if error:
+            return error
+
+        def events():
+            for event, result in stream_answer(assistant, query):
+                if event == "chunk":
+                    yield sse_event(event, result)
+                    continue
+                yield sse_event(event, {
+                    "question": query,
+                    "answer": result["answer"] or NO_ANSWER_MESSAGE,
+                    "confidence": result["confidence"] if result["answer"] else 0,
+                })
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Stop nginx from buffering the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class EmbeddingStatusView(APIView):
+    """
+    Staff-only metrics for the background embedding worker, the query embedding
+    cache, the query batcher and the search index registry.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        batcher = get_query_batcher()
+        return JsonResponse({
+            "worker": get_embedding_worker().metrics(),
+            "query_cache": get_embedding_cache().stats(),
+            "query_batcher": batcher.metrics() if batcher else None,
+            "search_indexes": get_index_registry().stats() if settings.SEARCH_INDEX_CACHE_BYTES else None,
+        })
+
+
+class GeminiStatusView(APIView):
+    """
+    Staff-only circuit breaker state and latency of the Gemini client.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(gemini_metrics())
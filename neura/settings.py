@@ -181,3 +181,135 @@ DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL')
 GOOGLE_CLIENT_ID = env('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = env('GOOGLE_CLIENT_SECRET')
 SOCIAL_AUTH_PASSWORD = env('SOCIAL_AUTH_PASSWORD')
+
+# Semantic search
+# 'numpy' scores embeddings in-process; 'pgvector' ranks them in Postgres
+# (requires the vector extension, see assistants/migrations/0007).
+SEMANTIC_SEARCH_BACKEND = env('SEMANTIC_SEARCH_BACKEND', default='numpy')
+# Unset: iterative HNSW scans are used when the installed pgvector is 0.8+
+PGVECTOR_ITERATIVE_SCAN = env.bool('PGVECTOR_ITERATIVE_SCAN', default=None)
+# Embeddings are stored as compact float32 only; the double precision[] column
+# is also written when the pgvector trigger derives embedding_vector from it
+EMBEDDING_ARRAY_COLUMN = env.bool('EMBEDDING_ARRAY_COLUMN', default=SEMANTIC_SEARCH_BACKEND == 'pgvector')
+
+# Query embedding cache (per process). Size 0 disables it; TTL 0 never expires.
+EMBEDDING_CACHE_SIZE = env.int('EMBEDDING_CACHE_SIZE', default=1024)
+EMBEDDING_CACHE_TTL = env.int('EMBEDDING_CACHE_TTL', default=3600)
+
+# Answer cache, keyed by knowledge-base version (see assistants/caching.py).
+# Must be shared by all worker processes, e.g. CACHE_URL=redis://localhost:6379/1
+# (filecache:// works for workers on one host); check warns about locmem/dummy.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+ANSWER_CACHE_TIMEOUT = env.int('ANSWER_CACHE_TIMEOUT', default=3600)
+
+# Background embedding worker (see assistants/embeddings.py). With autostart,
+# web processes (neura/wsgi.py, neura/asgi.py; never manage.py commands) start it
+# and re-scan for entries missed by a previous process, one process at a time.
+EMBEDDING_WORKER_AUTOSTART = env.bool('EMBEDDING_WORKER_AUTOSTART', default=False)
+EMBEDDING_WORKER_QUEUE_SIZE = env.int('EMBEDDING_WORKER_QUEUE_SIZE', default=10000)
+EMBEDDING_WORKER_BATCH_SIZE = env.int('EMBEDDING_WORKER_BATCH_SIZE', default=64)
+EMBEDDING_WORKER_MAX_WAIT = env.float('EMBEDDING_WORKER_MAX_WAIT', default=0.5)
+
+# Bulk knowledge base import (see assistants/imports.py)
+KNOWLEDGE_IMPORT_CHUNK_SIZE = env.int('KNOWLEDGE_IMPORT_CHUNK_SIZE', default=1000)
+KNOWLEDGE_IMPORT_MAX_CONTENT_LENGTH = env.int('KNOWLEDGE_IMPORT_MAX_CONTENT_LENGTH', default=20000)
+
+# Long document chunking, in embedding-model tokens (all-MiniLM-L6-v2 truncates at 256)
+CHUNK_MAX_TOKENS = env.int('CHUNK_MAX_TOKENS', default=200)
+CHUNK_OVERLAP_TOKENS = env.int('CHUNK_OVERLAP_TOKENS', default=40)
+
+# Async WhatsApp webhook (served under ASGI, see neura/asgi.py)
+WHATSAPP_WEBHOOK_TIMEOUT = env.float('WHATSAPP_WEBHOOK_TIMEOUT', default=12.0)
+# Threads for blocking query encodes (embedding server, unbatched); at least EMBEDDING_BATCH_MAX_SIZE
+ASYNC_EMBEDDING_WORKERS = env.int('ASYNC_EMBEDDING_WORKERS', default=2)
+
+# WhatsApp reply mode: 'sync' answers inside the webhook response, 'deferred'
+# acknowledges Twilio immediately and sends the answer over the REST API
+WHATSAPP_REPLY_MODE = env('WHATSAPP_REPLY_MODE', default='sync')
+WHATSAPP_REPLY_WORKERS = env.int('WHATSAPP_REPLY_WORKERS', default=4)
+WHATSAPP_SENDER = env('WHATSAPP_SENDER', default='whatsapp.senders.TwilioSender')
+TWILIO_ACCOUNT_SID = env('TWILIO_ACCOUNT_SID', default='')
+TWILIO_AUTH_TOKEN = env('TWILIO_AUTH_TOKEN', default='')
+TWILIO_HTTP_TIMEOUT = env.float('TWILIO_HTTP_TIMEOUT', default=10.0)
+
+# Gemini client resilience. GEMINI_API_ENDPOINT overrides the API host, e.g.
+# for the local fake started with `manage.py fake_gemini`
+GEMINI_API_ENDPOINT = env('GEMINI_API_ENDPOINT', default='')
+GEMINI_TIMEOUT = env.float('GEMINI_TIMEOUT', default=6.0)
+GEMINI_MAX_ATTEMPTS = env.int('GEMINI_MAX_ATTEMPTS', default=2)
+GEMINI_RETRY_BASE_DELAY = env.float('GEMINI_RETRY_BASE_DELAY', default=0.25)
+GEMINI_RETRY_MAX_DELAY = env.float('GEMINI_RETRY_MAX_DELAY', default=2.0)
+GEMINI_BREAKER_FAILURE_RATE = env.float('GEMINI_BREAKER_FAILURE_RATE', default=0.5)
+GEMINI_BREAKER_WINDOW = env.int('GEMINI_BREAKER_WINDOW', default=20)
+GEMINI_BREAKER_MIN_CALLS = env.int('GEMINI_BREAKER_MIN_CALLS', default=5)
+GEMINI_BREAKER_RESET_TIMEOUT = env.float('GEMINI_BREAKER_RESET_TIMEOUT', default=30.0)
+# Hedging applies to sync calls and to ask_gemini_async (the async WhatsApp webhook)
+GEMINI_HEDGE = env.bool('GEMINI_HEDGE', default=False)
+GEMINI_HEDGE_DELAY = env.float('GEMINI_HEDGE_DELAY', default=3.0)
+# While Gemini is unavailable, the closest entry is only returned at this similarity or above
+GEMINI_FALLBACK_MIN_SCORE = env.float('GEMINI_FALLBACK_MIN_SCORE', default=0.6)
+
+# Gemini context packing: token budget, hits considered, MMR diversity weight
+# and the term overlap at which a passage counts as a duplicate
+CONTEXT_MAX_TOKENS = env.int('CONTEXT_MAX_TOKENS', default=800)
+CONTEXT_CANDIDATES = env.int('CONTEXT_CANDIDATES', default=20)
+CONTEXT_LOOKAHEAD = env.int('CONTEXT_LOOKAHEAD', default=5)
+CONTEXT_DIVERSITY = env.float('CONTEXT_DIVERSITY', default=0.3)
+CONTEXT_DUPLICATE_THRESHOLD = env.float('CONTEXT_DUPLICATE_THRESHOLD', default=0.8)
+
+# Load the embedding model and Gemini client when a web process starts
+# (neura/wsgi.py, neura/asgi.py) instead of on its first request
+PRELOAD_MODELS = env.bool('PRELOAD_MODELS', default=False)
+
+# Embedding backend: 'torch' (PyTorch) or 'onnx' (int8-quantized ONNX Runtime,
+# needs `pip install sentence-transformers[onnx]`). EMBEDDING_ONNX_FILE is the
+# export within the model repository; avx2 is the most portable int8 variant
+EMBEDDING_BACKEND = env('EMBEDDING_BACKEND', default='torch')
+EMBEDDING_ONNX_FILE = env('EMBEDDING_ONNX_FILE', default='onnx/model_quint8_avx2.onnx')
+
+# Quantized in-process search rescores top_k * SEARCH_RESCORE_FACTOR candidates exactly
+SEARCH_RESCORE_FACTOR = env.int('SEARCH_RESCORE_FACTOR', default=4)
+
+# Hybrid retrieval (Assistant.retrieval_mode = 'hybrid'): hits taken from each
+# ranking and the reciprocal rank fusion constant
+HYBRID_CANDIDATES = env.int('HYBRID_CANDIDATES', default=20)
+HYBRID_RRF_K = env.int('HYBRID_RRF_K', default=60)
+
+# Exact-question fast path: verbatim repeats of curated or learned questions are
+# answered without embedding. Knowledge base answers scoring at least
+# EXACT_ANSWER_LEARN_THRESHOLD are learned
+EXACT_ANSWERS = env.bool('EXACT_ANSWERS', default=True)
+EXACT_ANSWER_LEARN_THRESHOLD = env.float('EXACT_ANSWER_LEARN_THRESHOLD', default=0.9)
+
+# Shared embedding server (`manage.py embedding_server`). When set, processes
+# encode through this Unix socket instead of loading the model themselves, and
+# fall back to in-process encoding for EMBEDDING_SERVER_RETRY_AFTER seconds
+# whenever the server fails or takes longer than EMBEDDING_SERVER_TIMEOUT
+EMBEDDING_SERVER_SOCKET = env('EMBEDDING_SERVER_SOCKET', default='')
+EMBEDDING_SERVER_TIMEOUT = env.float('EMBEDDING_SERVER_TIMEOUT', default=5.0)
+EMBEDDING_SERVER_RETRY_AFTER = env.float('EMBEDDING_SERVER_RETRY_AFTER', default=10.0)
+
+# Concurrent query embeddings are encoded together: a batch closes after
+# EMBEDDING_BATCH_MAX_SIZE queries or EMBEDDING_BATCH_MAX_WAIT_MS milliseconds.
+# A max size of 1 encodes every query on its own
+EMBEDDING_BATCH_MAX_SIZE = env.int('EMBEDDING_BATCH_MAX_SIZE', default=16)
+EMBEDDING_BATCH_MAX_WAIT_MS = env.float('EMBEDDING_BATCH_MAX_WAIT_MS', default=2.0)
+# Longest a question waits for its batched embedding before the request fails
+EMBEDDING_QUERY_TIMEOUT = env.float('EMBEDDING_QUERY_TIMEOUT', default=30.0)
+
+# Directory for memory-mapped search index snapshots shared by all workers on
+# a host; empty loads every index from the database. Needs a shared cache
+# (CACHE_URL) so that workers agree on knowledge-base versions
+SEARCH_SNAPSHOT_DIR = env('SEARCH_SNAPSHOT_DIR', default='')
+
+# Keep in-process search indexes between queries, evicting the least recently
+# used ones beyond this many bytes per process. 0 loads the index on every query
+SEARCH_INDEX_CACHE_BYTES = env.int('SEARCH_INDEX_CACHE_BYTES', default=0)
+
+# Entry changes recorded per knowledge-base version, so loaded search indexes
+# can be patched instead of reloaded. An index more than
+# KNOWLEDGE_CHANGES_MAX_VERSIONS versions behind is reloaded in full
+KNOWLEDGE_CHANGES_TIMEOUT = env.int('KNOWLEDGE_CHANGES_TIMEOUT', default=86400)
+KNOWLEDGE_CHANGES_MAX_VERSIONS = env.int('KNOWLEDGE_CHANGES_MAX_VERSIONS', default=100)
@@ -14,3 +14,16 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'neura.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.PRELOAD_MODELS:
+    # Warm the models before this worker takes traffic; manage.py never gets here
+    from assistants.preload import preload_models
+    preload_models()
+
+if settings.EMBEDDING_WORKER_AUTOSTART:
+    # Start right away so entries left without embeddings by a previous process are recovered;
+    # migrate, shell and other manage.py commands never start it
+    from assistants.embeddings import get_embedding_worker
+    get_embedding_worker().start()
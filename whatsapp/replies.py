@@ -0,0 +1,74 @@
+"""
+Acknowledge-then-reply handling for the Twilio webhook.
+
+In ``deferred`` reply mode the webhook answers Twilio with an empty TwiML 200
+right away and the question is answered in a background thread pool; the
+answer is then delivered through the configured sender. Webhook latency no
+longer depends on Gemini latency, so Twilio's ~15s timeout never triggers a
+retry. Retries that still arrive are recognised by their MessageSid and dropped.
+Seen MessageSids are kept in Django's cache, so a cache shared by all workers
+(CACHE_URL) is required: with the per-process default, a retry that reaches
+another worker is answered twice.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from assistants.models import Assistant
+from assistants.retrieval import answer_question
+from .senders import get_sender
+
+logger = logging.getLogger(__name__)
+
+NO_ANSWER_TEXT = "Sorry, I don't have an answer for that yet."
+SEEN_MESSAGE_KEY = "neura:whatsapp:message:{sid}"
+SEEN_MESSAGE_TIMEOUT = 60 * 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_reply_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.WHATSAPP_REPLY_WORKERS,
+                thread_name_prefix='whatsapp-reply',
+            )
+    return _executor
+
+
+def deliver_reply(assistant_id, question: str, to: str, from_: str):
+    """
+    Answer a question and send the answer back to the WhatsApp sender.
+    """
+    assistant = Assistant.objects.get(pk=assistant_id)
+    result = answer_question(assistant, question)
+    sid = get_sender().send(to=to, from_=from_, body=result["answer"] or NO_ANSWER_TEXT)
+    logger.info(f"Deferred WhatsApp reply {sid} sent for assistant {assistant_id}")
+    return sid
+
+
+def _run_deferred_reply(*args):
+    close_old_connections()
+    try:
+        deliver_reply(*args)
+    except Exception as e:
+        logger.error(f"Deferred WhatsApp reply failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_reply(assistant_id, question: str, to: str, from_: str, message_sid: str = None):
+    """
+    Queue a question for a deferred reply. Returns False for a duplicate (retried) message.
+    """
+    if message_sid and not cache.add(SEEN_MESSAGE_KEY.format(sid=message_sid), True, SEEN_MESSAGE_TIMEOUT):
+        logger.info(f"Ignoring retried WhatsApp message {message_sid}")
+        return False
+
+    get_reply_executor().submit(_run_deferred_reply, assistant_id, question, to, from_)
+    return True
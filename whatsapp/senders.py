@@ -0,0 +1,66 @@
+"""
+Outbound WhatsApp message senders.
+
+The sender used for deferred replies is chosen with ``WHATSAPP_SENDER`` (a
+dotted path), so the Twilio REST client can be swapped for ``LocalSender`` to
+exercise the acknowledge-then-reply flow offline.
+"""
+
+import logging
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class TwilioSender:
+    """
+    Sends messages through the Twilio Messages REST API.
+
+    One client is kept per process; its HTTP client pools connections, so
+    consecutive replies reuse the same keep-alive session instead of
+    handshaking with Twilio every time.
+    """
+
+    def __init__(self):
+        from twilio.http.http_client import TwilioHttpClient
+        from twilio.rest import Client
+
+        http_client = TwilioHttpClient(pool_connections=True, timeout=settings.TWILIO_HTTP_TIMEOUT)
+        self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
+
+    def send(self, to: str, from_: str, body: str):
+        message = self.client.messages.create(to=to, from_=from_, body=body)
+        return message.sid
+
+
+class LocalSender:
+    """
+    Keeps messages in memory instead of sending them. For local development and tests.
+    """
+
+    def __init__(self):
+        self.outbox = []
+        self._lock = threading.Lock()
+
+    def send(self, to: str, from_: str, body: str):
+        with self._lock:
+            self.outbox.append({"to": to, "from": from_, "body": body})
+            sid = f"local-{len(self.outbox)}"
+        logger.info(f"LocalSender message to {to}: {body}")
+        return sid
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+def get_sender():
+    """
+    Return the process-wide sender configured by WHATSAPP_SENDER.
+    """
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = import_string(settings.WHATSAPP_SENDER)()
+    return _sender
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import WhatsAppWebhook, WhatsAppSetupInstructions
+from .views import WhatsAppWebhook, AsyncWhatsAppWebhook, WhatsAppSetupInstructions
 
 urlpatterns = [
     path('webhook/', WhatsAppWebhook.as_view(), name='whatsapp-webhook'),
+    path('webhook/async/', AsyncWhatsAppWebhook.as_view(), name='whatsapp-webhook-async'),
     path('setup/<int:assistant_id>/', WhatsAppSetupInstructions.as_view(), name='whatsapp-setup'),
 ]
@@ -7,10 +7,18 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from twilio.twiml.messaging_response import MessagingResponse
-from assistants.models import Assistant, KnowledgeBaseEntry
-from assistants.semantic_search import find_best_match, find_top_matches_from_entries
-from assistants.gemini import ask_gemini
+from asgiref.sync import sync_to_async
+from assistants.caching import get_knowledge_version
+from assistants.exact_answers import find_exact_answer
+from assistants.models import Assistant
+from assistants.retrieval import answer_question, answer_question_async
+from .replies import NO_ANSWER_TEXT, schedule_reply
+from django.conf import settings
 from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -57,6 +65,65 @@ class WhatsAppSetupInstructions(APIView):
         except Assistant.DoesNotExist:
             return Response({"error": "Assistant not found"}, status=404)
 
+TIMEOUT_TEXT = "Sorry, that took too long. Please try again in a moment."
+
+
+class InvalidMessage(Exception):
+    """
+    Raised for messages that do not follow the @tag_name: question format.
+    """
+
+
+def parse_mention(incoming_msg):
+    """
+    Split "@tag_name: question" into (tag, question).
+    """
+    if not incoming_msg:
+        raise InvalidMessage('No message received')
+
+    if '@' not in incoming_msg or ':' not in incoming_msg:
+        # If message doesn't follow @tag: question format
+        raise InvalidMessage('Please use format: @tag_name: your question')
+
+    # Extract tag and question
+    parts = incoming_msg.split(':', 1)
+    tag = parts[0].replace('@', '').strip()
+    question = parts[1].strip()
+
+    if not tag or not question:
+        raise InvalidMessage('Invalid message format. Use: @tag_name: your question')
+
+    return tag, question
+
+
+def twiml_reply(text=None):
+    twilio_response = MessagingResponse()
+    if text is not None:
+        twilio_response.message(text)
+    return HttpResponse(str(twilio_response), content_type='application/xml')
+
+
+def reply_deferred():
+    return settings.WHATSAPP_REPLY_MODE == 'deferred'
+
+
+def exact_reply(assistant, question):
+    """
+    TwiML carrying the exact-match answer to ``question``, or None when there is none.
+    """
+    exact = find_exact_answer(assistant.pk, question, get_knowledge_version(assistant.pk))
+    return twiml_reply(exact["answer"]) if exact else None
+
+
+def acknowledge(data, assistant, question):
+    """
+    Queue the answer for delivery over the REST API and acknowledge Twilio with an empty TwiML 200.
+    """
+    # The reply goes back the way the message came: to the sender, from our number
+    schedule_reply(assistant.pk, question, to=data.get('From'), from_=data.get('To'), message_sid=data.get('MessageSid'))
+    return twiml_reply()
+
+
 class WhatsAppWebhook(APIView):
     """
     Webhook endpoint for receiving and responding to WhatsApp messages via Twilio.
@@ -69,63 +136,65 @@ class WhatsAppWebhook(APIView):
         """
         try:
             # Twilio sends data as form-urlencoded, not JSON
-            incoming_msg = request.data.get('Body', '')
-            
-            if not incoming_msg:
-                return HttpResponse('No message received', status=400)
-
-            if '@' in incoming_msg and ':' in incoming_msg:
-                # Extract tag and question
-                parts = incoming_msg.split(':', 1)
-                tag = parts[0].replace('@', '').strip()
-                question = parts[1].strip()
-
-                if not tag or not question:
-                    return HttpResponse('Invalid message format. Use: @tag_name: your question', status=400)
-
-                # Find assistant by tag
-                try:
-                    assistant = Assistant.objects.get(tag_name=tag)
-                except Assistant.DoesNotExist:
-                    return HttpResponse(f'Assistant "{tag}" not found. Please check the tag name.', status=400)
-                
-                # Use the same logic as AnswerQueryView
-                best_entry, score = find_best_match(assistant, question, threshold=0.6)
-
-                # If confident match found (threshold 0.7)
-                if best_entry and score >= 0.7:
-                    response_text = best_entry.content
-                else:
-                    # Try Gemini with top 5 similar entries as context
-                    entries = KnowledgeBaseEntry.objects.filter(assistant=assistant, embedding__isnull=False)
-                    
-                    if entries:
-                        # Use the same entries for both operations
-                        top_matches = find_top_matches_from_entries(entries, question, top_k=5)
-                        
-                        if top_matches:
-                            context_parts = [f"{entry.content}" for entry, _ in top_matches]
-                            context = "\n\n".join(context_parts)
-                        else:
-                            context = "There is no relevant information available."
-                    else:
-                        context = "There is no relevant information available."
-
-                    gemini_answer = ask_gemini(question, context)
-
-                    if gemini_answer:
-                        response_text = gemini_answer
-                    else:
-                        response_text = "Sorry, I don't have an answer for that yet."
-
-                twilio_response = MessagingResponse()
-                twilio_response.message(response_text)
-
-                return HttpResponse(str(twilio_response), content_type='application/xml')
-            else:
-                # If message doesn't follow @tag: question format
-                return HttpResponse('Please use format: @tag_name: your question', status=400)
-                
+            tag, question = parse_mention(request.data.get('Body', ''))
+
+            # Find assistant by tag
+            try:
+                assistant = Assistant.objects.get(tag_name=tag)
+            except Assistant.DoesNotExist:
+                return HttpResponse(f'Assistant "{tag}" not found. Please check the tag name.', status=400)
+
+            if reply_deferred():
+                # Exact-match answers cost no more than the acknowledgement, so send them inline
+                return exact_reply(assistant, question) or acknowledge(request.data, assistant, question)
+
+            # Same single-pass pipeline as AnswerQueryView
+            result = answer_question(assistant, question)
+            return twiml_reply(result["answer"] or NO_ANSWER_TEXT)
+
+        except InvalidMessage as e:
+            return HttpResponse(str(e), status=400)
+        except Exception as e:
+            logger.error(f"WhatsApp webhook error: {str(e)}")
+            return HttpResponse('An error occurred. Please try again.', status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncWhatsAppWebhook(View):
+    """
+    Native async variant of WhatsAppWebhook for ASGI deployments.
+
+    While Gemini is generating, the coroutine is parked instead of holding a
+    worker, so one process can carry hundreds of in-flight conversations.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            tag, question = parse_mention(request.POST.get('Body', ''))
+
+            try:
+                assistant = await Assistant.objects.aget(tag_name=tag)
+            except Assistant.DoesNotExist:
+                return HttpResponse(f'Assistant "{tag}" not found. Please check the tag name.', status=400)
+
+            if reply_deferred():
+                # Both touch the sync cache API, so neither may run on the event loop
+                reply = await sync_to_async(exact_reply)(assistant, question)
+                return reply or await sync_to_async(acknowledge)(request.POST, assistant, question)
+
+            try:
+                result = await asyncio.wait_for(
+                    answer_question_async(assistant, question),
+                    timeout=settings.WHATSAPP_WEBHOOK_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"WhatsApp webhook timed out for assistant {assistant.pk}")
+                return twiml_reply(TIMEOUT_TEXT)
+
+            return twiml_reply(result["answer"] or NO_ANSWER_TEXT)
+
+        except InvalidMessage as e:
+            return HttpResponse(str(e), status=400)
         except Exception as e:
             logger.error(f"WhatsApp webhook error: {str(e)}")
             return HttpResponse('An error occurred. Please try again.', status=500)